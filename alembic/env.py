@@ -3,8 +3,10 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
 
 from alembic import context
+from app.models.analytics import CategorySketch  # noqa: F401
+from app.models.catalog import CatalogVersion  # noqa: F401
 from app.models.db import Base
-from app.models.product import Book, BookAIDetails  # noqa: F401
+from app.models.product import Book, BookAIDetails, BookNeighbor, BookSnapshot  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
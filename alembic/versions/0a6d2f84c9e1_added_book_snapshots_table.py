@@ -0,0 +1,44 @@
+"""Added book snapshots table
+
+Revision ID: 0a6d2f84c9e1
+Revises: e4a7c93b16d2
+Create Date: 2026-10-17 16:48:12.730954
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6d2f84c9e1'
+down_revision: Union[str, Sequence[str], None] = 'e4a7c93b16d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Monthly partitions are created by the seeding job as it needs them
+    op.create_table('book_snapshots',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('crawled_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('upc', sa.String(), nullable=True),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('stock_count', sa.Integer(), nullable=True),
+    sa.Column('availability', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id', 'crawled_at'),
+    postgresql_partition_by='RANGE (crawled_at)'
+    )
+    op.create_index('ix_book_snapshots_crawled_at', 'book_snapshots', ['crawled_at'],
+                    unique=False, postgresql_using='brin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Dropping the partitioned table drops its partitions too
+    op.drop_index('ix_book_snapshots_crawled_at', table_name='book_snapshots',
+                  postgresql_using='brin')
+    op.drop_table('book_snapshots')
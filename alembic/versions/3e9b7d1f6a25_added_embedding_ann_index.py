@@ -0,0 +1,45 @@
+"""Added embedding ANN index
+
+Revision ID: 3e9b7d1f6a25
+Revises: 7c1e5a9d2b40
+Create Date: 2026-10-17 18:05:19.447361
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3e9b7d1f6a25'
+down_revision: Union[str, Sequence[str], None] = '7c1e5a9d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# hnsw (default) recalls better and needs no training data; ivfflat builds faster and smaller,
+# but picks its lists from the rows present, so build it after the embeddings are generated
+VECTOR_INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'hnsw')
+VECTOR_HNSW_M = int(os.getenv('VECTOR_HNSW_M', '16'))
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv('VECTOR_HNSW_EF_CONSTRUCTION', '64'))
+# pgvector suggests rows / 1000 lists up to a million rows
+VECTOR_IVFFLAT_LISTS = int(os.getenv('VECTOR_IVFFLAT_LISTS', '100'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if VECTOR_INDEX_TYPE == 'hnsw':
+        options = {'m': VECTOR_HNSW_M, 'ef_construction': VECTOR_HNSW_EF_CONSTRUCTION}
+    elif VECTOR_INDEX_TYPE == 'ivfflat':
+        options = {'lists': VECTOR_IVFFLAT_LISTS}
+    else:
+        raise ValueError(
+            f"VECTOR_INDEX_TYPE must be 'hnsw' or 'ivfflat', not {VECTOR_INDEX_TYPE!r}"
+        )
+    op.create_index('ix_book_ai_details_embedding', 'book_ai_details', ['embedding'],
+                    unique=False, postgresql_using=VECTOR_INDEX_TYPE, postgresql_with=options,
+                    postgresql_ops={'embedding': 'vector_cosine_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_ai_details_embedding', table_name='book_ai_details')
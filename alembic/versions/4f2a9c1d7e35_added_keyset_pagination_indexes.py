@@ -0,0 +1,30 @@
+"""Added keyset pagination indexes on books
+
+Revision ID: 4f2a9c1d7e35
+Revises: bc21ad877201
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2a9c1d7e35'
+down_revision: Union[str, Sequence[str], None] = 'bc21ad877201'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_books_price_id', 'books', ['price', 'id'], unique=False)
+    op.create_index('ix_books_rating_id', 'books', ['rating', 'id'], unique=False)
+    op.create_index('ix_books_name_id', 'books', ['name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_books_name_id', table_name='books')
+    op.drop_index('ix_books_rating_id', table_name='books')
+    op.drop_index('ix_books_price_id', table_name='books')
@@ -0,0 +1,53 @@
+"""Added materialized views backing the analytics trends
+
+Revision ID: 5b8f0d2c3a71
+Revises: c71b5e2f8a90
+Create Date: 2026-10-17 15:21:40.318256
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8f0d2c3a71'
+down_revision: Union[str, Sequence[str], None] = 'c71b5e2f8a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE MATERIALIZED VIEW trend_category_stats AS
+        SELECT category,
+               count(*) AS book_count,
+               avg(rating)::double precision AS average_rating,
+               avg(price) AS average_price,
+               now() AS computed_at
+        FROM books
+        GROUP BY category
+    """)
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index over plain columns
+    op.execute(
+        'CREATE UNIQUE INDEX ux_trend_category_stats_category ON trend_category_stats (category)'
+    )
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW trend_top_rated_books AS
+        SELECT id, name, category, rating, now() AS computed_at
+        FROM (
+            SELECT id, name, category, rating,
+                   rank() OVER (PARTITION BY category ORDER BY rating DESC, id ASC) AS rnk
+            FROM books
+            WHERE rating IS NOT NULL
+        ) ranked
+        WHERE rnk = 1
+    """)
+    op.execute('CREATE UNIQUE INDEX ux_trend_top_rated_books_id ON trend_top_rated_books (id)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS trend_top_rated_books')
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS trend_category_stats')
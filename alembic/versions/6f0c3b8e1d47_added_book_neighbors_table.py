@@ -0,0 +1,41 @@
+"""Added book neighbors table
+
+Revision ID: 6f0c3b8e1d47
+Revises: 3e9b7d1f6a25
+Create Date: 2026-10-17 18:42:37.918204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '6f0c3b8e1d47'
+down_revision: Union[str, Sequence[str], None] = '3e9b7d1f6a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled from every embedding the next time the embedding job runs, even if it has no new
+    # book to embed
+    op.create_table('book_neighbors',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id', 'rank')
+    )
+    op.create_index('ix_book_neighbors_neighbor_id', 'book_neighbors', ['neighbor_id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_neighbors_neighbor_id', table_name='book_neighbors')
+    op.drop_table('book_neighbors')
@@ -0,0 +1,49 @@
+"""Added top books per category indexes
+
+Revision ID: 7c1e5a9d2b40
+Revises: 0a6d2f84c9e1
+Create Date: 2026-10-17 17:26:53.184407
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5a9d2b40'
+down_revision: Union[str, Sequence[str], None] = '0a6d2f84c9e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_books_category_rating_id', 'books',
+                    ['category', sa.text('rating DESC'), 'id'], unique=False)
+    op.create_index('ix_books_category_price_id', 'books',
+                    ['category', sa.text('price DESC'), 'id'], unique=False)
+    op.create_index('ix_books_category_stock_count_id', 'books',
+                    ['category', sa.text('stock_count DESC'), 'id'], unique=False)
+    # The top books per category are now read straight off the indexes above
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS trend_top_rated_books')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        CREATE MATERIALIZED VIEW trend_top_rated_books AS
+        SELECT id, name, category, rating, now() AS computed_at
+        FROM (
+            SELECT id, name, category, rating,
+                   rank() OVER (PARTITION BY category ORDER BY rating DESC, id ASC) AS rnk
+            FROM books
+            WHERE rating IS NOT NULL
+        ) ranked
+        WHERE rnk = 1
+    """)
+    op.execute('CREATE UNIQUE INDEX ux_trend_top_rated_books_id ON trend_top_rated_books (id)')
+    op.drop_index('ix_books_category_stock_count_id', table_name='books')
+    op.drop_index('ix_books_category_price_id', table_name='books')
+    op.drop_index('ix_books_category_rating_id', table_name='books')
@@ -0,0 +1,49 @@
+"""Added full-text and trigram search indexes on books
+
+Revision ID: 9d3e61b0a4c8
+Revises: 4f2a9c1d7e35
+Create Date: 2026-10-17 11:02:18.664731
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e61b0a4c8'
+down_revision: Union[str, Sequence[str], None] = '4f2a9c1d7e35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.add_column('books', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_books_name_trgm', 'books', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_books_category_trgm', 'books', ['category'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'category': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_books_category_trgm', table_name='books')
+    op.drop_index('ix_books_name_trgm', table_name='books')
+    op.drop_index('ix_books_search_vector', table_name='books')
+    op.drop_column('books', 'search_vector')
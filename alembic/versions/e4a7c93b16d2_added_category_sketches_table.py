@@ -0,0 +1,39 @@
+"""Added category sketches table
+
+Revision ID: e4a7c93b16d2
+Revises: 5b8f0d2c3a71
+Create Date: 2026-10-17 16:02:41.508213
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c93b16d2'
+down_revision: Union[str, Sequence[str], None] = '5b8f0d2c3a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by the next run of the seeding job, which rebuilds the sketches when there are none,
+    # whether or not it inserts any book
+    op.create_table('category_sketches',
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('item_count', sa.BigInteger(), nullable=False),
+    sa.Column('sketch', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'),
+              nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'category')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('category_sketches')
@@ -1,6 +1,8 @@
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from app.ai.neighbors import has_book_neighbors, rebuild_book_neighbors, update_book_neighbors
+from app.crud.catalog import bump_catalog_version
 from app.crud.product import get_books_with_no_embedding
 from app.models.db import async_session
 from app.models.product import Book, BookAIDetails
@@ -47,6 +49,21 @@ async def generate_and_store_embeddings() -> None:
         if new_details:
             session.add_all(new_details)
 
+        if books:
+            # The neighbour lists are computed from the stored embeddings, including these
+            await session.flush()
+            if await has_book_neighbors(session):
+                await update_book_neighbors(session, [book.id for book in books])
+            else:
+                # First run since the neighbour table was added: fill it for every book
+                await rebuild_book_neighbors(session)
+            await bump_catalog_version(session)
+        elif not await has_book_neighbors(session):
+            # Also a first run, on a catalog whose books were all embedded before then
+            await rebuild_book_neighbors(session)
+            if await has_book_neighbors(session):
+                await bump_catalog_version(session)
+
         # Commit all changes (both updates and inserts)
         await session.commit()
 
@@ -8,6 +8,7 @@ from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.crud.catalog import bump_catalog_version
 from app.models.db import async_session
 from app.models.product import Book, BookAIDetails
 
@@ -67,6 +68,9 @@ async def fetch_summary_and_update_books(session: AsyncSession) -> int:
     if new_ai_details:
         session.add_all(new_ai_details)
 
+    if books:
+        await bump_catalog_version(session)
+
     # Commit all changes (both updates and inserts)
     await session.commit()
 
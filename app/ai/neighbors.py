@@ -0,0 +1,135 @@
+import os
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import BookAIDetails, BookNeighbor
+
+# Neighbours stored per book; requests for more fall back to the live vector search
+BOOK_NEIGHBOR_COUNT = int(os.getenv("BOOK_NEIGHBOR_COUNT", "20"))
+# Books scored per matrix product; a block's scores take this many x books x 4 bytes
+NEIGHBOR_BLOCK_SIZE = 1024
+# Rows per INSERT, well below asyncpg's limit of 32767 bind parameters
+NEIGHBOR_INSERT_BATCH = 5000
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Unit rows, so that a dot product is the cosine similarity; zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def nearest_neighbors(
+        matrix: np.ndarray, positions: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The ``k`` rows of the normalized ``matrix`` most similar to each of the rows at
+    ``positions``, other than itself, as (positions, scores) arrays of shape (len(positions), k)
+    sorted best first. Fewer than ``k`` columns if the matrix has fewer other rows.
+    """
+    k = min(k, len(matrix) - 1)
+    if k <= 0:
+        return np.empty((len(positions), 0), dtype=np.int64), np.empty((len(positions), 0))
+
+    scores = matrix[positions] @ matrix.T
+    scores[np.arange(len(positions)), positions] = -np.inf
+    # Partial sort: the top k of each row in any order, then only those k get sorted
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+async def load_embeddings(session: AsyncSession) -> tuple[np.ndarray, np.ndarray]:
+    """Ids of the books with an embedding, in id order, and their normalized embeddings"""
+    rows = (await session.execute(
+        select(BookAIDetails.book_id, BookAIDetails.embedding)
+        .where(BookAIDetails.embedding.isnot(None))
+        .order_by(BookAIDetails.book_id)
+    )).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    ids = np.array([row.book_id for row in rows], dtype=np.int64)
+    matrix = np.vstack([np.asarray(row.embedding, dtype=np.float32) for row in rows])
+    return ids, normalize(matrix)
+
+
+async def has_book_neighbors(session: AsyncSession) -> bool:
+    return bool(await session.scalar(select(exists().select_from(BookNeighbor))))
+
+
+async def store_neighbors(
+        session: AsyncSession, ids: np.ndarray, matrix: np.ndarray, positions: np.ndarray
+) -> None:
+    """Recomputes and replaces the neighbour lists of the books at ``positions``"""
+    for start in range(0, len(positions), NEIGHBOR_BLOCK_SIZE):
+        block = positions[start:start + NEIGHBOR_BLOCK_SIZE]
+        neighbors, scores = nearest_neighbors(matrix, block, BOOK_NEIGHBOR_COUNT)
+        await session.execute(
+            delete(BookNeighbor).where(BookNeighbor.book_id.in_(ids[block].tolist()))
+        )
+        rows = [
+            {"book_id": int(ids[position]), "rank": rank, "neighbor_id": int(ids[neighbor]),
+             "score": float(score)}
+            for position, row_neighbors, row_scores in zip(block, neighbors, scores, strict=True)
+            for rank, (neighbor, score) in enumerate(
+                zip(row_neighbors, row_scores, strict=True), start=1
+            )
+        ]
+        for batch in range(0, len(rows), NEIGHBOR_INSERT_BATCH):
+            await session.execute(
+                BookNeighbor.__table__.insert(), rows[batch:batch + NEIGHBOR_INSERT_BATCH]
+            )
+
+
+async def affected_positions(
+        session: AsyncSession, ids: np.ndarray, matrix: np.ndarray, book_ids: Sequence[int]
+) -> np.ndarray:
+    """
+    The newly embedded ``book_ids``, plus every book that one of them is now closer to than
+    the weakest neighbour on its stored list (or whose list is not full).
+    """
+    is_new = np.isin(ids, np.asarray(book_ids, dtype=np.int64))
+    new_positions = np.flatnonzero(is_new)
+    if not len(new_positions):
+        return new_positions
+
+    # Each book's best score against any of the new ones
+    best = np.full(len(ids), -np.inf, dtype=np.float32)
+    for start in range(0, len(new_positions), NEIGHBOR_BLOCK_SIZE):
+        block = new_positions[start:start + NEIGHBOR_BLOCK_SIZE]
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(len(block)), block] = -np.inf
+        np.maximum(best, scores.max(axis=0), out=best)
+
+    threshold = np.full(len(ids), -np.inf)
+    result = await session.execute(
+        select(BookNeighbor.book_id, func.min(BookNeighbor.score).label("weakest"))
+        .group_by(BookNeighbor.book_id)
+        .having(func.count() >= min(BOOK_NEIGHBOR_COUNT, len(ids) - 1))
+    )
+    for row in result.all():
+        position = np.searchsorted(ids, row.book_id)
+        if position < len(ids) and ids[position] == row.book_id:
+            threshold[position] = row.weakest
+    return np.flatnonzero(is_new | (best > threshold))
+
+
+async def update_book_neighbors(session: AsyncSession, book_ids: Sequence[int]) -> None:
+    """
+    Brings the neighbour lists up to date with the newly embedded ``book_ids``. Called by the
+    embedding job inside its own transaction after flushing the embeddings; the caller commits.
+    """
+    ids, matrix = await load_embeddings(session)
+    await store_neighbors(session, ids, matrix, await affected_positions(
+        session, ids, matrix, book_ids
+    ))
+
+
+async def rebuild_book_neighbors(session: AsyncSession) -> None:
+    """Recomputes the neighbour lists of every book with an embedding; the caller commits"""
+    ids, matrix = await load_embeddings(session)
+    await session.execute(delete(BookNeighbor))
+    await store_neighbors(session, ids, matrix, np.arange(len(ids)))
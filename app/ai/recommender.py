@@ -1,35 +1,202 @@
-from typing import cast
+from typing import Any, Literal, Optional, Sequence, Union
 
-from sqlalchemy import select
+from sqlalchemy import Row, Select, func, select, true
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.selectable import CTE, Subquery
 
-from app.models.product import Book, BookAIDetails
+from app.ai.neighbors import BOOK_NEIGHBOR_COUNT
+from app.crud.product import BOOK_LIST_COLUMNS, build_book_filters
+from app.models.product import Book, BookAIDetails, BookNeighbor
 
+SearchQuality = Literal["fast", "balanced", "high", "exact"]
 
-async def get_similar_books_to_given_book(
-    session: AsyncSession, book_id: int, k: int = 5
-) -> list[Book]:
+# (hnsw.ef_search, ivfflat.probes) per quality: more candidates examined means better recall
+# and slower searches. Both are set, so it works whichever index type the migration built.
+SEARCH_QUALITY_SETTINGS: dict[SearchQuality, tuple[int, int]] = {
+    "fast": (20, 1),
+    "balanced": (40, 10),
+    "high": (200, 40),
+}
+# The largest hnsw.ef_search pgvector accepts
+HNSW_MAX_EF_SEARCH = 1000
+# Nearest candidates read per wanted book when filters may reject some of them
+FILTERED_OVERFETCH = 10
+
+
+async def apply_search_quality(session: AsyncSession, quality: SearchQuality, k: int) -> None:
     """
-    Returns the top k most similar book IDs (excluding the target itself)
-    ranked by cosine distance using pgvector integration.
+    Tunes the vector index scan for the rest of the session's current transaction, like
+    SET LOCAL. "exact" turns index scans off, so the search is an exact sequential scan.
     """
+    if quality == "exact":
+        settings = {"enable_indexscan": "off"}
+    else:
+        ef_search, probes = SEARCH_QUALITY_SETTINGS[quality]
+        # An HNSW scan returns at most ef_search rows
+        ef_search = min(max(ef_search, k), HNSW_MAX_EF_SEARCH)
+        settings = {"hnsw.ef_search": str(ef_search), "ivfflat.probes": str(probes)}
+    for name, value in settings.items():
+        await session.execute(select(func.set_config(name, value, True)))
 
-    # 1. Get the target book's embedding
-    result = await session.execute(
-        select(BookAIDetails.embedding).where(BookAIDetails.book_id == book_id)
-    )
-    target_embedding = result.scalar_one_or_none()
 
-    if target_embedding is None:
-        return []
+def similar_book_filters(
+        min_rating: Optional[int] = None,
+        max_price: Optional[float] = None,
+        category: Optional[str] = None,
+        in_stock: bool = False,
+) -> list[ColumnElement[bool]]:
+    """The product listing filters, plus only books with stock left"""
+    filters = build_book_filters(min_rating=min_rating, max_price=max_price, category=category)
+    if in_stock:
+        filters.append(Book.stock_count > 0)
+    return filters
+
 
-    # 2. Query for k most similar books (excluding self)
+async def get_precomputed_similar_books(
+    session: AsyncSession,
+    book_id: int,
+    k: int,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+) -> Sequence[Row[Any]]:
+    """
+    Books ``offset`` to ``offset + k`` of the neighbour list the embedding job stored for the
+    book, with their score, in one primary key range read. Empty if the book has no list yet.
+    """
     query = (
-        select(Book)
-        .join(BookAIDetails, Book.id == BookAIDetails.book_id)
+        select(*BOOK_LIST_COLUMNS, BookNeighbor.score)
+        .join(BookNeighbor, BookNeighbor.neighbor_id == Book.id)
+        .where(BookNeighbor.book_id == book_id)
+        .order_by(BookNeighbor.rank)
+        .offset(offset)
+        .limit(k)
+    )
+    if min_score is not None:
+        query = query.where(BookNeighbor.score >= min_score)
+    return (await session.execute(query)).all()
+
+
+def similar_books_query(
+        book_id: int,
+        filters: list[ColumnElement[bool]],
+        k: int,
+        offset: int = 0,
+        min_score: Optional[float] = None,
+        candidates: Optional[int] = None,
+) -> Select[Any]:
+    """
+    The target's embedding comes from a CTE in the same statement, and is compared to the
+    others as a constant, so the ORDER BY can be served by the vector index. With
+    ``candidates``, only that many nearest books are read through the index before the filters
+    are applied (over-fetch and re-filter); without, the filters apply to every book.
+
+    With ``candidates``, every row also has ``fetched``, how many candidates were read, and
+    ``farthest``, the distance of the last one; a row with a NULL id carries them when no
+    candidate passes the filters.
+    """
+    target = (
+        select(BookAIDetails.embedding).where(BookAIDetails.book_id == book_id).cte("target")
+    )
+    target_embedding = select(target.c.embedding).scalar_subquery()
+    distance = BookAIDetails.embedding.cosine_distance(target_embedding)
+    nearest = (
+        select(BookAIDetails.book_id, distance.label("distance"))
+        # Evaluated once up front: nothing is scanned when the target has no embedding
+        .where(select(target.c.embedding).where(target.c.embedding.isnot(None)).exists())
         .where(BookAIDetails.book_id != book_id)
-        .order_by(BookAIDetails.embedding.op('<=>')(target_embedding))
+        # Summary-only rows have no embedding to rank
+        .where(BookAIDetails.embedding.isnot(None))
+        .order_by(distance)
+    )
+    ranked: Union[Subquery, CTE]
+    if candidates is None:
+        nearest = nearest.join(Book, Book.id == BookAIDetails.book_id).where(*filters)
+        filters = []
+        ranked = nearest.subquery()
+    else:
+        # Referenced twice below, so it is materialized and the index is scanned once
+        ranked = nearest.limit(candidates).cte("candidates")
+
+    query = (
+        select(*BOOK_LIST_COLUMNS, (1 - ranked.c.distance).label("score"))
+        .join(ranked, ranked.c.book_id == Book.id)
+        .where(*filters)
+        .order_by(ranked.c.distance, Book.id)
+        .offset(offset)
         .limit(k)
     )
-    result = await session.execute(query)
-    return cast(list["Book"], result.scalars().all())
+    if min_score is not None:
+        query = query.where(ranked.c.distance <= 1 - min_score)
+    if candidates is None:
+        return query
+
+    window = select(
+        func.count().label("fetched"), func.max(ranked.c.distance).label("farthest")
+    ).subquery("candidate_window")
+    page = query.subquery("page")
+    return (
+        select(*page.c, window.c.fetched, window.c.farthest)
+        .select_from(window.outerjoin(page, true()))
+        .order_by(page.c.score.desc(), page.c.id)
+    )
+
+
+def exhausted_window(
+        rows: Sequence[Row[Any]], candidates: int, min_score: Optional[float]
+) -> bool:
+    """
+    Whether the over-fetch read all its ``candidates`` and the farthest of them still passed
+    ``min_score``, so books beyond the window could have been returned too
+    """
+    if rows[0].fetched < candidates:
+        return False
+    return min_score is None or rows[0].farthest <= 1 - min_score
+
+
+async def get_similar_books_to_given_book(
+    session: AsyncSession,
+    book_id: int,
+    k: int = 5,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+    quality: SearchQuality = "balanced",
+    min_rating: Optional[int] = None,
+    max_price: Optional[float] = None,
+    category: Optional[str] = None,
+    in_stock: bool = False,
+) -> Sequence[Row[Any]]:
+    """
+    Returns the top k most similar books (excluding the target itself) after the first
+    ``offset``, with their cosine similarity as ``score``, using pgvector integration.
+
+    Unfiltered requests are answered from the precomputed neighbour lists when the book has
+    one that is long enough, since they are exact whatever the quality. Otherwise the nearest
+    candidates are read through the vector index and then filtered; if the filters leave
+    fewer than k and there may be more beyond the candidates read, the search is repeated
+    exactly with the filters applied first. So is a search for more books than an HNSW scan
+    can return.
+    """
+    filters = similar_book_filters(
+        min_rating=min_rating, max_price=max_price, category=category, in_stock=in_stock
+    )
+    wanted = offset + k
+    if not filters and wanted <= BOOK_NEIGHBOR_COUNT:
+        precomputed = await get_precomputed_similar_books(session, book_id, k, offset, min_score)
+        if precomputed:
+            return precomputed
+
+    if quality != "exact" and wanted <= HNSW_MAX_EF_SEARCH:
+        candidates = min(wanted * FILTERED_OVERFETCH, HNSW_MAX_EF_SEARCH) if filters else wanted
+        await apply_search_quality(session, quality, candidates)
+        rows = (await session.execute(
+            similar_books_query(book_id, filters, k, offset, min_score, candidates)
+        )).all()
+        books = [row for row in rows if row.id is not None]
+        if len(books) == k or not filters or not exhausted_window(rows, candidates, min_score):
+            return books
+
+    await apply_search_quality(session, "exact", k)
+    return (await session.execute(
+        similar_books_query(book_id, filters, k, offset, min_score)
+    )).all()
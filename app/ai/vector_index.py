@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai.neighbors import load_embeddings
+from app.ai.recommender import SEARCH_QUALITY_SETTINGS, SearchQuality
+from app.crud.catalog import get_catalog_version
+from app.models.db import async_read_session
+from app.models.product import BookAIDetails
+
+try:
+    import hnswlib
+except ImportError:  # The "ann" extra; without it every catalog is searched by brute force
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+# Below this many embeddings one matrix-vector product beats walking a graph
+VECTOR_INDEX_HNSW_MIN_BOOKS = int(os.getenv("VECTOR_INDEX_HNSW_MIN_BOOKS", "50000"))
+# Same graph parameters as the default ix_book_ai_details_embedding index
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+Neighbors = list[tuple[int, float]]
+
+
+def build_graph(matrix: np.ndarray) -> Any:
+    """HNSW graph over the rows of ``matrix``, labelled by row position; CPU bound"""
+    graph = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+    graph.init_index(max_elements=len(matrix), M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION)
+    graph.add_items(matrix, np.arange(len(matrix)))
+    return graph
+
+
+class VectorSnapshot:
+    """
+    Immutable copy of every book embedding at one catalog version, as one contiguous float32
+    matrix of unit rows. A search is a single BLAS matrix-vector product over it, or a walk of
+    the HNSW graph built over it for large catalogs.
+    """
+
+    def __init__(self, version: int, ids: np.ndarray, matrix: np.ndarray, graph: Any = None):
+        self.version = version
+        self.ids = ids
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.graph = graph
+        self.position_of_id = {int(book_id): i for i, book_id in enumerate(ids)}
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def search(self, book_id: int, k: int, quality: SearchQuality) -> Optional[Neighbors]:
+        """
+        The ``k`` books most similar to ``book_id`` with their cosine similarity, best first,
+        or None if the book has no embedding. "exact" always scans the whole matrix.
+        """
+        position = self.position_of_id.get(book_id)
+        if position is None:
+            return None
+        k = min(k, self.size - 1)
+        if k <= 0:
+            return []
+
+        if self.graph is not None and quality != "exact":
+            ef_search, _ = SEARCH_QUALITY_SETTINGS[quality]
+            # One more than k, since the book itself is usually the first match
+            self.graph.set_ef(max(ef_search, k + 1))
+            labels, distances = self.graph.knn_query(self.matrix[position], k=k + 1)
+            return [
+                (int(self.ids[label]), 1 - float(distance))
+                for label, distance in zip(labels[0], distances[0], strict=True)
+                if label != position
+            ][:k]
+
+        scores = self.matrix @ self.matrix[position]
+        scores[position] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+
+async def load_vector_snapshot(
+        session: AsyncSession, previous: Optional[VectorSnapshot] = None
+) -> VectorSnapshot:
+    """
+    The embeddings at the current catalog version. If the same books have embeddings as in
+    ``previous`` (embeddings are never rewritten), its matrix and graph are kept and only
+    the ids are read.
+    """
+    # One snapshot transaction, so the version read matches the rows read
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version = await get_catalog_version(session)
+    if previous is not None:
+        ids = np.fromiter((await session.scalars(
+            select(BookAIDetails.book_id)
+            .where(BookAIDetails.embedding.isnot(None))
+            .order_by(BookAIDetails.book_id)
+        )).all(), dtype=np.int64)
+        if np.array_equal(ids, previous.ids):
+            return VectorSnapshot(version, previous.ids, previous.matrix, previous.graph)
+
+    ids, matrix = await load_embeddings(session)
+    return VectorSnapshot(version, ids, matrix)
+
+
+class VectorIndex:
+    """
+    Optional in-process index of the book embeddings that answers similar-book searches without
+    a vector scan in the database. It is reloaded whenever the catalog version changes, and the
+    new snapshot replaces the old one only once fully built; like the catalog read model, it
+    only answers for the version it was loaded at.
+    """
+
+    def __init__(self, enabled: bool, hnsw_min_books: int = VECTOR_INDEX_HNSW_MIN_BOOKS):
+        self.enabled = enabled
+        self.hnsw_min_books = hnsw_min_books
+        self.snapshot: Optional[VectorSnapshot] = None
+
+    async def refresh(self, version: int) -> None:
+        if not self.enabled or (self.snapshot is not None and self.snapshot.version == version):
+            return
+        try:
+            async with async_read_session() as session:
+                snapshot = await load_vector_snapshot(session, self.snapshot)
+            if (
+                    snapshot.graph is None
+                    and hnswlib is not None
+                    and snapshot.size >= self.hnsw_min_books
+            ):
+                # Built off the event loop; requests keep using the database meanwhile
+                snapshot.graph = await asyncio.to_thread(build_graph, snapshot.matrix)
+        except Exception as e:
+            logger.warning(f"Could not load the vector index: {e}")
+            return
+        self.snapshot = snapshot
+        logger.info(f"Loaded {snapshot.size} embeddings into the vector index at version {version}")
+
+    def search(
+            self,
+            version: Optional[int],
+            book_id: int,
+            k: int = 5,
+            quality: SearchQuality = "balanced",
+    ) -> Optional[Neighbors]:
+        """Like VectorSnapshot.search, or None to fall back to the database"""
+        snapshot = self.snapshot
+        if snapshot is None or version is None or snapshot.version != version:
+            return None
+        return snapshot.search(book_id, k, quality)
+
+
+vector_index = VectorIndex(VECTOR_INDEX_ENABLED)
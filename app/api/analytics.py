@@ -1,94 +1,140 @@
-from typing import Any, List
+import asyncio
+import time
+from typing import Any, List, Optional
 
-from ai.recommender import get_similar_books_to_given_book
-from fastapi import APIRouter, Depends, HTTPException
-from schemas.product import BookListOut
+from ai.recommender import SearchQuality, get_similar_books_to_given_book
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from schemas.product import SimilarBookOut
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crud.analytics import (
-    average_price_by_category,
-    average_price_by_rating_decile,
-    avg_rating_for_popular_categories,
-    get_highest_rated_books_per_category,
-    most_common_categories,
-)
-from app.models.db import get_session
+from app.ai.vector_index import vector_index
+from app.api.cache import catalog_version_watcher
+from app.api.trends import TREND_REGISTRY, Trend, get_trend, timed_trend
+from app.crud.product import get_book_list_by_ids
+from app.models.db import get_read_session
 
 router = APIRouter()
 
-# Define available trends metadata
-AVAILABLE_TRENDS = {
-    "price_by_rating_decile": {
-        "name": "Price by Rating Decile",
-        "description": "Average price grouped by rating deciles",
-        "endpoint": "/trends/price_by_rating_decile"
-    },
-    "top_categories": {
-        "name": "Top Categories",
-        "description": "Most common product categories",
-        "endpoint": "/trends/top_categories"
-    },
-    "average_rating_by_category": {
-        "name": "Average Rating by Category",
-        "description": "Average ratings for popular categories",
-        "endpoint": "/trends/average_rating_by_category"
-    },
-    "average_price_by_category": {
-        "name": "Average Price by Category",
-        "description": "Average price grouped by category",
-        "endpoint": "/trends/average_price_by_category"
-    },
-    "highest_rated_books_per_category": {
-        "name": "Highest Rated Books in each category",
-        "description": "Books with the highest ratings for each category",
-        "endpoint": "/trends/highest_rated_books_per_category"
-    },
-}
-
 
 @router.get("/trends")
 async def get_available_trends() -> dict[str, Any]:
     """Get list of available trends with their metadata"""
     return {
-        "trends": AVAILABLE_TRENDS
+        "trends": {key: trend.info() for key, trend in TREND_REGISTRY.items()}
     }
 
 
-@router.get("/trends/{trend_key}")
-async def get_trend_data(
-        trend_key: str,
-        session: AsyncSession = Depends(get_session)
+def batch_params(trend: Trend, request: Request) -> Any:
+    """A trend's parameters in a batch are passed as ``<trend_key>.<param>=value``"""
+    prefix = f"{trend.key}."
+    values = {
+        name.removeprefix(prefix): value
+        for name, value in request.query_params.items()
+        if name.startswith(prefix)
+    }
+    try:
+        return trend.params.model_validate(values)
+    except ValidationError as e:
+        detail = [{**error, "loc": [trend.key, *error["loc"]]} for error in e.errors(
+            include_url=False, include_context=False
+        )]
+        raise HTTPException(status_code=422, detail=detail) from e
+
+
+# Declared before /trends/{trend_key} so "batch" is not taken for a trend key
+@router.get("/trends/batch")
+async def get_trend_batch(
+        request: Request,
+        keys: Optional[str] = Query(None, description="Comma-separated trend keys; all if omitted"),
+        include: str = Query("data", description="'data' to include each trend's data"),
 ) -> dict[str, Any]:
-    """Get data for a specific trend"""
-    if trend_key not in AVAILABLE_TRENDS:
+    """Compute several trends concurrently, each on its own pooled connection"""
+    trend_keys = [key.strip() for key in keys.split(",") if key.strip()] if keys else []
+    unknown = [key for key in trend_keys if key not in TREND_REGISTRY]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Trends not found: {', '.join(unknown)}")
+    trends = [TREND_REGISTRY[key] for key in dict.fromkeys(trend_keys or TREND_REGISTRY)]
+    params = [batch_params(trend, request) for trend in trends]
+    include_data = "data" in include.split(",")
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        timed_trend(trend, trend_params, include_data)
+        for trend, trend_params in zip(trends, params, strict=True)
+    ))
+    return {
+        "trends": {trend.key: result for trend, result in zip(trends, results, strict=True)},
+        "elapsed_ms": round(1000 * (time.perf_counter() - start), 3),
+    }
+
+
+@router.get("/trends/{trend_key}")
+async def get_trend_data(trend_key: str, request: Request) -> dict[str, Any]:
+    """Get data for a specific trend; query parameters follow the trend's parameter schema"""
+    trend = TREND_REGISTRY.get(trend_key)
+    if trend is None:
         raise HTTPException(status_code=404, detail=f"Trend '{trend_key}' not found")
 
-    if trend_key == "price_by_rating_decile":
-        data = await average_price_by_rating_decile(session)
-    elif trend_key == "top_categories":
-        data = await most_common_categories(session, k=3)
-    elif trend_key == "average_rating_by_category":
-        data = await avg_rating_for_popular_categories(session, min_count=3)
-    elif trend_key == "average_price_by_category":
-        data = await average_price_by_category(session)
-    elif trend_key == "highest_rated_books_per_category":
-        data = await get_highest_rated_books_per_category(session)
+    try:
+        params = trend.params.model_validate(dict(request.query_params))
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_context=False)
+        ) from e
 
+    data, computed_at = await get_trend(trend, params)
     return {
         "trend_key": trend_key,
-        "trend_info": AVAILABLE_TRENDS[trend_key],
-        "data": data
+        "trend_info": trend.info(),
+        "params": params.model_dump(),
+        "data": data,
+        "computed_at": computed_at,
     }
 
 
-@router.get("/trends/similar_books/{book_id}", response_model=List[BookListOut])
+@router.get("/trends/similar_books/{book_id}", response_model=List[SimilarBookOut])
 async def get_similar_books(
         book_id: int,
-        session: AsyncSession = Depends(get_session)
-) -> List[BookListOut]:
-    """Get similar books based on a given book ID"""
-    similar_books = await get_similar_books_to_given_book(session, book_id)
+        k: int = Query(5, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=1000),
+        min_score: Optional[float] = Query(None, ge=-1, le=1),
+        min_rating: Optional[int] = Query(None, ge=1, le=5),
+        max_price: Optional[float] = Query(None, ge=0),
+        category: Optional[str] = Query(None),
+        in_stock: bool = Query(False),
+        quality: SearchQuality = Query(
+            "balanced", description="Recall versus speed of the vector index search"
+        ),
+        session: AsyncSession = Depends(get_read_session)
+) -> List[SimilarBookOut]:
+    """Get similar books based on a given book ID, with their cosine similarity"""
+    filtered = min_rating is not None or max_price is not None or category is not None or in_stock
+    neighbors = None
+    if not filtered:
+        # The in-memory index knows embeddings only, so it serves unfiltered searches
+        neighbors = vector_index.search(
+            catalog_version_watcher.version, book_id, k=offset + k, quality=quality
+        )
+
+    similar_books: List[SimilarBookOut]
+    if neighbors is not None:
+        scores = {
+            book: score for book, score in neighbors[offset:]
+            if min_score is None or score >= min_score
+        }
+        # Searched in memory: only the winners are read from the database
+        similar_books = [
+            SimilarBookOut(**book.model_dump(), score=scores[book.id])
+            for book in await get_book_list_by_ids(session, list(scores))
+        ]
+    else:
+        rows = await get_similar_books_to_given_book(
+            session, book_id, k=k, offset=offset, min_score=min_score, quality=quality,
+            min_rating=min_rating, max_price=max_price, category=category, in_stock=in_stock,
+        )
+        similar_books = [SimilarBookOut.model_validate(row) for row in rows]
     if not similar_books:
         raise HTTPException(status_code=404, detail="No similar books found")
 
-    return [BookListOut.model_validate(book) for book in similar_books]
+    return similar_books
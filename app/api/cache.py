@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.crud.catalog import get_catalog_version
+from app.models.db import async_read_session
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", "5"))
+
+VersionListener = Callable[[int], Optional[Awaitable[None]]]
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of response bodies where every entry also expires after a TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.not_modified = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+        self._entries[key] = CachedResponse(
+            status=status,
+            headers=headers,
+            body=body,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "not_modified": self.not_modified,
+        }
+
+
+class CatalogVersionWatcher:
+    """
+    Keeps an in-process copy of the catalog version by polling the catalog_version table, and
+    notifies subscribers whenever a writer job has bumped it.
+    """
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.version: Optional[int] = None
+        self._listeners: list[VersionListener] = []
+
+    def subscribe(self, listener: VersionListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    async def set_version(self, version: int) -> None:
+        if version == self.version:
+            return
+        logger.info(f"Catalog version changed from {self.version} to {version}")
+        self.version = version
+        for listener in self._listeners:
+            outcome = listener(version)
+            if inspect.isawaitable(outcome):
+                await outcome
+
+    async def refresh(self) -> Optional[int]:
+        try:
+            async with async_read_session() as session:
+                version = await get_catalog_version(session)
+        except Exception as e:
+            # Keep serving with the last known version rather than failing requests
+            logger.warning(f"Could not read the catalog version: {e}")
+            return self.version
+
+        await self.set_version(version)
+        return version
+
+    async def run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.poll_seconds)
+
+
+def cache_key(version: int, scope: Scope) -> str:
+    """Route plus query parameters in a canonical order, scoped to a catalog version"""
+    params = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    return f"{version}:{scope['path']}?{urlencode(params)}"
+
+
+def etag_for(key: str) -> bytes:
+    """Strong ETag for a cache key: the same catalog version and request give the same body"""
+    return b'"' + hashlib.sha256(key.encode()).hexdigest()[:32].encode() + b'"'
+
+
+def etag_matches(etag: bytes, if_none_match: bytes, exists: bool) -> bool:
+    """
+    If-None-Match uses the weak comparison, so W/ prefixes are ignored. "*" only matches when
+    a representation ``exists``, since a request it would have missed might not find one.
+    """
+    candidates = [tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")]
+    return etag in candidates or (exists and b"*" in candidates)
+
+
+class ResponseCacheMiddleware:
+    """
+    Serves repeated GET requests under the given path prefixes from a ResponseCache before
+    they reach the routers, so a hit never opens a database session.
+
+    Responses also carry an ETag derived from the catalog version and the request, so a
+    conditional request whose If-None-Match still matches is answered with 304 before any
+    query runs or anything is serialized. Paths under ``etag_exclude_paths``, whose bodies
+    change with time and not only with the catalog version, are cached but get no ETag.
+
+    Only 200 responses are stored, keyed on the catalog version; requests are passed through
+    untouched until the watcher has read a version.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            cache: ResponseCache,
+            watcher: CatalogVersionWatcher,
+            path_prefixes: tuple[str, ...],
+            exclude_paths: tuple[str, ...] = (),
+            etag_exclude_paths: tuple[str, ...] = (),
+    ):
+        self.app = app
+        self.cache = cache
+        self.watcher = watcher
+        self.path_prefixes = path_prefixes
+        self.exclude_paths = exclude_paths
+        self.etag_exclude_paths = etag_exclude_paths
+
+    def is_cacheable(self, scope: Scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        path: str = scope["path"]
+        return (
+            scope["method"] == "GET"
+            and self.watcher.version is not None
+            and path.startswith(self.path_prefixes)
+            and not path.startswith(self.exclude_paths)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.is_cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+
+        version = self.watcher.version
+        assert version is not None
+        key = cache_key(version, scope)
+        etag = None if scope["path"].startswith(self.etag_exclude_paths) else etag_for(key)
+        cached = self.cache.get(key) if self.cache.enabled else None
+
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if (
+                etag is not None
+                and if_none_match is not None
+                and etag_matches(etag, if_none_match, exists=cached is not None)
+        ):
+            self.cache.not_modified += 1
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag)],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if cached is not None:
+            await send({
+                "type": "http.response.start",
+                "status": cached.status,
+                "headers": [*cached.headers, (b"x-cache", b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": cached.body})
+            return
+
+        status = 0
+        headers: list[tuple[bytes, bytes]] = []
+        body_parts: list[bytes] = []
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if status == 200 and etag is not None:
+                    headers.append((b"etag", etag))
+                message = {**message, "headers": [*headers, (b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body":
+                body_parts.append(message.get("body", b""))
+                # Skip storing if the catalog changed while this response was being built
+                if (
+                    not message.get("more_body", False)
+                    and status == 200
+                    and self.cache.enabled
+                    and self.watcher.version == version
+                ):
+                    self.cache.set(key, status, headers, b"".join(body_parts))
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+catalog_version_watcher = CatalogVersionWatcher(CATALOG_VERSION_POLL_SECONDS)
+catalog_version_watcher.subscribe(lambda version: response_cache.clear())
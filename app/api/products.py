@@ -1,16 +1,49 @@
-from typing import Any, Optional
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Literal, Optional, Sequence
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crud.product import get_book_by_id, get_books
-from app.models.db import get_session
-from app.schemas.product import BookDetailOut, BookListOut
+from app.api.cache import catalog_version_watcher
+from app.crud.arrow_export import (
+    ARROW_STREAM_MEDIA_TYPE,
+    arrow_stream_chunks,
+    catalog_arrow_schema,
+    stream_catalog_batches,
+)
+from app.crud.product import (
+    BookSort,
+    TotalMode,
+    count_books,
+    encode_cursor,
+    export_columns,
+    get_book_by_id,
+    get_book_facets,
+    get_book_list_rows,
+    get_books_by_ids,
+    resolve_sort,
+    stream_books,
+)
+from app.crud.read_model import catalog_read_model
+from app.models.db import async_read_session, get_read_session, read_session_context
+from app.schemas.product import (
+    BOOK_LIST_ADAPTER,
+    MAX_BATCH_IDS,
+    BookBatchIn,
+    BookBatchOut,
+    BookDetailOut,
+    BookFacets,
+    BookListPage,
+)
 
 router = APIRouter()
 
 
-@router.get("/", response_model=dict[str, Any])
+@router.get("/", response_model=BookListPage)
 async def list_products(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
@@ -19,27 +52,192 @@ async def list_products(
     min_rating: Optional[int] = Query(None, ge=1, le=5),
     category: Optional[str] = Query(None),
     q: Optional[str] = Query(None),
-    session: AsyncSession = Depends(get_session),
-) -> dict[str, Any]:
-    books = await get_books(
-        session=session,
-        skip=skip,
-        limit=limit,
+    sort: Optional[BookSort] = Query(None),
+    cursor: Optional[str] = Query(None),
+    total_mode: TotalMode = Query("exact"),
+) -> Response:
+    """Pages the read model serves never open a session, so they take no pooled connection"""
+    try:
+        sort = resolve_sort(sort, q)
+        if not q:
+            # Text search always goes to the database; everything else may be served in memory
+            cached_page = catalog_read_model.list_books(
+                catalog_version_watcher.version,
+                skip=skip,
+                limit=limit,
+                min_price=min_price,
+                max_price=max_price,
+                min_rating=min_rating,
+                category=category,
+                sort=sort,
+                cursor=cursor,
+            )
+            if cached_page is not None:
+                return Response(cached_page.model_dump_json(), media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    async with read_session_context() as session:
+        try:
+            rows = await get_book_list_rows(
+                session=session,
+                skip=skip,
+                limit=limit,
+                min_price=min_price,
+                max_price=max_price,
+                min_rating=min_rating,
+                category=category,
+                q=q,
+                sort=sort,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+        total = await count_books(
+            session=session,
+            mode=total_mode,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            category=category,
+            q=q,
+            sort=sort,
+        )
+
+    page = BookListPage.model_construct(
+        books=BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True),
+        total=total,
+        total_mode=total_mode,
+        next_cursor=encode_cursor(sort, rows[-1]) if len(rows) == limit else None,
+    )
+    # Serialized once here; returning a Response skips FastAPI's second validation pass
+    return Response(page.model_dump_json(), media_type="application/json")
+
+
+@router.get("/facets", response_model=BookFacets)
+async def product_facets(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    category: Optional[str] = Query(None),
+    q: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+) -> BookFacets:
+    """Per-category, per-rating and price bucket counts for the listing filters"""
+    return await get_book_facets(
+        session,
         min_price=min_price,
         max_price=max_price,
         min_rating=min_rating,
         category=category,
         q=q,
     )
-    return {"books": [BookListOut.model_validate(book) for book in books], "total": len(books)}
+
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": ARROW_STREAM_MEDIA_TYPE,
+}
+
+
+def ndjson_chunk(rows: Sequence[Row[Any]]) -> str:
+    return "".join(json.dumps(row._asdict(), ensure_ascii=False) + "\n" for row in rows)
+
+
+def csv_chunk(rows: Sequence[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+@router.get("/export")
+async def export_products(
+    format: Literal["ndjson", "csv", "arrow"] = Query("ndjson"),
+    include_summary: bool = Query(False),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    category: Optional[str] = Query(None),
+    q: Optional[str] = Query(None),
+) -> StreamingResponse:
+    """
+    Stream the whole (optionally filtered) catalog as NDJSON or CSV, or as an Arrow IPC stream
+    that always includes the summaries and embeddings
+    """
+    filters: dict[str, Any] = {
+        "min_price": min_price,
+        "max_price": max_price,
+        "min_rating": min_rating,
+        "category": category,
+        "q": q,
+    }
+
+    async def generate() -> AsyncIterator[str]:
+        # The session lives as long as the stream itself, not the request handler
+        if format == "csv":
+            # Written up front, so even an export that matches no book has its header
+            yield csv_chunk([export_columns(include_summary)])
+        async with async_read_session() as session:
+            async for rows in stream_books(session, include_summary=include_summary, **filters):
+                yield ndjson_chunk(rows) if format == "ndjson" else csv_chunk(rows)
+
+    async def generate_arrow() -> AsyncIterator[bytes]:
+        async with async_read_session() as session:
+            schema = await catalog_arrow_schema(session)
+            batches = stream_catalog_batches(session, schema, **filters)
+            async for chunk in arrow_stream_chunks(schema, batches):
+                yield chunk
+
+    return StreamingResponse(
+        generate_arrow() if format == "arrow" else generate(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'},
+    )
+
+
+async def batch_response(session: AsyncSession, book_ids: list[int]) -> Response:
+    # Each id is looked up once and reported in the order it was first asked for
+    book_ids = list(dict.fromkeys(book_ids))
+    found = await get_books_by_ids(session, book_ids)
+    batch = BookBatchOut.model_construct(
+        books=[found[book_id] for book_id in book_ids if book_id in found],
+        missing=[book_id for book_id in book_ids if book_id not in found],
+    )
+    return Response(batch.model_dump_json(), media_type="application/json")
+
+
+@router.get("/batch", response_model=BookBatchOut)
+async def book_batch(
+    ids: str = Query(..., description=f"Comma-separated book ids, at most {MAX_BATCH_IDS}"),
+    session: AsyncSession = Depends(get_read_session),
+) -> Response:
+    try:
+        book_ids = [int(book_id) for book_id in ids.split(",") if book_id.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers") from e
+    if not book_ids or len(book_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"Between 1 and {MAX_BATCH_IDS} ids must be given"
+        )
+    return await batch_response(session, book_ids)
+
+
+@router.post("/batch", response_model=BookBatchOut)
+async def book_batch_post(
+    batch: BookBatchIn,
+    session: AsyncSession = Depends(get_read_session),
+) -> Response:
+    return await batch_response(session, batch.ids)
 
 
 @router.get("/{book_id}", response_model=BookDetailOut)
 async def book_detail(
     book_id: int,
-    session: AsyncSession = Depends(get_session),
-) -> BookDetailOut:
+    session: AsyncSession = Depends(get_read_session),
+) -> Response:
     book = await get_book_by_id(session, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    return Response(book.model_dump_json(), media_type="application/json")
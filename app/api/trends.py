@@ -0,0 +1,403 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.cache import catalog_version_watcher
+from app.crud import analytics, history, sketches, trend_views
+from app.crud import analytics_engine as engine
+from app.crud.analytics_engine import ColumnarCatalog, analytics_engine
+from app.models.db import async_read_session
+from app.schemas.analytics import (
+    CorrelationParams,
+    GroupByParams,
+    HistogramParams,
+    HistoryWindowParams,
+    NoTrendParams,
+    PopularCategoriesParams,
+    QuantileParams,
+    RatingDecileParams,
+    SketchHistogramParams,
+    TopBooksParams,
+    TopCategoriesParams,
+)
+
+logger = logging.getLogger(__name__)
+
+TREND_CACHE_MAX_ENTRIES = int(os.getenv("TREND_CACHE_MAX_ENTRIES", "256"))
+# How long past its TTL a result may still be served while it is recomputed in the background
+TREND_CACHE_STALE_SECONDS = float(os.getenv("TREND_CACHE_STALE_SECONDS", "300"))
+
+# Reported in place of a trend that failed in a batch
+TREND_FAILED = "Trend computation failed"
+
+# The trend data and when it was computed
+TrendResult = tuple[Any, Optional[datetime]]
+
+
+@dataclass(frozen=True)
+class Trend:
+    key: str
+    name: str
+    description: str
+    compute: Callable[[Any], Awaitable[TrendResult]]
+    params: type[BaseModel]
+    ttl_seconds: float
+    # Over a window ending now, so the result changes with time and not only with the catalog
+    time_windowed: bool = False
+
+    def info(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "endpoint": f"/trends/{self.key}",
+            "parameters": self.params.model_json_schema().get("properties", {}),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def on_read_session(
+        query: Callable[[AsyncSession, Any], Awaitable[TrendResult]]
+) -> Callable[[Any], Awaitable[TrendResult]]:
+    """A trend answered by SQL, on a session of its own since several requests may await it"""
+    async def compute(params: Any) -> TrendResult:
+        async with async_read_session() as session:
+            return await query(session, params)
+    return compute
+
+
+async def live(query: Awaitable[Any]) -> TrendResult:
+    """A trend computed by a live query, as of now"""
+    return await query, datetime.now(timezone.utc)
+
+
+def on_catalog_snapshot(
+        analysis: Callable[[ColumnarCatalog, Any], Any]
+) -> Callable[[Any], Awaitable[TrendResult]]:
+    """A trend answered in memory from the analytics engine's columnar snapshot"""
+    async def compute(params: Any) -> TrendResult:
+        catalog = await analytics_engine.current(catalog_version_watcher.version)
+        return analysis(catalog, params), catalog.loaded_at
+    return compute
+
+
+def on_loaded_snapshot_or_sql(
+        analysis: Callable[[ColumnarCatalog, Any], Any],
+        query: Callable[[AsyncSession, Any], Awaitable[TrendResult]],
+) -> Callable[[Any], Awaitable[TrendResult]]:
+    """
+    In memory like on_catalog_snapshot while the snapshot is up to date; otherwise answered by
+    SQL that returns one row per bucket, rather than waiting for the whole catalog to load
+    """
+    sql = on_read_session(query)
+
+    async def compute(params: Any) -> TrendResult:
+        catalog = analytics_engine.loaded(catalog_version_watcher.version)
+        if catalog is None:
+            return await sql(params)
+        return analysis(catalog, params), catalog.loaded_at
+    return compute
+
+
+TRENDS = [
+    Trend(
+        key="price_by_rating_decile",
+        name="Price by Rating Decile",
+        description="Average price grouped by rating deciles",
+        compute=on_loaded_snapshot_or_sql(
+            lambda catalog, params: engine.price_by_rating_decile(
+                catalog, buckets=params.buckets, by=params.by
+            ),
+            lambda session, params: live(analytics.average_price_by_rating_decile(
+                session, buckets=params.buckets, by=params.by
+            )),
+        ),
+        params=RatingDecileParams,
+        ttl_seconds=300,
+    ),
+    Trend(
+        key="top_categories",
+        name="Top Categories",
+        description="Most common product categories",
+        compute=on_read_session(
+            lambda session, params: trend_views.most_common_categories(session, k=params.k)
+        ),
+        params=TopCategoriesParams,
+        ttl_seconds=30,
+    ),
+    Trend(
+        key="average_rating_by_category",
+        name="Average Rating by Category",
+        description="Average ratings for popular categories",
+        compute=on_read_session(
+            lambda session, params: trend_views.avg_rating_for_popular_categories(
+                session, min_count=params.min_count
+            )
+        ),
+        params=PopularCategoriesParams,
+        ttl_seconds=30,
+    ),
+    Trend(
+        key="average_price_by_category",
+        name="Average Price by Category",
+        description="Average price grouped by category",
+        compute=on_read_session(
+            lambda session, params: trend_views.average_price_by_category(session)
+        ),
+        params=NoTrendParams,
+        ttl_seconds=30,
+    ),
+    Trend(
+        key="highest_rated_books_per_category",
+        name="Highest Rated Books in each category",
+        description="Books with the highest rating, price or stock count in each category",
+        compute=on_read_session(
+            lambda session, params: live(analytics.get_highest_rated_books_per_category(
+                session, top_n=params.top_n, metric=params.metric
+            ))
+        ),
+        params=TopBooksParams,
+        ttl_seconds=30,
+    ),
+    Trend(
+        key="histogram",
+        name="Histogram",
+        description="Equal-width histogram of price, rating or stock count",
+        compute=on_catalog_snapshot(
+            lambda catalog, params: engine.histogram(
+                catalog, metric=params.metric, bins=params.bins, category=params.category
+            )
+        ),
+        params=HistogramParams,
+        ttl_seconds=300,
+    ),
+    Trend(
+        key="group_by",
+        name="Group By",
+        description="Count, sum, mean, min or max of a column per category or rating",
+        compute=on_catalog_snapshot(
+            lambda catalog, params: engine.group_by(
+                catalog, metric=params.metric, by=params.by, aggregate=params.aggregate
+            )
+        ),
+        params=GroupByParams,
+        ttl_seconds=300,
+    ),
+    Trend(
+        key="correlation",
+        name="Correlation",
+        description="Correlations between price, rating and stock count",
+        compute=on_catalog_snapshot(
+            lambda catalog, params: engine.correlation(catalog, category=params.category)
+        ),
+        params=CorrelationParams,
+        ttl_seconds=300,
+    ),
+    Trend(
+        key="quantiles",
+        name="Quantiles",
+        description="Approximate quantiles of a column, overall or per category",
+        compute=on_read_session(
+            lambda session, params: sketches.quantiles(
+                session,
+                metric=params.metric,
+                fractions=params.q,
+                category=params.category,
+                group=params.group,
+            )
+        ),
+        params=QuantileParams,
+        ttl_seconds=60,
+    ),
+    Trend(
+        key="sketch_histogram",
+        name="Sketch Histogram",
+        description="Approximate histogram over custom or equal-width bins",
+        compute=on_read_session(
+            lambda session, params: sketches.sketch_histogram(
+                session,
+                metric=params.metric,
+                bins=params.bins,
+                edges=params.edges,
+                category=params.category,
+            )
+        ),
+        params=SketchHistogramParams,
+        ttl_seconds=60,
+    ),
+    Trend(
+        key="price_movement",
+        name="Price Movement",
+        description="Books whose price changed the most over the last days of crawls",
+        compute=on_read_session(
+            lambda session, params: history.price_movement(
+                session, days=params.days, category=params.category, limit=params.limit
+            )
+        ),
+        params=HistoryWindowParams,
+        ttl_seconds=300,
+        time_windowed=True,
+    ),
+    Trend(
+        key="stock_depletion",
+        name="Stock Depletion",
+        description="Books selling out the fastest over the last days of crawls",
+        compute=on_read_session(
+            lambda session, params: history.stock_depletion(
+                session, days=params.days, category=params.category, limit=params.limit
+            )
+        ),
+        params=HistoryWindowParams,
+        ttl_seconds=300,
+        time_windowed=True,
+    ),
+]
+
+TREND_REGISTRY = {trend.key: trend for trend in TRENDS}
+
+
+@dataclass(frozen=True)
+class TrendEntry:
+    value: TrendResult
+    fresh_until: float
+    stale_until: float
+
+
+class TrendCache:
+    """
+    Bounded cache of trend results with per-entry TTLs.
+
+    Concurrent misses for the same key share one computation (single flight), and an entry
+    past its TTL but within the stale window is returned at once while a single background
+    task recomputes it, so readers only ever wait when there is nothing to serve.
+    """
+
+    def __init__(self, max_entries: int, stale_seconds: float):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self._entries: OrderedDict[Hashable, TrendEntry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future[TrendResult]] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.computations = 0
+
+    async def get(
+            self,
+            key: Hashable,
+            ttl_seconds: float,
+            compute: Callable[[], Awaitable[TrendResult]],
+    ) -> TrendResult:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.fresh_until:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            self._single_flight(key, ttl_seconds, compute)
+            return entry.value
+
+        self.misses += 1
+        # Shielded, so a cancelled request does not cancel the computation others wait on
+        return await asyncio.shield(self._single_flight(key, ttl_seconds, compute))
+
+    def _single_flight(
+            self,
+            key: Hashable,
+            ttl_seconds: float,
+            compute: Callable[[], Awaitable[TrendResult]],
+    ) -> asyncio.Future[TrendResult]:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+
+        future = asyncio.ensure_future(self._compute(key, ttl_seconds, compute))
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    async def _compute(
+            self,
+            key: Hashable,
+            ttl_seconds: float,
+            compute: Callable[[], Awaitable[TrendResult]],
+    ) -> TrendResult:
+        self.computations += 1
+        value = await compute()
+        now = time.monotonic()
+        self._entries[key] = TrendEntry(
+            value=value,
+            fresh_until=now + ttl_seconds,
+            stale_until=now + ttl_seconds + self.stale_seconds,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def _finish(self, key: Hashable, future: asyncio.Future[TrendResult]) -> None:
+        self._inflight.pop(key, None)
+        # Failures reach the awaiting callers; background refreshes have none, so log them here
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Computing trend {key} failed: {future.exception()}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "stale_seconds": self.stale_seconds,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "computations": self.computations,
+        }
+
+
+async def compute_trend(trend: Trend, params: BaseModel) -> TrendResult:
+    return await trend.compute(params)
+
+
+async def get_trend(trend: Trend, params: BaseModel) -> TrendResult:
+    """Cached result of a trend for validated parameters at the current catalog version"""
+    key = (catalog_version_watcher.version, trend.key, params.model_dump_json())
+    return await trend_cache.get(key, trend.ttl_seconds, lambda: compute_trend(trend, params))
+
+
+async def timed_trend(trend: Trend, params: BaseModel, include_data: bool) -> dict[str, Any]:
+    """One trend of a batch; a failure is reported in place instead of failing the batch"""
+    start = time.perf_counter()
+    payload: dict[str, Any] = {"params": params.model_dump()}
+    try:
+        data, computed_at = await get_trend(trend, params)
+    except Exception:
+        # The details stay in the log; they may include SQL and database internals
+        logger.exception(f"Trend {trend.key} failed in a batch")
+        payload["error"] = TREND_FAILED
+    else:
+        if include_data:
+            payload["data"] = data
+        payload["computed_at"] = computed_at
+    payload["elapsed_ms"] = round(1000 * (time.perf_counter() - start), 3)
+    return payload
+
+
+trend_cache = TrendCache(TREND_CACHE_MAX_ENTRIES, TREND_CACHE_STALE_SECONDS)
+# Entries of older versions can never be hit again
+catalog_version_watcher.subscribe(lambda version: trend_cache.clear())
+# Brings the snapshot up to date before the first trend request of a new version needs it
+catalog_version_watcher.subscribe(analytics_engine.refresh)
@@ -1,43 +1,69 @@
 from typing import Any
 
-import numpy as np
-from sqlalchemy import desc, func, select
+from sqlalchemy import Float, Select, and_, bindparam, desc, func, select, true, union_all
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.product import Book
+from app.schemas.analytics import BucketBy, Metric
 
 
 async def average_price_by_rating_decile(
-        session: AsyncSession
+        session: AsyncSession,
+        buckets: int = 10,
+        by: BucketBy = "price",
 ) -> list[dict[str, list[float] | float | None]]:
-    # Compute deciles by price and average rating for each decile
-    # Step 1: Fetch all prices and ratings
+    """
+    Splits the books into ``buckets`` quantile ranges of ``by`` (price deciles by default) and
+    averages the other column within each range.
+
+    The quantile edges (``percentile_cont``, interpolated like ``numpy.percentile``) and the
+    per-bucket averages (``width_bucket`` over those edges) come from one query, so only one
+    row per bucket leaves the database however large the catalog is. Every range is closed
+    on the left, and the last one also on the right. Returns [] if fewer books than buckets
+    have both a price and a rating.
+    """
+    bucket_column, averaged_column = (
+        (Book.price, Book.rating) if by == "price" else (Book.rating, Book.price)
+    )
+    fractions = [i / buckets for i in range(buckets + 1)]
+    complete = and_(Book.price.isnot(None), Book.rating.isnot(None))
+
+    edges = select(
+        func.percentile_cont(bindparam("fractions", fractions, type_=ARRAY(Float)))
+        .within_group(bucket_column)
+        .label("edges"),
+        func.count().label("books"),
+    ).where(complete).cte("edges")
+
+    # The maximum lands past the last edge, so it is folded into the last bucket
+    bucketed = select(
+        func.least(func.width_bucket(bucket_column, edges.c.edges), buckets).label("bucket"),
+        averaged_column.label("value"),
+    ).join_from(Book, edges, true()).where(complete).subquery()
+    averages = select(
+        bucketed.c.bucket, func.avg(bucketed.c.value).label("average")
+    ).group_by(bucketed.c.bucket).subquery()
+
     result = await session.execute(
-        select(Book.price, Book.rating).where(Book.price is not None, Book.rating is not None)
+        select(edges.c.edges, edges.c.books, averages.c.bucket, averages.c.average)
+        .outerjoin_from(edges, averages, true())
     )
     rows = result.all()
-    if not rows:
-        return []
-
-    prices = np.array([row.price for row in rows], dtype=float)
-    ratings = np.array([row.rating for row in rows], dtype=int)
-
-    # Compute deciles (0–10%, 10–20%, ...)
-    if len(prices) < 10:
+    if not rows or rows[0].books < buckets:
         return []
 
-    decile_edges = np.percentile(prices, [10 * i for i in range(11)])  # 0, 10, 20, ... 100
-    decile_stats = []
-    for i in range(10):
-        mask = (prices >= decile_edges[i]) & (prices < decile_edges[i + 1]) \
-            if i < 9 \
-            else (prices >= decile_edges[i]) & (prices <= decile_edges[i + 1])
-        avg_rating = float(np.mean(ratings[mask])) if np.any(mask) else None
-        decile_stats.append({
-            "price_range": [float(decile_edges[i]), float(decile_edges[i + 1])],
-            "average_rating": avg_rating,
-        })
-    return decile_stats
+    bucket_edges = [float(edge) for edge in rows[0].edges]
+    average_by_bucket = {row.bucket: float(row.average) for row in rows}
+    range_key = f"{by}_range"
+    average_key = "average_rating" if by == "price" else "average_price"
+    return [
+        {
+            range_key: [bucket_edges[i], bucket_edges[i + 1]],
+            average_key: average_by_bucket.get(i + 1),
+        }
+        for i in range(buckets)
+    ]
 
 
 async def most_common_categories(session: AsyncSession, k: int = 5) -> list[dict[str, Any]]:
@@ -55,7 +81,7 @@ async def average_price_by_category(session: AsyncSession) -> list[dict[str, Any
         select(
             Book.category,
             func.avg(Book.price).label("average_price")
-        ).where(Book.price is not None)
+        ).where(Book.price.isnot(None))
         .group_by(Book.category)
     )
     return [{"category": row[0], "average_price": float(row[1])} for row in result.all()]
@@ -86,41 +112,60 @@ async def avg_rating_for_popular_categories(session: AsyncSession,
     ]
 
 
-async def get_highest_rated_books_per_category(session: AsyncSession) -> list[dict[str, Any]]:
-    """
-    Returns exactly one book with the highest rating for each category (if tie: first by id).
+async def get_highest_rated_books_per_category(
+        session: AsyncSession, top_n: int = 1, metric: Metric = "rating"
+) -> list[dict[str, Any]]:
     """
+    Returns the ``top_n`` books with the highest ``metric`` in each category (if tie: first by
+    id), skipping books where it is NULL.
 
-    # Add a "rank" to each book partitioned by category, ordered by rating DESC, id ASC
-    # (for tie-break)
-    rank = func.rank().over(
-        partition_by=Book.category,
-        order_by=[Book.rating.desc(), Book.id.asc()]
-    ).label("rnk")
-
-    stmt = (
-        select(Book, rank)
-        .where(Book.rating.isnot(None))
-        .order_by(Book.category, Book.rating.desc(), Book.id.asc())
-    ).subquery()
+    The categories are walked with a recursive "skip scan", one index probe each, and each
+    category's books are read with a LATERAL ... LIMIT down its (category, metric DESC, id)
+    index. That reads about top_n x categories index entries instead of sorting every book.
+    """
+    column = getattr(Book, metric)
+
+    def top_books(category_filter: Any) -> Select[Any]:
+        return (
+            select(Book.id, Book.name, Book.category, column.label("value"))
+            .where(category_filter, column.isnot(None))
+            .order_by(column.desc(), Book.id.asc())
+            .limit(top_n)
+        )
 
-    # Now filter for only rnk == 1 (top rated per category)
-    stmt2 = select(
-        stmt.c.id,
-        stmt.c.name,
-        stmt.c.category,
-        stmt.c.rating,
-    ).where(stmt.c.rnk == 1)
+    first_category = (
+        select(Book.category)
+        .where(Book.category.isnot(None))
+        .order_by(Book.category)
+        .limit(1)
+    )
+    categories = first_category.cte("categories", recursive=True)
+    next_category = (
+        select(Book.category)
+        .where(Book.category > categories.c.category)
+        .order_by(Book.category)
+        .limit(1)
+        .scalar_subquery()
+    )
+    # Ends with a NULL row once there is no next category
+    categories = categories.union_all(
+        select(next_category).where(categories.c.category.isnot(None))
+    )
 
-    result = await session.execute(stmt2)
-    rows = result.fetchall()
+    per_category = top_books(Book.category == categories.c.category).lateral("top_books")
+    stmt = union_all(
+        select(per_category)
+        .select_from(categories)
+        .join(per_category, true())
+        .where(categories.c.category.isnot(None)),
+        # Books without a category form a group of their own, as in GROUP BY
+        top_books(Book.category.is_(None)),
+    ).subquery()
 
+    result = await session.execute(
+        select(stmt).order_by(stmt.c.category, stmt.c.value.desc(), stmt.c.id)
+    )
     return [
-        {
-            "id": row.id,
-            "name": row.name,
-            "category": row.category,
-            "rating": row.rating,
-        }
-        for row in rows
+        {"id": row.id, "name": row.name, "category": row.category, metric: row.value}
+        for row in result.all()
     ]
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Row, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import get_catalog_version
+from app.models.db import async_read_session
+from app.models.product import Book
+from app.schemas.analytics import Aggregate, BucketBy, GroupBy, Metric
+
+logger = logging.getLogger(__name__)
+
+METRICS: tuple[Metric, ...] = ("price", "rating", "stock_count")
+
+
+def nullable_floats(values: Sequence[Any]) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class ColumnarCatalog:
+    """
+    Immutable columnar snapshot of the numeric book columns. NULLs are NaN, and categories are
+    int32 codes into ``categories`` (-1 for no category), so grouping compares integers only.
+    """
+
+    version: int
+    loaded_at: datetime
+    ids: np.ndarray
+    price: np.ndarray
+    rating: np.ndarray
+    stock_count: np.ndarray
+    category_codes: np.ndarray
+    categories: tuple[str, ...]
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def max_id(self) -> int:
+        return int(self.ids.max()) if self.size else 0
+
+    def column(self, metric: Metric) -> np.ndarray:
+        return getattr(self, metric)  # type: ignore[no-any-return]
+
+    def append(self, version: int, rows: Sequence[Row[Any]]) -> "ColumnarCatalog":
+        """A new snapshot with ``rows`` added after the existing ones"""
+        categories = list(self.categories)
+        code_of = {category: code for code, category in enumerate(categories)}
+        codes = np.empty(len(rows), dtype=np.int32)
+        for i, row in enumerate(rows):
+            if row.category is None:
+                codes[i] = -1
+                continue
+            if row.category not in code_of:
+                code_of[row.category] = len(categories)
+                categories.append(row.category)
+            codes[i] = code_of[row.category]
+
+        return ColumnarCatalog(
+            version=version,
+            loaded_at=datetime.now(timezone.utc),
+            ids=np.concatenate([self.ids, np.array([row.id for row in rows], dtype=np.int64)]),
+            price=np.concatenate([self.price, nullable_floats([row.price for row in rows])]),
+            rating=np.concatenate([self.rating, nullable_floats([row.rating for row in rows])]),
+            stock_count=np.concatenate(
+                [self.stock_count, nullable_floats([row.stock_count for row in rows])]
+            ),
+            category_codes=np.concatenate([self.category_codes, codes]),
+            categories=tuple(categories),
+        )
+
+    def category_mask(self, category: Optional[str]) -> np.ndarray:
+        if category is None:
+            return np.ones(self.size, dtype=bool)
+        if category not in self.categories:
+            return np.zeros(self.size, dtype=bool)
+        return np.asarray(self.category_codes == self.categories.index(category))
+
+
+EMPTY_CATALOG = ColumnarCatalog(
+    version=-1,
+    loaded_at=datetime.min.replace(tzinfo=timezone.utc),
+    ids=np.empty(0, dtype=np.int64),
+    price=np.empty(0),
+    rating=np.empty(0),
+    stock_count=np.empty(0),
+    category_codes=np.empty(0, dtype=np.int32),
+    categories=(),
+)
+
+CATALOG_COLUMNS = (Book.id, Book.price, Book.rating, Book.stock_count, Book.category)
+
+
+async def load_catalog(
+        session: AsyncSession, previous: Optional[ColumnarCatalog] = None
+) -> ColumnarCatalog:
+    """
+    Brings ``previous`` up to date, fetching only books inserted since it was loaded. Writers
+    only ever insert books, so if the row count does not add up (a book was deleted) the
+    whole catalog is read again.
+    """
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version = await get_catalog_version(session)
+    if previous is not None and previous.version == version:
+        return previous
+
+    base = previous or EMPTY_CATALOG
+    new_rows = (await session.execute(
+        select(*CATALOG_COLUMNS).where(Book.id > base.max_id).order_by(Book.id)
+    )).all()
+    total = (await session.execute(select(func.count()).select_from(Book))).scalar_one()
+    if base.size + len(new_rows) != total:
+        logger.info("Book count changed outside of inserts, reloading the analytics catalog")
+        base = EMPTY_CATALOG
+        new_rows = (await session.execute(select(*CATALOG_COLUMNS).order_by(Book.id))).all()
+    return base.append(version, new_rows)
+
+
+class AnalyticsEngine:
+    """
+    Holds the current ColumnarCatalog. It is loaded on first use and brought up to date
+    incrementally whenever the catalog version moves, one refresh at a time.
+    """
+
+    def __init__(self) -> None:
+        self.snapshot: Optional[ColumnarCatalog] = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, version: Optional[int] = None) -> ColumnarCatalog:
+        async with self._lock:
+            snapshot = self.snapshot
+            if snapshot is not None and version is not None and snapshot.version >= version:
+                return snapshot
+            async with async_read_session() as session:
+                snapshot = await load_catalog(session, snapshot)
+            self.snapshot = snapshot
+            return snapshot
+
+    async def refresh(self, version: int) -> None:
+        """Catalog version listener; failures are retried by the next trend request"""
+        try:
+            await self.update(version)
+        except Exception as e:
+            logger.warning(f"Could not refresh the analytics catalog: {e}")
+
+    def loaded(self, version: Optional[int]) -> Optional[ColumnarCatalog]:
+        """The snapshot if it is already at least as new as ``version``, without loading one"""
+        snapshot = self.snapshot
+        if snapshot is None or version is None or snapshot.version < version:
+            return None
+        return snapshot
+
+    async def current(self, version: Optional[int]) -> ColumnarCatalog:
+        """A snapshot at least as new as ``version``"""
+        snapshot = self.snapshot
+        if snapshot is None or (version is not None and snapshot.version < version):
+            snapshot = await self.update(version)
+        return snapshot
+
+
+def price_by_rating_decile(
+        catalog: ColumnarCatalog, buckets: int = 10, by: BucketBy = "price"
+) -> list[dict[str, list[float] | float | None]]:
+    """Same result as ``app.crud.analytics.average_price_by_rating_decile``, from the snapshot"""
+    complete = ~np.isnan(catalog.price) & ~np.isnan(catalog.rating)
+    bucketed, averaged = (
+        (catalog.price, catalog.rating) if by == "price" else (catalog.rating, catalog.price)
+    )
+    values, others = bucketed[complete], averaged[complete]
+    if len(values) < buckets:
+        return []
+
+    edges = np.percentile(values, np.linspace(0, 100, buckets + 1))
+    # width_bucket semantics: ranges are closed on the left, and the maximum joins the last one
+    bucket = np.minimum(np.searchsorted(edges, values, side="right"), buckets)
+    counts = np.bincount(bucket, minlength=buckets + 1)
+    sums = np.bincount(bucket, weights=others, minlength=buckets + 1)
+
+    average_key = "average_rating" if by == "price" else "average_price"
+    return [
+        {
+            f"{by}_range": [float(edges[i]), float(edges[i + 1])],
+            average_key: float(sums[i + 1] / counts[i + 1]) if counts[i + 1] else None,
+        }
+        for i in range(buckets)
+    ]
+
+
+def histogram(
+        catalog: ColumnarCatalog,
+        metric: Metric = "price",
+        bins: int = 10,
+        category: Optional[str] = None,
+) -> list[dict[str, Any]]:
+    values = catalog.column(metric)[catalog.category_mask(category)]
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return []
+    counts, edges = np.histogram(values, bins=bins)
+    return [
+        {"range": [float(edges[i]), float(edges[i + 1])], "count": int(counts[i])}
+        for i in range(bins)
+    ]
+
+
+def group_by(
+        catalog: ColumnarCatalog,
+        metric: Metric = "price",
+        by: GroupBy = "category",
+        aggregate: Aggregate = "mean",
+) -> list[dict[str, Any]]:
+    """``aggregate(metric)`` per category or per rating, ignoring books where either is NULL"""
+    values = catalog.column(metric)
+    if by == "category":
+        keys = catalog.category_codes.astype(np.int64)
+        present = ~np.isnan(values) & (keys >= 0)
+    else:
+        keys = np.nan_to_num(catalog.rating, nan=-1).astype(np.int64)
+        present = ~np.isnan(values) & ~np.isnan(catalog.rating)
+    keys, values = keys[present], values[present]
+    if not len(keys):
+        return []
+
+    # Sorting by key makes every group a contiguous run that reduceat can aggregate
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    if aggregate == "count":
+        results = counts.astype(np.float64)
+    elif aggregate == "sum":
+        results = np.add.reduceat(values, starts)
+    elif aggregate == "mean":
+        results = np.add.reduceat(values, starts) / counts
+    elif aggregate == "min":
+        results = np.minimum.reduceat(values, starts)
+    else:
+        results = np.maximum.reduceat(values, starts)
+
+    return [
+        {
+            by: catalog.categories[group] if by == "category" else int(group),
+            "books": int(count),
+            aggregate: int(result) if aggregate == "count" else float(result),
+        }
+        for group, count, result in zip(groups, counts, results, strict=True)
+    ]
+
+
+def correlation(catalog: ColumnarCatalog, category: Optional[str] = None) -> dict[str, Any]:
+    """Pearson correlations between price, rating and stock count over complete books"""
+    columns = np.vstack([catalog.column(metric) for metric in METRICS])
+    complete = catalog.category_mask(category) & ~np.isnan(columns).any(axis=0)
+    books = int(np.count_nonzero(complete))
+    if books < 2:
+        return {"books": books, "matrix": None}
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        matrix = np.corrcoef(columns[:, complete])
+    return {
+        "books": books,
+        "matrix": {
+            row_metric: {
+                column_metric: None if np.isnan(matrix[i, j]) else float(matrix[i, j])
+                for j, column_metric in enumerate(METRICS)
+            }
+            for i, row_metric in enumerate(METRICS)
+        },
+    }
+
+
+analytics_engine = AnalyticsEngine()
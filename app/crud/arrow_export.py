@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import get_catalog_version
+from app.crud.product import EXPORT_BATCH_SIZE, build_book_filters
+from app.models.db import async_read_session
+from app.models.product import Book, BookAIDetails
+
+EMBEDDING_DIMENSIONS: int = BookAIDetails.__table__.c.embedding.type.dim
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Marks the end of an Arrow IPC stream
+ARROW_STREAM_END = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+CATALOG_ARROW_COLUMNS = (
+    Book.id,
+    Book.name,
+    Book.price,
+    Book.rating,
+    Book.description,
+    Book.category,
+    Book.upc,
+    Book.availability,
+    Book.stock_count,
+    BookAIDetails.summary,
+    BookAIDetails.embedding,
+)
+
+CATALOG_ARROW_SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("name", pa.string(), nullable=False),
+    pa.field("price", pa.float64()),
+    pa.field("rating", pa.int32()),
+    pa.field("description", pa.string()),
+    pa.field("category", pa.string()),
+    pa.field("upc", pa.string()),
+    pa.field("availability", pa.string()),
+    pa.field("stock_count", pa.int32()),
+    pa.field("summary", pa.string()),
+    # Fixed-size float32 lists, so a column of embeddings is one contiguous matrix
+    pa.field("embedding", pa.list_(pa.float32(), EMBEDDING_DIMENSIONS)),
+])
+
+
+def embedding_array(embeddings: Sequence[Any]) -> pa.FixedSizeListArray:
+    """Books without an embedding get a null entry (backed by zeros)"""
+    matrix = np.zeros((len(embeddings), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    missing = np.zeros(len(embeddings), dtype=bool)
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing[i] = True
+        else:
+            matrix[i] = embedding
+    return pa.FixedSizeListArray.from_arrays(
+        pa.array(matrix.ravel()), EMBEDDING_DIMENSIONS, mask=pa.array(missing)
+    )
+
+
+def rows_to_batch(rows: Sequence[Row[Any]], schema: pa.Schema) -> pa.RecordBatch:
+    arrays = [
+        pa.array([getattr(row, field.name) for row in rows], type=field.type)
+        for field in schema
+        if field.name != "embedding"
+    ]
+    arrays.append(embedding_array([row.embedding for row in rows]))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+async def catalog_arrow_schema(session: AsyncSession) -> pa.Schema:
+    """
+    The export schema, tagged with the catalog version it is read at. Starts the REPEATABLE
+    READ transaction the batches are then read in, so they all match that version.
+    """
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version = await get_catalog_version(session)
+    return CATALOG_ARROW_SCHEMA.with_metadata({"catalog_version": str(version)})
+
+
+async def stream_catalog_batches(
+        session: AsyncSession, schema: pa.Schema, **filters: Any
+) -> AsyncIterator[pa.RecordBatch]:
+    """
+    Streams books joined with their AI details in id order as Arrow record batches of up to
+    EXPORT_BATCH_SIZE rows, from a server-side cursor. ``filters`` are those of get_books.
+    """
+    query = (
+        select(*CATALOG_ARROW_COLUMNS)
+        .outerjoin(BookAIDetails, BookAIDetails.book_id == Book.id)
+        .where(*build_book_filters(**filters))
+        .order_by(Book.id)
+    )
+    result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        yield rows_to_batch(partition, schema)
+
+
+async def arrow_stream_chunks(
+        schema: pa.Schema, batches: AsyncIterator[pa.RecordBatch]
+) -> AsyncIterator[bytes]:
+    """The Arrow IPC stream format: the schema message, one message per batch, then the end"""
+    yield schema.serialize().to_pybytes()
+    async for batch in batches:
+        yield batch.serialize().to_pybytes()
+    yield ARROW_STREAM_END
+
+
+async def write_catalog_file(session: AsyncSession, path: Path) -> int:
+    """
+    Writes the catalog to ``path`` one batch at a time, so memory stays bounded by
+    EXPORT_BATCH_SIZE rows. ``.parquet`` files get a zstd-compressed row group per batch; any
+    other suffix gets an uncompressed Arrow IPC file, which load_catalog_file can memory-map
+    without copying. The file only appears at ``path`` once complete. Returns the row count.
+    """
+    schema = await catalog_arrow_schema(session)
+    partial = path.with_name(f".{path.name}.partial")
+    writer: pq.ParquetWriter | pa.ipc.RecordBatchFileWriter
+    if path.suffix == ".parquet":
+        writer = pq.ParquetWriter(partial, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(partial, schema)
+
+    rows = 0
+    try:
+        with writer:
+            async for batch in stream_catalog_batches(session, schema):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    os.replace(partial, path)
+    return rows
+
+
+def load_catalog_file(path: Path, columns: Optional[list[str]] = None) -> pa.Table:
+    """
+    Memory-maps an export written by write_catalog_file. Arrow IPC files are used in place
+    with no copy; Parquet files still have to be decoded, but are read without buffering.
+    """
+    if path.suffix == ".parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def load_embeddings(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Ids of the books with an embedding and their embeddings as an (n, dimensions) matrix"""
+    table = load_catalog_file(path, columns=["id", "embedding"])
+    if table["embedding"].null_count:
+        table = table.filter(pc.is_valid(table["embedding"]))
+    embeddings = table["embedding"].combine_chunks()
+    matrix = embeddings.flatten().to_numpy().reshape(-1, EMBEDDING_DIMENSIONS)
+    return table["id"].to_numpy(), matrix
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the catalog with summaries and embeddings for offline analytics"
+    )
+    parser.add_argument(
+        "path", type=Path, help="Output file: .parquet for Parquet, anything else for Arrow IPC"
+    )
+    args = parser.parse_args()
+    async with async_read_session() as session:
+        rows = await write_catalog_file(session, args.path)
+    print(f"Exported {rows} books to {args.path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
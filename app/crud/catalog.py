@@ -0,0 +1,29 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.catalog import CatalogVersion
+
+# The catalog_version table only ever holds this one row
+CATALOG_VERSION_ID = 1
+
+
+async def get_catalog_version(session: AsyncSession) -> int:
+    result = await session.execute(
+        select(CatalogVersion.version).where(CatalogVersion.id == CATALOG_VERSION_ID)
+    )
+    version = result.scalar_one_or_none()
+    return int(version) if version is not None else 0
+
+
+async def bump_catalog_version(session: AsyncSession) -> None:
+    """
+    Marks the catalog as changed. Called by writer jobs inside their own transaction, so the
+    new version becomes visible together with the data it describes when they commit.
+    """
+    stmt = insert(CatalogVersion).values(id=CATALOG_VERSION_ID, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={"version": CatalogVersion.version + 1, "updated_at": func.now()},
+    )
+    await session.execute(stmt)
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import Float, Select, cast, extract, func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.product import Book, BookSnapshot
+
+HistoryRows = tuple[list[dict[str, Any]], Optional[datetime]]
+
+# Rows per INSERT: 6 bind parameters each, well below asyncpg's limit of 32767
+SNAPSHOT_INSERT_BATCH = 5000
+
+
+def snapshot_partition_bounds(moment: datetime) -> tuple[str, datetime, datetime]:
+    """Name and [start, end) range of the monthly partition holding ``moment`` (in UTC)"""
+    start = moment.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    end = (start + timedelta(days=32)).replace(day=1)
+    return f"book_snapshots_{start:%Y_%m}", start, end
+
+
+async def ensure_snapshot_partition(session: AsyncSession, moment: datetime) -> None:
+    """Creates the monthly partition of book_snapshots that ``moment`` falls in, if missing"""
+    name, start, end = snapshot_partition_bounds(moment)
+    await session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF book_snapshots "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+async def record_snapshots(
+        session: AsyncSession, crawled_at: datetime, snapshots: Sequence[dict[str, Any]]
+) -> None:
+    """
+    Appends one crawl's ``book_id``, ``upc``, ``price``, ``stock_count`` and ``availability``
+    per book. Recording the same crawl twice is a no-op; the caller commits.
+    """
+    if not snapshots:
+        return
+    await ensure_snapshot_partition(session, crawled_at)
+    rows = [{**snapshot, "crawled_at": crawled_at} for snapshot in snapshots]
+    for start in range(0, len(rows), SNAPSHOT_INSERT_BATCH):
+        await session.execute(
+            insert(BookSnapshot)
+            .values(rows[start:start + SNAPSHOT_INSERT_BATCH])
+            .on_conflict_do_nothing()
+        )
+
+
+def first(column: Any) -> ColumnElement[Any]:
+    return func.array_agg(aggregate_order_by(column, BookSnapshot.crawled_at.asc()))[1]
+
+
+def last(column: Any) -> ColumnElement[Any]:
+    return func.array_agg(aggregate_order_by(column, BookSnapshot.crawled_at.desc()))[1]
+
+
+def window_select(column: Any, since: datetime) -> Select[Any]:
+    """
+    First and last non-NULL value of ``column`` per book since ``since``. The lower bound is a
+    bind parameter, so the partitions before the window are pruned when the query executes,
+    not when it is planned.
+    """
+    return (
+        select(
+            BookSnapshot.book_id,
+            first(column).label("first_value"),
+            last(column).label("last_value"),
+            func.min(BookSnapshot.crawled_at).label("first_at"),
+            func.max(BookSnapshot.crawled_at).label("last_at"),
+        )
+        .where(BookSnapshot.crawled_at >= since, column.isnot(None))
+        .group_by(BookSnapshot.book_id)
+    )
+
+
+def with_books(stmt: Select[Any], category: Optional[str]) -> Select[Any]:
+    return stmt if category is None else stmt.where(Book.category == category)
+
+
+async def price_movement(
+        session: AsyncSession, days: int = 30, category: Optional[str] = None, limit: int = 10
+) -> HistoryRows:
+    """Books whose price changed the most, in percent, between their first and last crawl"""
+    now = datetime.now(timezone.utc)
+    stats = window_select(BookSnapshot.price, now - timedelta(days=days)).subquery()
+    change = stats.c.last_value - stats.c.first_value
+    percent = change / func.nullif(stats.c.first_value, 0) * 100
+
+    stmt = (
+        select(
+            Book.id, Book.name, Book.category,
+            stats.c.first_value, stats.c.last_value, stats.c.first_at, stats.c.last_at,
+            change.label("change"), percent.label("percent_change"),
+        )
+        .join(stats, stats.c.book_id == Book.id)
+        .where(change != 0)
+        .order_by(func.abs(percent).desc().nulls_last(), Book.id)
+        .limit(limit)
+    )
+    rows = (await session.execute(with_books(stmt, category))).all()
+    data = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "category": row.category,
+            "first_price": row.first_value,
+            "last_price": row.last_value,
+            "change": row.change,
+            "percent_change": row.percent_change,
+            "first_crawled_at": row.first_at,
+            "last_crawled_at": row.last_at,
+        }
+        for row in rows
+    ]
+    return data, now
+
+
+async def stock_depletion(
+        session: AsyncSession, days: int = 30, category: Optional[str] = None, limit: int = 10
+) -> HistoryRows:
+    """
+    Books whose stock fell the most between their first and last crawl, with the daily rate
+    and, at that rate, the days left until they run out.
+    """
+    now = datetime.now(timezone.utc)
+    stats = window_select(BookSnapshot.stock_count, now - timedelta(days=days)).subquery()
+    depleted = stats.c.first_value - stats.c.last_value
+    elapsed_days = extract("epoch", stats.c.last_at - stats.c.first_at) / 86400
+    per_day = cast(depleted, Float) / func.nullif(elapsed_days, 0)
+
+    stmt = (
+        select(
+            Book.id, Book.name, Book.category,
+            stats.c.first_value, stats.c.last_value, stats.c.first_at, stats.c.last_at,
+            depleted.label("depleted"), per_day.label("per_day"),
+        )
+        .join(stats, stats.c.book_id == Book.id)
+        .where(depleted > 0)
+        .order_by(depleted.desc(), Book.id)
+        .limit(limit)
+    )
+    rows = (await session.execute(with_books(stmt, category))).all()
+    data = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "category": row.category,
+            "first_stock": row.first_value,
+            "last_stock": row.last_value,
+            "depleted": row.depleted,
+            "per_day": row.per_day,
+            "days_until_out": row.last_value / row.per_day if row.per_day else None,
+            "first_crawled_at": row.first_at,
+            "last_crawled_at": row.last_at,
+        }
+        for row in rows
+    ]
+    return data, now
@@ -1,25 +1,137 @@
-from typing import Any, Optional, Sequence, cast
+import base64
+import binascii
+import json
+from typing import Any, AsyncIterator, Literal, Optional, Sequence, cast
 
-from sqlalchemy import and_, or_, select
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    Integer,
+    Row,
+    Select,
+    and_,
+    any_,
+    bindparam,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, with_expression
 
 from app.models.product import Book, BookAIDetails
-from app.schemas.product import BookDetailOut, BookListOut
+from app.schemas.product import (
+    BOOK_DETAIL_ADAPTER,
+    BOOK_LIST_ADAPTER,
+    BookDetailOut,
+    BookFacets,
+    BookListOut,
+    FacetCount,
+    PriceBucketCount,
+)
 
+TotalMode = Literal["exact", "estimate"]
+BookSort = Literal[
+    "id", "-id", "price", "-price", "rating", "-rating", "name", "-name", "relevance"
+]
 
-async def get_books(
-    session: AsyncSession,
-    skip: int = 0,
-    limit: int = 20,
+# Each sort key is backed by a composite (key, id) index so cursor seeks are index range scans
+SORT_COLUMNS = {
+    "id": Book.id,
+    "price": Book.price,
+    "rating": Book.rating,
+    "name": Book.name,
+}
+
+# Columns of the books table that make up a BookListOut
+BOOK_LIST_COLUMNS = tuple(getattr(Book, field) for field in BookListOut.model_fields)
+
+# Columns of the books table that make up a BookDetailOut; the summary comes from book_ai_details
+BOOK_DETAIL_COLUMNS = tuple(
+    getattr(Book, field) for field in BookDetailOut.model_fields if field != "summary"
+)
+
+# Rows fetched per round trip from the server-side cursor of an export
+EXPORT_BATCH_SIZE = 1000
+
+# Boundaries of the price facet buckets; prices below the first or from the last edge upwards
+# fall into the open-ended buckets at either end
+PRICE_FACET_EDGES = (10.0, 20.0, 30.0, 40.0, 50.0)
+
+# Text search configuration used by the generated books.search_vector column, rendered inline
+# so that estimated counts can compile search filters with literal values
+SEARCH_CONFIG = literal_column("'english'", type_=REGCONFIG)
+
+
+def search_rank(q: str) -> ColumnElement[float]:
+    """ts_rank of a book's search_vector against the web-search style query ``q``"""
+    return func.ts_rank(Book.search_vector, func.websearch_to_tsquery(SEARCH_CONFIG, q))
+
+
+def resolve_sort(sort: Optional[BookSort], q: Optional[str]) -> BookSort:
+    """Searches are ranked by relevance unless a sort order is asked for explicitly"""
+    if sort is None:
+        return "relevance" if q else "id"
+    if sort == "relevance" and not q:
+        raise ValueError("Sorting by relevance requires a search query")
+    return sort
+
+
+def encode_cursor(sort: str, book: Any) -> str:
+    """Build the opaque cursor pointing just past ``book`` for the given sort order"""
+    key = getattr(book, "search_rank" if sort == "relevance" else sort.lstrip("-"))
+    payload = json.dumps([sort, key, book.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    """Return the ``(sort key, id)`` a cursor points past, or raise ValueError if it is invalid"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key, book_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if cursor_sort != sort or not is_cursor_value(book_id, int, nullable=False):
+        raise ValueError("Cursor does not match the requested sort order")
+    if sort == "relevance":
+        key_type: type = float
+        nullable = False
+    else:
+        sort_column = SORT_COLUMNS[sort.lstrip("-")]
+        key_type = sort_column.type.python_type
+        nullable = bool(sort_column.nullable)
+    if not is_cursor_value(key, key_type, nullable):
+        raise ValueError("Cursor does not match the requested sort order")
+    return key, book_id
+
+
+def is_cursor_value(value: Any, python_type: type, nullable: bool) -> bool:
+    """Whether a JSON-decoded cursor value can be compared to a column of ``python_type``"""
+    if value is None:
+        return nullable
+    if isinstance(value, bool):
+        return False
+    if python_type is float:
+        # Integers compare just as well against a float column
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def build_book_filters(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     min_rating: Optional[int] = None,
     category: Optional[str] = None,
     q: Optional[str] = None,
-) -> Sequence[Book]:
-    query = select(Book)
-    filters = []
+) -> list[ColumnElement[bool]]:
+    """WHERE clauses shared by every query over the product listing filters"""
+    filters: list[ColumnElement[bool]] = []
 
     if min_price is not None:
         filters.append(Book.price >= min_price)
@@ -28,24 +140,294 @@ async def get_books(
     if min_rating is not None:
         filters.append(Book.rating >= min_rating)
     if category is not None:
-        # Using ilike for case-insensitive, partial match
+        # Case-insensitive partial match, served by the pg_trgm index on category
         filters.append(Book.category.ilike(f"%{category}%"))
     if q:
+        # Substrings of the name go through the pg_trgm index on name, while the long
+        # descriptions are matched word-wise through the GIN index on search_vector
         filters.append(
             or_(
                 Book.name.ilike(f"%{q}%"),
-                Book.description.ilike(f"%{q}%"),
+                Book.search_vector.op("@@")(func.websearch_to_tsquery(SEARCH_CONFIG, q)),
             )
         )
+    return filters
+
+
+def sort_order(sort: str, q: Optional[str] = None) -> list[ColumnElement[Any]]:
+    """ORDER BY clauses for a sort, with id as the tie-breaker"""
+    if sort == "relevance" and q:
+        return [search_rank(q).desc(), Book.id.asc()]
+
+    sort_column = SORT_COLUMNS[sort.lstrip("-")]
+    columns = [sort_column] if sort_column is Book.id else [sort_column, Book.id]
+    if sort.startswith("-"):
+        return [column.desc() for column in columns]
+    return [column.asc() for column in columns]
+
+
+def cursor_filter(sort: str, cursor: str, q: Optional[str] = None) -> ColumnElement[bool]:
+    """Build the ``(key, id) > (last key, last id)`` seek predicate for a cursor"""
+    key, last_id = decode_cursor(cursor, sort)
+    if sort == "relevance" and q:
+        # Rank descends while id ascends, which a single row-value comparison cannot express
+        rank = search_rank(q)
+        return or_(rank < key, and_(rank == key, Book.id > last_id))
+
+    sort_column = SORT_COLUMNS[sort.lstrip("-")]
+    if sort_column is Book.id:
+        seek_key: ColumnElement[Any] = Book.id
+        seek_value: ColumnElement[Any] = literal(last_id)
+    else:
+        seek_key = tuple_(sort_column, Book.id)
+        seek_value = tuple_(literal(key), literal(last_id))
+    return seek_key < seek_value if sort.startswith("-") else seek_key > seek_value
+
+
+def sort_key_filters(sort: BookSort) -> list[ColumnElement[bool]]:
+    """
+    NULL keys cannot take part in a row-value comparison, so books without a value for the
+    sort key are never paged through, nor counted in the total
+    """
+    if sort.lstrip("-") in ("id", "relevance"):
+        return []
+    return [SORT_COLUMNS[sort.lstrip("-")].isnot(None)]
+
+
+def paginate_books(
+    query: Select[Any],
+    skip: int = 0,
+    limit: int = 20,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: Optional[BookSort] = None,
+    cursor: Optional[str] = None,
+) -> Select[Any]:
+    """Apply the listing filters, sort order and page window to a query over books"""
+    filters = build_book_filters(
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+    )
+
+    sort = resolve_sort(sort, q)
+    filters.extend(sort_key_filters(sort))
+
+    if cursor is not None:
+        filters.append(cursor_filter(sort, cursor, q))
+        skip = 0
 
     if filters:
         query = query.where(and_(*filters))
-    query = query.order_by(Book.id).offset(skip).limit(limit)
+
+    return query.order_by(*sort_order(sort, q)).offset(skip).limit(limit)
+
+
+async def get_books(
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 20,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: Optional[BookSort] = None,
+    cursor: Optional[str] = None,
+) -> Sequence[Book]:
+    """
+    Returns a page of books matching the filters.
+
+    Pages are addressed either by ``skip`` (offset) or by ``cursor``, an opaque token from
+    ``encode_cursor`` that seeks past the last seen ``(sort key, id)`` so the cost of a page
+    does not grow with its depth. When a cursor is given, ``skip`` is ignored.
+
+    Text searches are ranked by ``ts_rank`` unless another ``sort`` is given; the rank is then
+    loaded into ``Book.search_rank``.
+    """
+    query = select(Book)
+    if q and resolve_sort(sort, q) == "relevance":
+        query = query.options(with_expression(Book.search_rank, search_rank(q)))
+
+    query = paginate_books(
+        query,
+        skip=skip,
+        limit=limit,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+        sort=sort,
+        cursor=cursor,
+    )
 
     result = await session.execute(query)
     return cast(Sequence[BookListOut], result.scalars().all())
 
 
+async def get_book_list_rows(
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 20,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: Optional[BookSort] = None,
+    cursor: Optional[str] = None,
+) -> Sequence[Row[Any]]:
+    """
+    Same page as ``get_books``, but selects only the ``BookListOut`` columns as plain rows.
+
+    Skipping ORM hydration and the description text makes this the cheap path for listings
+    that go straight to the response.
+    """
+    columns: list[Any] = list(BOOK_LIST_COLUMNS)
+    if q and resolve_sort(sort, q) == "relevance":
+        columns.append(search_rank(q).label("search_rank"))
+
+    query = paginate_books(
+        select(*columns),
+        skip=skip,
+        limit=limit,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+        sort=sort,
+        cursor=cursor,
+    )
+
+    result = await session.execute(query)
+    return result.all()
+
+
+async def count_books(
+    session: AsyncSession,
+    mode: TotalMode = "exact",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: Optional[BookSort] = None,
+) -> int:
+    """
+    Counts the books matching the listing filters that a listing in the ``sort`` order pages
+    through.
+
+    ``exact`` runs a ``count(*)``. ``estimate`` asks the planner for its row estimate instead,
+    which costs the same however many rows match but may be off after large writes until
+    the table is analyzed again.
+    """
+    filters = build_book_filters(
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+    )
+    filters.extend(sort_key_filters(resolve_sort(sort, q)))
+
+    if mode == "estimate":
+        query = select(Book.id).where(*filters)
+        connection = await session.connection()
+        # EXPLAIN cannot take bind parameters, so the filter values are rendered inline
+        compiled = query.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+        explain = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        plan = explain.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    result = await session.execute(select(func.count()).select_from(Book).where(*filters))
+    return int(result.scalar_one())
+
+
+async def get_book_facets(
+    session: AsyncSession,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+) -> BookFacets:
+    """
+    Category, rating and price bucket counts of the books matching the listing filters.
+
+    All facets and the total come from one scan: the filtered rows are grouped by
+    ``GROUPING SETS``, one set per facet plus the empty set for the total, and ``GROUPING()``
+    tells the sets apart, since a book without a category also groups under NULL.
+    """
+    filters = build_book_filters(
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+    )
+    edges = bindparam("edges", list(PRICE_FACET_EDGES), type_=ARRAY(Float))
+    matching = select(
+        Book.category,
+        Book.rating,
+        func.width_bucket(Book.price, edges).label("price_bucket"),
+    ).where(*filters).subquery()
+
+    query = select(
+        func.grouping(matching.c.category).label("by_category"),
+        func.grouping(matching.c.rating).label("by_rating"),
+        func.grouping(matching.c.price_bucket).label("by_price"),
+        matching.c.category,
+        matching.c.rating,
+        matching.c.price_bucket,
+        func.count().label("books"),
+    ).group_by(
+        func.grouping_sets(
+            matching.c.category, matching.c.rating, matching.c.price_bucket, text("()")
+        )
+    )
+    rows = (await session.execute(query)).all()
+
+    total = 0
+    categories: list[FacetCount] = []
+    ratings: list[FacetCount] = []
+    bucket_counts: dict[int, int] = {}
+    for row in rows:
+        # GROUPING() is 0 for the columns the row is grouped by
+        if row.by_category == 0:
+            categories.append(FacetCount(value=row.category, count=row.books))
+        elif row.by_rating == 0:
+            ratings.append(FacetCount(value=row.rating, count=row.books))
+        elif row.by_price == 0:
+            bucket_counts[row.price_bucket] = row.books
+        else:
+            total = row.books
+
+    # Every bucket is reported, empty or not, so the histogram keeps a stable shape.
+    # Books without a price have a NULL bucket and are only counted in the total.
+    bounds = [None, *PRICE_FACET_EDGES, None]
+    price_buckets = [
+        PriceBucketCount(min=bounds[i], max=bounds[i + 1], count=bucket_counts.get(i, 0))
+        for i in range(len(bounds) - 1)
+    ]
+    return BookFacets(
+        total=total,
+        categories=sorted(categories, key=lambda facet: (-facet.count, str(facet.value))),
+        ratings=sorted(ratings, key=lambda facet: facet.value if facet.value is not None else 0),
+        price_buckets=price_buckets,
+    )
+
+
 def book_to_dict(book: Book) -> dict[str, Any]:
     """Convert a Book model to dictionary including summary from ai_details"""
     book_dict = {
@@ -63,19 +445,97 @@ def book_to_dict(book: Book) -> dict[str, Any]:
     return book_dict
 
 
+def book_detail_query() -> Select[Any]:
+    # One LEFT JOIN for the book and its summary, leaving out the embedding vector
+    return (
+        select(*BOOK_DETAIL_COLUMNS, BookAIDetails.summary)
+        .outerjoin(BookAIDetails, BookAIDetails.book_id == Book.id)
+    )
+
+
 async def get_book_by_id(session: AsyncSession, book_id: int) -> Optional[BookDetailOut]:
-    query = select(Book).options(
-        selectinload(Book.ai_details)  # Eager load AI details if needed
-    ).where(Book.id == book_id)
+    query = book_detail_query().where(Book.id == book_id)
     result = await session.execute(query)
-    result_data = result.scalar_one_or_none()
+    row = result.one_or_none()
 
-    if result_data is None:
+    if row is None:
         return None
 
-    # Convert to BookDetailOut schema
-    book_dict = book_to_dict(result_data)
-    return cast(BookDetailOut, BookDetailOut.model_validate(book_dict))
+    return BookDetailOut.model_validate(row, from_attributes=True)
+
+
+async def get_books_by_ids(
+    session: AsyncSession, book_ids: Sequence[int]
+) -> dict[int, BookDetailOut]:
+    """
+    Resolves many books in one ``WHERE id = ANY(:ids)`` query, keyed by id. Ids that do not
+    exist are simply absent from the result.
+    """
+    if not book_ids:
+        return {}
+
+    ids_param = bindparam("book_ids", list(book_ids), type_=ARRAY(Integer))
+    query = book_detail_query().where(Book.id == any_(ids_param))
+    result = await session.execute(query)
+    books = BOOK_DETAIL_ADAPTER.validate_python(result.all(), from_attributes=True)
+    return {book.id: book for book in books}
+
+
+async def get_book_list_by_ids(
+    session: AsyncSession, book_ids: Sequence[int]
+) -> list[BookListOut]:
+    """
+    The listing columns of many books in one ``WHERE id = ANY(:ids)`` query, in the order of
+    ``book_ids``. Ids that do not exist are left out.
+    """
+    if not book_ids:
+        return []
+
+    ids_param = bindparam("book_ids", list(book_ids), type_=ARRAY(Integer))
+    query = select(*BOOK_LIST_COLUMNS).where(Book.id == any_(ids_param))
+    books = BOOK_LIST_ADAPTER.validate_python(
+        (await session.execute(query)).all(), from_attributes=True
+    )
+    by_id = {book.id: book for book in books}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+
+def export_query(include_summary: bool = False) -> Select[Any]:
+    """The detail columns of every book, with the summary if asked for"""
+    return book_detail_query() if include_summary else select(*BOOK_DETAIL_COLUMNS)
+
+
+def export_columns(include_summary: bool = False) -> list[str]:
+    """Names of the columns ``stream_books`` yields, known before any row is read"""
+    return list(export_query(include_summary).selected_columns.keys())
+
+
+async def stream_books(
+    session: AsyncSession,
+    include_summary: bool = False,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[int] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+) -> AsyncIterator[Sequence[Row[Any]]]:
+    """
+    Streams every book matching the filters in id order, as batches of detail rows.
+
+    Rows come from a server-side cursor, so memory stays bounded by ``EXPORT_BATCH_SIZE``
+    however large the catalog is, and the first batch is ready as soon as Postgres has it.
+    """
+    query = export_query(include_summary).where(*build_book_filters(
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        category=category,
+        q=q,
+    )).order_by(Book.id)
+
+    result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        yield partition
 
 
 async def get_books_with_no_embedding(session: AsyncSession) -> list["Book"]:
@@ -0,0 +1,214 @@
+import logging
+import os
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Row, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import get_catalog_version
+from app.crud.product import BOOK_LIST_COLUMNS, BookSort, decode_cursor, encode_cursor
+from app.models.db import async_read_session
+from app.models.product import Book
+from app.schemas.product import BOOK_LIST_ADAPTER, BookListPage
+
+logger = logging.getLogger(__name__)
+
+CATALOG_READ_MODEL_ENABLED = os.getenv("CATALOG_READ_MODEL_ENABLED", "false").lower() in (
+    "1", "true", "yes"
+)
+
+# ILIKE wildcards and escapes in a category filter are left to the database
+LIKE_SPECIAL_CHARACTERS = ("%", "_", "\\")
+
+
+def ascending_order(keys: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Row positions sorted by (key, id), leaving out rows whose key is NULL"""
+    present = np.flatnonzero(~np.isnan(keys))
+    return present[np.lexsort((ids[present], keys[present]))]
+
+
+class CatalogSnapshot:
+    """
+    Immutable, column-oriented copy of the listing columns of every book at one catalog version.
+
+    Filters are evaluated as boolean masks: price comparisons over a float column, and
+    precomputed bitmaps per category and per rating that are OR-ed together. Each sort order
+    is a precomputed permutation of the rows, so a page is a masked slice of it.
+    """
+
+    def __init__(self, version: int, rows: Sequence[Row[Any]]):
+        self.version = version
+        self.books = BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+        self.size = len(rows)
+
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=self.size)
+        self.prices = np.array(
+            [np.nan if row.price is None else row.price for row in rows], dtype=np.float64
+        )
+        ratings = np.array(
+            [np.nan if row.rating is None else row.rating for row in rows], dtype=np.float64
+        )
+        self.position_of_id = {int(book_id): i for i, book_id in enumerate(ids)}
+
+        self.rating_bitmaps = {
+            int(rating): ratings == rating for rating in np.unique(ratings[~np.isnan(ratings)])
+        }
+        category_positions: dict[str, list[int]] = {}
+        for i, row in enumerate(rows):
+            if row.category is not None:
+                category_positions.setdefault(row.category, []).append(i)
+        self.category_bitmaps = {}
+        for category, positions in category_positions.items():
+            bitmap = np.zeros(self.size, dtype=bool)
+            bitmap[positions] = True
+            self.category_bitmaps[category] = bitmap
+
+        # Names are ranked by the database so the order follows its collation, not Python's
+        name_order = np.argsort(
+            np.fromiter((row.name_rank for row in rows), dtype=np.int64, count=self.size)
+        )
+        self.orders = {
+            "id": np.argsort(ids, kind="stable"),
+            "price": ascending_order(self.prices, ids),
+            "rating": ascending_order(ratings, ids),
+            "name": name_order,
+        }
+        # Where each row sits in every order, or -1 if its key is NULL
+        self.ranks = {}
+        for key, order in self.orders.items():
+            rank = np.full(self.size, -1, dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self.ranks[key] = rank
+
+    def filter_mask(
+            self,
+            min_price: Optional[float] = None,
+            max_price: Optional[float] = None,
+            min_rating: Optional[int] = None,
+            category: Optional[str] = None,
+    ) -> Optional[np.ndarray]:
+        """Rows matching the listing filters, or None if the database has to evaluate them"""
+        mask = np.ones(self.size, dtype=bool)
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if min_rating is not None:
+            mask &= self.union(
+                [bitmap for rating, bitmap in self.rating_bitmaps.items() if rating >= min_rating]
+            )
+        if category is not None:
+            if any(character in category for character in LIKE_SPECIAL_CHARACTERS):
+                return None
+            needle = category.lower()
+            mask &= self.union(
+                [bitmap for name, bitmap in self.category_bitmaps.items() if needle in name.lower()]
+            )
+        return mask
+
+    def union(self, bitmaps: list[np.ndarray]) -> np.ndarray:
+        if not bitmaps:
+            return np.zeros(self.size, dtype=bool)
+        return np.asarray(np.logical_or.reduce(bitmaps), dtype=bool)
+
+    def seek(self, sort: str, cursor: str) -> Optional[np.ndarray]:
+        """
+        The part of the sort order after the cursor, or None if the cursor's book is gone or
+        its key changed since the cursor was issued; the database then seeks by value instead.
+        """
+        key = sort.lstrip("-")
+        cursor_key, last_id = decode_cursor(cursor, sort)
+        position = self.position_of_id.get(last_id)
+        if position is None or getattr(self.books[position], key) != cursor_key:
+            return None
+        rank = int(self.ranks[key][position])
+        if rank < 0:
+            return None
+
+        order = self.orders[key]
+        return order[:rank][::-1] if sort.startswith("-") else order[rank + 1:]
+
+    def list_books(
+            self,
+            skip: int = 0,
+            limit: int = 20,
+            min_price: Optional[float] = None,
+            max_price: Optional[float] = None,
+            min_rating: Optional[int] = None,
+            category: Optional[str] = None,
+            sort: BookSort = "id",
+            cursor: Optional[str] = None,
+    ) -> Optional[BookListPage]:
+        """The same page as the SQL listing with an exact total, or None to fall back to SQL"""
+        mask = self.filter_mask(
+            min_price=min_price, max_price=max_price, min_rating=min_rating, category=category
+        )
+        if mask is None or sort == "relevance":
+            return None
+
+        # Like the SQL total, books with a NULL sort key are not counted
+        total = int(np.count_nonzero(mask[self.orders[sort.lstrip("-")]]))
+        if cursor is not None:
+            order = self.seek(sort, cursor)
+            if order is None:
+                return None
+            skip = 0
+        else:
+            order = self.orders[sort.lstrip("-")]
+            if sort.startswith("-"):
+                order = order[::-1]
+
+        page = order[mask[order]][skip:skip + limit]
+        books = [self.books[position] for position in page]
+        return BookListPage.model_construct(
+            books=books,
+            total=total,
+            total_mode="exact",
+            next_cursor=encode_cursor(sort, books[-1]) if len(books) == limit else None,
+        )
+
+
+async def load_snapshot(session: AsyncSession) -> CatalogSnapshot:
+    # One snapshot transaction, so the version read matches the rows read
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version = await get_catalog_version(session)
+    query = select(
+        *BOOK_LIST_COLUMNS,
+        func.row_number().over(order_by=(Book.name, Book.id)).label("name_rank"),
+    ).order_by(Book.id)
+    rows = (await session.execute(query)).all()
+    return CatalogSnapshot(version, rows)
+
+
+class CatalogReadModel:
+    """
+    Optional in-process copy of the catalog that serves product listings without a database
+    round trip. It is reloaded whenever the catalog version changes, and only answers for the
+    version it was loaded at, so a stale or missing snapshot always falls back to SQL.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.snapshot: Optional[CatalogSnapshot] = None
+
+    async def refresh(self, version: int) -> None:
+        if not self.enabled or (self.snapshot is not None and self.snapshot.version == version):
+            return
+        try:
+            async with async_read_session() as session:
+                snapshot = await load_snapshot(session)
+        except Exception as e:
+            logger.warning(f"Could not load the catalog read model: {e}")
+            return
+        self.snapshot = snapshot
+        logger.info(f"Loaded {snapshot.size} books into the read model at version {version}")
+
+    def list_books(self, version: Optional[int], **kwargs: Any) -> Optional[BookListPage]:
+        snapshot = self.snapshot
+        if snapshot is None or version is None or snapshot.version != version:
+            return None
+        return snapshot.list_books(**kwargs)
+
+
+catalog_read_model = CatalogReadModel(CATALOG_READ_MODEL_ENABLED)
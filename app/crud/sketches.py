@@ -0,0 +1,313 @@
+import math
+import random
+from datetime import datetime
+from typing import Any, Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import delete, exists, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.analytics import CategorySketch
+from app.models.product import Book
+from app.schemas.analytics import Metric, QuantileGroup
+
+# Sketch accuracy: quantiles are within about 1.7 / SKETCH_K in rank of the exact ones, and a
+# stored sketch holds at most about 3 * SKETCH_K values however many books it summarises
+SKETCH_K = 200
+SKETCH_METRICS: tuple[Metric, ...] = ("price", "rating", "stock_count")
+# Books without a category are sketched under this key, since category is part of the primary key
+UNCATEGORIZED = ""
+
+SketchKey = tuple[str, str]
+SketchRows = tuple[list[dict[str, Any]], Optional[datetime]]
+
+_coin = random.Random()
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty). Level h holds values that stand for 2**h
+    inputs each. When the sketch outgrows its budget the lowest full level is sorted, and every
+    other value, starting at a random offset, is promoted to the level above. Two sketches merge
+    by concatenating their levels, which is what lets categories combine into global answers.
+
+    The exact count, minimum and maximum are tracked alongside.
+    """
+
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.levels: list[list[float]] = [[]]
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def capacity(self, level: int) -> int:
+        # Levels shrink geometrically from the top, so most of the budget sits at the top levels
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    @property
+    def size(self) -> int:
+        return sum(len(values) for values in self.levels)
+
+    @property
+    def budget(self) -> int:
+        return sum(self.capacity(level) for level in range(len(self.levels)))
+
+    def _track(self, low: Optional[float], high: Optional[float], count: int) -> None:
+        if low is not None:
+            self.min = low if self.min is None else min(self.min, low)
+        if high is not None:
+            self.max = high if self.max is None else max(self.max, high)
+        self.count += count
+
+    def extend(self, values: Iterable[float]) -> "KLLSketch":
+        pending = [float(value) for value in values]
+        if not pending:
+            return self
+        self._track(min(pending), max(pending), len(pending))
+        # Fills the sketch up to its budget and compresses, as adding values one by one would
+        start = 0
+        while start < len(pending):
+            room = self.budget - self.size
+            self.levels[0].extend(pending[start:start + room])
+            start += room
+            if self.size >= self.budget:
+                self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].extend(values)
+        self._track(other.min, other.max, other.count)
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        # Every pass compacts at least one level, and a sketch with no full level is in budget
+        while self.size >= self.budget:
+            for level in range(len(self.levels)):
+                if len(self.levels[level]) >= self.capacity(level):
+                    self._compact(level)
+                    if self.size < self.budget:
+                        break
+
+    def _compact(self, level: int) -> None:
+        if level + 1 == len(self.levels):
+            self.levels.append([])
+        values = sorted(self.levels[level])
+        # An odd value out stays behind, so the total weight is preserved exactly
+        leftover = [values.pop()] if len(values) % 2 else []
+        self.levels[level + 1].extend(values[_coin.getrandbits(1)::2])
+        self.levels[level] = leftover
+
+    def _ranked(self) -> tuple[np.ndarray, np.ndarray]:
+        """Sorted values and the cumulative number of inputs they stand for"""
+        values = np.concatenate([np.asarray(values, dtype=np.float64) for values in self.levels])
+        weights = np.concatenate([
+            np.full(len(values), 2 ** level, dtype=np.int64)
+            for level, values in enumerate(self.levels)
+        ])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, fractions: Sequence[float]) -> list[Optional[float]]:
+        """Inverted-CDF quantiles, exact while no level has been compacted yet"""
+        if not self.count:
+            return [None] * len(fractions)
+        values, cumulative = self._ranked()
+        positions = np.searchsorted(cumulative, np.asarray(fractions) * self.count, side="left")
+        results = values[np.clip(positions, 0, len(values) - 1)]
+        return [float(value) for value in np.clip(results, self.min, self.max)]
+
+    def histogram(self, edges: Sequence[float]) -> list[int]:
+        """Approximate counts between consecutive edges, with np.histogram's bin semantics"""
+        if not self.count:
+            return [0] * (len(edges) - 1)
+        values, cumulative = self._ranked()
+        cumulative = np.concatenate([[0], cumulative])
+        below = cumulative[np.searchsorted(values, edges, side="left")]
+        # The last bin is closed on the right
+        below[-1] = cumulative[np.searchsorted(values, edges[-1], side="right")]
+        return [int(count) for count in np.diff(below)]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "k": self.k,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "levels": self.levels,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "KLLSketch":
+        sketch = cls(data["k"])
+        sketch.levels = [list(values) for values in data["levels"]] or [[]]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
+
+
+def merge_sketches(sketches: Iterable[KLLSketch]) -> KLLSketch:
+    merged = KLLSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def sketch_books(books: Iterable[Any], sketches: dict[SketchKey, KLLSketch]) -> None:
+    """Adds the numeric columns of ``books`` (models or rows) to per (metric, category) sketches"""
+    values: dict[SketchKey, list[float]] = {}
+    for book in books:
+        category = book.category if book.category is not None else UNCATEGORIZED
+        for metric in SKETCH_METRICS:
+            value = getattr(book, metric)
+            if value is not None:
+                values.setdefault((metric, category), []).append(value)
+    for key, key_values in values.items():
+        sketches.setdefault(key, KLLSketch()).extend(key_values)
+
+
+async def has_category_sketches(session: AsyncSession) -> bool:
+    return bool(await session.scalar(select(exists().select_from(CategorySketch))))
+
+
+async def update_category_sketches(session: AsyncSession, books: Sequence[Any]) -> None:
+    """
+    Merges newly inserted ``books`` into the stored sketches. Called by writer jobs inside their
+    own transaction, like bump_catalog_version; the sketch rows stay locked until they commit,
+    so concurrent writers merge one after the other instead of losing each other's books.
+    """
+    added: dict[SketchKey, KLLSketch] = {}
+    sketch_books(books, added)
+    if not added:
+        return
+
+    # Empty rows first, so that every row to merge into exists and can be locked
+    await session.execute(
+        insert(CategorySketch)
+        .values([
+            {"metric": metric, "category": category, "item_count": 0,
+             "sketch": KLLSketch().to_dict()}
+            for metric, category in added
+        ])
+        .on_conflict_do_nothing()
+    )
+    result = await session.execute(
+        select(CategorySketch.metric, CategorySketch.category, CategorySketch.sketch)
+        .where(tuple_(CategorySketch.metric, CategorySketch.category).in_(list(added)))
+        .with_for_update()
+    )
+    merged = {
+        (row.metric, row.category): KLLSketch.from_dict(row.sketch).merge(
+            added[(row.metric, row.category)]
+        )
+        for row in result.all()
+    }
+    await store_sketches(session, merged)
+
+
+async def store_sketches(session: AsyncSession, sketches: dict[SketchKey, KLLSketch]) -> None:
+    stmt = insert(CategorySketch).values([
+        {"metric": metric, "category": category, "item_count": sketch.count,
+         "sketch": sketch.to_dict()}
+        for (metric, category), sketch in sketches.items()
+    ])
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[CategorySketch.metric, CategorySketch.category],
+        set_={
+            "item_count": stmt.excluded.item_count,
+            "sketch": stmt.excluded.sketch,
+            "updated_at": func.now(),
+        },
+    ))
+
+
+async def rebuild_category_sketches(session: AsyncSession) -> None:
+    """Replaces the stored sketches with ones built from every book; the caller commits"""
+    sketches: dict[SketchKey, KLLSketch] = {}
+    result = await session.stream(
+        select(Book.category, Book.price, Book.rating, Book.stock_count)
+        .execution_options(yield_per=1000)
+    )
+    async for rows in result.partitions():
+        sketch_books(rows, sketches)
+
+    await session.execute(delete(CategorySketch))
+    if sketches:
+        await store_sketches(session, sketches)
+
+
+async def get_category_sketches(
+        session: AsyncSession, metric: Metric, category: Optional[str] = None
+) -> tuple[dict[Optional[str], KLLSketch], Optional[datetime]]:
+    """The stored sketches of ``metric`` by category (None for uncategorized books)"""
+    stmt = select(
+        CategorySketch.category, CategorySketch.sketch, CategorySketch.updated_at
+    ).where(CategorySketch.metric == metric)
+    if category is not None:
+        stmt = stmt.where(CategorySketch.category == category)
+    rows = (await session.execute(stmt)).all()
+    sketches = {
+        row.category if row.category != UNCATEGORIZED else None: KLLSketch.from_dict(row.sketch)
+        for row in rows
+    }
+    updated_at = max((row.updated_at for row in rows), default=None)
+    return sketches, updated_at
+
+
+async def quantiles(
+        session: AsyncSession,
+        metric: Metric = "price",
+        fractions: Sequence[float] = (0.25, 0.5, 0.9),
+        category: Optional[str] = None,
+        group: QuantileGroup = "all",
+) -> SketchRows:
+    """
+    Quantiles of ``metric`` over all books, or per category. Reads one sketch per category, so
+    the cost does not depend on how many books there are.
+    """
+    sketches, updated_at = await get_category_sketches(session, metric, category)
+
+    def summary(sketch: KLLSketch) -> dict[str, Any]:
+        values = sketch.quantiles(fractions)
+        return {
+            "count": sketch.count,
+            "quantiles": {f"{fraction:g}": value for fraction, value in zip(
+                fractions, values, strict=True
+            )},
+        }
+
+    if group == "category":
+        ordered = sorted(sketches.items(), key=lambda item: item[1].count, reverse=True)
+        return [{"category": name, **summary(sketch)} for name, sketch in ordered], updated_at
+    if not sketches:
+        return [], updated_at
+    return [summary(merge_sketches(sketches.values()))], updated_at
+
+
+async def sketch_histogram(
+        session: AsyncSession,
+        metric: Metric = "price",
+        bins: int = 10,
+        edges: Optional[Sequence[float]] = None,
+        category: Optional[str] = None,
+) -> SketchRows:
+    """Approximate histogram from the merged sketches, over ``edges`` or equal-width bins"""
+    sketches, updated_at = await get_category_sketches(session, metric, category)
+    sketch = merge_sketches(sketches.values())
+    if sketch.min is None or sketch.max is None:
+        return [], updated_at
+    if edges is None:
+        edges = np.linspace(sketch.min, sketch.max, bins + 1).tolist()
+    counts = sketch.histogram(edges)
+    data = [
+        {"range": [float(edges[i]), float(edges[i + 1])], "count": count}
+        for i, count in enumerate(counts)
+    ]
+    return data, updated_at
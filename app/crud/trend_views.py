@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    MetaData,
+    String,
+    Table,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.db import async_session
+
+logger = logging.getLogger(__name__)
+
+# How often the API checks whether the catalog changed since the views were last refreshed;
+# 0 disables the periodic refresh and leaves it to the writer jobs
+TREND_VIEW_REFRESH_SECONDS = float(os.getenv("TREND_VIEW_REFRESH_SECONDS", "300"))
+# pg_try_advisory_xact_lock key, so only one API process refreshes at a time
+TREND_VIEW_REFRESH_LOCK = 7_140_001
+
+# Definitions and the column of the unique index REFRESH ... CONCURRENTLY needs. The migration
+# creating the views holds a frozen copy of these; the tests create them from here.
+TREND_VIEW_DEFINITIONS = {
+    "trend_category_stats": (
+        """
+        SELECT category,
+               count(*) AS book_count,
+               avg(rating)::double precision AS average_rating,
+               avg(price) AS average_price,
+               now() AS computed_at
+        FROM books
+        GROUP BY category
+        """,
+        "category",
+    ),
+}
+
+# Kept apart from Base.metadata so create_all and autogenerate never treat them as tables
+trend_view_metadata = MetaData()
+
+category_stats_view = Table(
+    "trend_category_stats",
+    trend_view_metadata,
+    Column("category", String),
+    Column("book_count", BigInteger),
+    Column("average_rating", Float),
+    Column("average_price", Float),
+    Column("computed_at", DateTime(timezone=True)),
+)
+
+TrendRows = tuple[list[dict[str, Any]], Optional[datetime]]
+
+
+def create_trend_view_statements() -> list[str]:
+    statements = []
+    for name, (definition, unique_column) in TREND_VIEW_DEFINITIONS.items():
+        statements.append(f"CREATE MATERIALIZED VIEW {name} AS {definition}")
+        statements.append(
+            f"CREATE UNIQUE INDEX ux_{name}_{unique_column} ON {name} ({unique_column})"
+        )
+    return statements
+
+
+def drop_trend_view_statements() -> list[str]:
+    return [f"DROP MATERIALIZED VIEW IF EXISTS {name}" for name in TREND_VIEW_DEFINITIONS]
+
+
+async def refresh_trend_views(session: AsyncSession, concurrently: bool = True) -> None:
+    """
+    Recomputes every trend view. Writer jobs call this inside their own transaction, next to
+    bump_catalog_version, so the views change together with the data; the caller commits.
+
+    CONCURRENTLY keeps the views readable during the refresh at the cost of a slower diff.
+    """
+    mode = "CONCURRENTLY " if concurrently else ""
+    for name in TREND_VIEW_DEFINITIONS:
+        await session.execute(text(f"REFRESH MATERIALIZED VIEW {mode}{name}"))
+
+
+def computed_at(rows: list[Any]) -> Optional[datetime]:
+    return rows[0].computed_at if rows else None
+
+
+async def most_common_categories(session: AsyncSession, k: int = 5) -> TrendRows:
+    view = category_stats_view.c
+    result = await session.execute(
+        select(view.category, view.book_count, view.computed_at)
+        .order_by(view.book_count.desc())
+        .limit(k)
+    )
+    rows = list(result.all())
+    return [{"category": row.category, "count": row.book_count} for row in rows], computed_at(rows)
+
+
+async def avg_rating_for_popular_categories(session: AsyncSession, min_count: int = 3) -> TrendRows:
+    view = category_stats_view.c
+    result = await session.execute(
+        select(view.category, view.book_count, view.average_rating, view.computed_at)
+        .where(view.book_count >= min_count)
+        .order_by(view.average_rating.desc())
+    )
+    rows = list(result.all())
+    data = [
+        {
+            "category": row.category,
+            "book_count": row.book_count,
+            "average_rating": row.average_rating,
+        }
+        for row in rows
+    ]
+    return data, computed_at(rows)
+
+
+async def average_price_by_category(session: AsyncSession) -> TrendRows:
+    view = category_stats_view.c
+    result = await session.execute(
+        select(view.category, view.average_price, view.computed_at)
+        .where(view.average_price.isnot(None))
+    )
+    rows = list(result.all())
+    data = [{"category": row.category, "average_price": row.average_price} for row in rows]
+    return data, computed_at(rows)
+
+
+class TrendViewRefresher:
+    """
+    Refreshes the trend views in the background whenever the catalog version moved since the
+    last check, as a safety net for writes that did not refresh them themselves.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.refreshed_version: Optional[int] = None
+
+    async def refresh(self, version: Optional[int]) -> None:
+        if version is None or version == self.refreshed_version:
+            return
+        try:
+            # Refreshes write, so they always go to the primary database
+            async with async_session() as session:
+                locked = await session.scalar(
+                    select(func.pg_try_advisory_xact_lock(TREND_VIEW_REFRESH_LOCK))
+                )
+                if locked:
+                    await refresh_trend_views(session)
+                    await session.commit()
+        except Exception as e:
+            logger.warning(f"Could not refresh the trend views: {e}")
+            return
+        self.refreshed_version = version
+
+    async def run(self, current_version: Callable[[], Optional[int]]) -> None:
+        # The views are fresh for the version the API started with
+        self.refreshed_version = current_version()
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.refresh(current_version())
+
+
+trend_view_refresher = TrendViewRefresher(TREND_VIEW_REFRESH_SECONDS)
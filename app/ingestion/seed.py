@@ -1,7 +1,19 @@
 import asyncio
 import logging
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
+from sqlalchemy import String, any_, literal, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.crud.catalog import bump_catalog_version
+from app.crud.history import record_snapshots
+from app.crud.sketches import (
+    has_category_sketches,
+    rebuild_category_sketches,
+    update_category_sketches,
+)
+from app.crud.trend_views import refresh_trend_views
 from app.ingestion.extractor import BooksDataExtractor
 from app.models.db import async_session
 from app.models.product import Book
@@ -9,15 +21,29 @@ from app.models.product import Book
 logger = logging.getLogger(__name__)
 
 
-async def insert_books(books: List[Dict[str, Optional[Any]]]) -> None:
+async def insert_books(
+        books: List[Dict[str, Optional[Any]]], crawled_at: Optional[datetime] = None
+) -> None:
+    """
+    Inserts the books not seen before, and records the price and stock of every crawled book
+    in the book_snapshots history, so re-crawls of existing books are kept too.
+    """
+    crawled_at = crawled_at or datetime.now(timezone.utc)
     async with async_session() as session:
-        for book in books:
-            # Check if the book already exists by unique UPC or name
-            exists = await session.execute(
-                Book.__table__.select().where(Book.upc == book.get("upc"))
+        # One lookup for the whole crawl instead of one query per book
+        upcs = [book["upc"] for book in books if book.get("upc") is not None]
+        result = await session.execute(
+            select(Book.upc, Book.id).where(
+                or_(Book.upc == any_(literal(upcs, ARRAY(String))), Book.upc.is_(None))
             )
-            if exists.first():
-                continue  # Skip if duplicate
+        )
+        book_ids: Dict[Optional[Any], int] = {upc: book_id for upc, book_id in result.all()}
+
+        inserted: Dict[Optional[Any], Book] = {}
+        for book in books:
+            # Skip books that already exist by UPC; they still get a snapshot below
+            if book.get("upc") in book_ids or book.get("upc") in inserted:
+                continue
 
             book_obj = Book(
                 name=book["name"],
@@ -30,6 +56,40 @@ async def insert_books(books: List[Dict[str, Optional[Any]]]) -> None:
                 stock_count=book["stock_count"],
             )
             session.add(book_obj)
+            inserted[book.get("upc")] = book_obj
+
+        if inserted:
+            # Assigns the ids the snapshots refer to
+            await session.flush()
+            book_ids.update({upc: book_obj.id for upc, book_obj in inserted.items()})
+
+        rebuilt = False
+        if not await has_category_sketches(session):
+            # First run since the sketches were added: build them from every book, even when
+            # the crawl inserts none
+            await rebuild_category_sketches(session)
+            rebuilt = await has_category_sketches(session)
+        elif inserted:
+            await update_category_sketches(session, list(inserted.values()))
+
+        # The last page crawled wins if a UPC shows up twice; books without one are not tracked
+        snapshots = {
+            book["upc"]: {
+                "book_id": book_ids[book["upc"]],
+                "upc": book["upc"],
+                "price": book["price"],
+                "stock_count": book["stock_count"],
+                "availability": book["availability"],
+            }
+            for book in books
+            if book.get("upc") is not None
+        }
+        await record_snapshots(session, crawled_at, list(snapshots.values()))
+
+        if inserted or snapshots or rebuilt:
+            await bump_catalog_version(session)
+        if inserted:
+            await refresh_trend_views(session)
         await session.commit()
 
 
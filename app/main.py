@@ -1,22 +1,86 @@
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator
+
 from api import analytics, products
 from fastapi import FastAPI
 
+from app.ai.vector_index import vector_index
+from app.api.cache import ResponseCacheMiddleware, catalog_version_watcher, response_cache
+from app.api.trends import TRENDS, trend_cache
+from app.crud.read_model import catalog_read_model
+from app.crud.trend_views import trend_view_refresher
+from app.models.db import pool_status
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if catalog_read_model.enabled:
+        # Loaded with the first version read below, and reloaded whenever it changes
+        catalog_version_watcher.subscribe(catalog_read_model.refresh)
+    if vector_index.enabled:
+        catalog_version_watcher.subscribe(vector_index.refresh)
+    # Read the catalog version before serving, then keep following writer jobs' bumps
+    await catalog_version_watcher.refresh()
+    tasks = [asyncio.create_task(catalog_version_watcher.run())]
+    if trend_view_refresher.interval_seconds > 0:
+        tasks.append(asyncio.create_task(
+            trend_view_refresher.run(lambda: catalog_version_watcher.version)
+        ))
+    yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Bookshop API",
         version="1.0.0",
-        description="Microservice for books with analytics and AI-powered features"
+        description="Microservice for books with analytics and AI-powered features",
+        lifespan=lifespan,
     )
 
     app.include_router(products.router, prefix="/api/v1/products", tags=["Products"])
     app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["Analytics"])
 
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        cache=response_cache,
+        watcher=catalog_version_watcher,
+        path_prefixes=("/api/v1/products", "/api/v1/analytics"),
+        exclude_paths=("/api/v1/products/export",),
+        # The batch may include time-windowed trends
+        etag_exclude_paths=(
+            "/api/v1/analytics/trends/batch",
+            *(f"/api/v1/analytics/trends/{trend.key}" for trend in TRENDS if trend.time_windowed),
+        ),
+    )
+
     # Optionally: add root health check
     @app.get("/", tags=["Health"])
     def health() -> dict[str, str]:
         return {"status": "ok"}
 
+    @app.get("/cache/stats", tags=["Health"])
+    def cache_stats() -> dict[str, Any]:
+        return {
+            "catalog_version": catalog_version_watcher.version,
+            "response_cache": response_cache.stats(),
+            "trend_cache": trend_cache.stats(),
+            "read_model_version": (
+                catalog_read_model.snapshot.version if catalog_read_model.snapshot else None
+            ),
+            "vector_index_version": (
+                vector_index.snapshot.version if vector_index.snapshot else None
+            ),
+        }
+
+    @app.get("/db/pool", tags=["Health"])
+    def db_pool() -> dict[str, Any]:
+        return pool_status()
+
     return app
 
 
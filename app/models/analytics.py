@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Column, DateTime, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.models.db import Base
+
+
+class CategorySketch(Base):
+    """
+    Mergeable KLL quantile sketch of one numeric book column within one category, kept up to
+    date by the seeding job as it inserts books. Books without a category are sketched under
+    the empty string, since the category is part of the primary key.
+    """
+    __tablename__ = "category_sketches"
+
+    metric = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    item_count = Column(BigInteger, nullable=False, default=0)
+    sketch = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, func
+
+from app.models.db import Base
+
+
+class CatalogVersion(Base):
+    """
+    Single-row counter bumped by every job that writes catalog data (seeding, embeddings,
+    summaries), so readers can tell cached results apart from fresh ones.
+    """
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
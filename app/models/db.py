@@ -1,19 +1,50 @@
+import contextlib
 import os
+import time
+from typing import Any, AsyncContextManager, AsyncIterator, Callable
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql+asyncpg://bookshopuser:bookshoppassword@db:5432/bookshopdb"
 )
+# Optional replica for the read-only products and analytics routes
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced; -1 keeps connections forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+# Pre-ping costs a round trip per checkout; recycling below the server's idle timeout avoids it
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# asyncpg's own statement cache and SQLAlchemy's prepared statement cache, per connection.
+# Set both to 0 behind a transaction-pooling PgBouncer.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+
+
+def make_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE,
+        },
+    )
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
-)
+
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(READ_DATABASE_URL) if READ_DATABASE_URL else engine
 
 Base = declarative_base()
 
@@ -23,7 +54,82 @@ async_session = sessionmaker(
     class_=AsyncSession,
 )
 
+async_read_session = sessionmaker(
+    read_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+)
+
+
+class CheckoutStats:
+    """Time request handlers spent waiting for a pooled connection"""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "avg_wait_ms": 1000 * self.total_wait / self.checkouts if self.checkouts else 0.0,
+            "max_wait_ms": 1000 * self.max_wait,
+        }
+
 
-async def get_session() -> AsyncSession:
-    async with async_session() as session:
+primary_checkout_stats = CheckoutStats()
+read_checkout_stats = CheckoutStats() if read_engine is not engine else primary_checkout_stats
+
+
+async def timed_session(
+        session_maker: Callable[[], AsyncSession], stats: CheckoutStats
+) -> AsyncIterator[AsyncSession]:
+    async with session_maker() as session:
+        # Check the connection out up front so the wait (and pre-ping, if on) can be measured
+        start = time.perf_counter()
+        await session.connection()
+        stats.record(time.perf_counter() - start)
         yield session
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async for session in timed_session(async_session, primary_checkout_stats):
+        yield session
+
+
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    """Session on READ_DATABASE_URL when configured, otherwise on the primary database"""
+    async for session in timed_session(async_read_session, read_checkout_stats):
+        yield session
+
+
+def read_session_context() -> AsyncContextManager[AsyncSession]:
+    """
+    ``get_read_session`` as a context manager, for handlers that only need a connection on
+    some paths and check it out once they know they do
+    """
+    return contextlib.asynccontextmanager(timed_session)(async_read_session, read_checkout_stats)
+
+
+def pool_status() -> dict[str, Any]:
+    pools = {"primary": (engine, primary_checkout_stats)}
+    if read_engine is not engine:
+        pools["read"] = (read_engine, read_checkout_stats)
+
+    status = {}
+    for name, (pooled_engine, stats) in pools.items():
+        pool: Any = pooled_engine.pool
+        status[name] = {
+            "url": pooled_engine.url.render_as_string(hide_password=True),
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+            **stats.as_dict(),
+        }
+    return status
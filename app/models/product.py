@@ -1,12 +1,36 @@
+from typing import Optional
+
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, Float, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    Computed,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, deferred, query_expression, relationship
 
 from app.models.db import Base
 
 
 class BookAIDetails(Base):
     __tablename__ = "book_ai_details"
+    __table_args__ = (
+        # Approximate nearest neighbour index for the similar books search. The migration can
+        # build an IVFFlat index instead (VECTOR_INDEX_TYPE=ivfflat); this is its default.
+        Index(
+            "ix_book_ai_details_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     book_id = Column(
@@ -20,6 +44,15 @@ class BookAIDetails(Base):
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        # (sort key, id) indexes backing keyset pagination of the product listing
+        Index("ix_books_price_id", "price", "id"),
+        Index("ix_books_rating_id", "rating", "id"),
+        Index("ix_books_name_id", "name", "id"),
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        # The pg_trgm GIN indexes on name and category live in the migrations only, since
+        # they need the pg_trgm extension installed first
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
@@ -30,5 +63,65 @@ class Book(Base):
     upc = Column(String, unique=True)
     availability = Column(String)
     stock_count = Column(Integer)
+    # Weighted full-text document kept up to date by Postgres; deferred so listings never load it
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+    ))
+    # ts_rank of the current search, only populated by get_books when ranking by relevance
+    search_rank: Mapped[Optional[float]] = query_expression()
 
     ai_details = relationship("BookAIDetails", back_populates="book", uselist=False)
+
+
+# (category, metric DESC, id) indexes backing the top books per category trend
+Index("ix_books_category_rating_id", Book.category, Book.rating.desc(), Book.id)
+Index("ix_books_category_price_id", Book.category, Book.price.desc(), Book.id)
+Index("ix_books_category_stock_count_id", Book.category, Book.stock_count.desc(), Book.id)
+
+
+class BookSnapshot(Base):
+    """
+    Append-only history of a book's price and stock, one row per book per seeding run.
+
+    Range-partitioned by month on crawled_at (see app.crud.history.ensure_snapshot_partition),
+    so time-window queries only scan the months they cover; the BRIN index is tiny because
+    rows arrive in crawl order.
+    """
+    __tablename__ = "book_snapshots"
+    __table_args__ = (
+        # The partition key has to be part of the primary key
+        PrimaryKeyConstraint("book_id", "crawled_at"),
+        Index("ix_book_snapshots_crawled_at", "crawled_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (crawled_at)"},
+    )
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    crawled_at = Column(DateTime(timezone=True), nullable=False)
+    upc = Column(String)
+    price = Column(Float)
+    stock_count = Column(Integer)
+    availability = Column(String)
+
+
+class BookNeighbor(Base):
+    """
+    A book's most similar books by embedding, best first, precomputed by the embedding job
+    (see app.ai.neighbors) so that the similar books endpoint is one primary key range read.
+    """
+    __tablename__ = "book_neighbors"
+    __table_args__ = (
+        PrimaryKeyConstraint("book_id", "rank"),
+        # Lets deleting a book find the lists it appears in without a scan
+        Index("ix_book_neighbors_neighbor_id", "neighbor_id"),
+    )
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    neighbor_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    # Cosine similarity, 1 - the cosine distance the live search orders by
+    score = Column(Float, nullable=False)
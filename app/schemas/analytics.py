@@ -0,0 +1,103 @@
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+BucketBy = Literal["price", "rating"]
+Metric = Literal["price", "rating", "stock_count"]
+GroupBy = Literal["category", "rating"]
+Aggregate = Literal["count", "sum", "mean", "min", "max"]
+QuantileGroup = Literal["all", "category"]
+
+
+def comma_separated(value: Any) -> Any:
+    """Lists in query strings are passed comma-separated, e.g. ``q=0.25,0.5,0.9``"""
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    return value
+
+
+class NoTrendParams(BaseModel):
+    pass
+
+
+class TopCategoriesParams(BaseModel):
+
+    k: int = Field(3, ge=1, le=50)
+
+
+class PopularCategoriesParams(BaseModel):
+
+    min_count: int = Field(3, ge=1)
+
+
+class TopBooksParams(BaseModel):
+
+    top_n: int = Field(1, ge=1, le=50)
+    metric: Metric = "rating"
+
+
+class RatingDecileParams(BaseModel):
+
+    buckets: int = Field(10, ge=2, le=100)
+    by: BucketBy = "price"
+
+
+class HistogramParams(BaseModel):
+
+    metric: Metric = "price"
+    bins: int = Field(10, ge=1, le=100)
+    category: Optional[str] = None
+
+
+class GroupByParams(BaseModel):
+
+    metric: Metric = "price"
+    by: GroupBy = "category"
+    aggregate: Aggregate = "mean"
+
+
+class CorrelationParams(BaseModel):
+
+    category: Optional[str] = None
+
+
+class QuantileParams(BaseModel):
+
+    metric: Metric = "price"
+    q: list[float] = Field([0.25, 0.5, 0.9], min_length=1, max_length=20)
+    category: Optional[str] = None
+    group: QuantileGroup = "all"
+
+    _split_q = field_validator("q", mode="before")(comma_separated)
+
+    @field_validator("q")
+    @classmethod
+    def check_fractions(cls, q: list[float]) -> list[float]:
+        if any(not 0 <= fraction <= 1 for fraction in q):
+            raise ValueError("quantiles must be between 0 and 1")
+        return q
+
+
+class SketchHistogramParams(BaseModel):
+
+    metric: Metric = "price"
+    bins: int = Field(10, ge=1, le=100)
+    # Explicit bin edges; equal-width bins between the minimum and maximum if omitted
+    edges: Optional[list[float]] = Field(None, min_length=2, max_length=101)
+    category: Optional[str] = None
+
+    _split_edges = field_validator("edges", mode="before")(comma_separated)
+
+    @field_validator("edges")
+    @classmethod
+    def check_increasing(cls, edges: Optional[list[float]]) -> Optional[list[float]]:
+        if edges is not None and any(lo >= hi for lo, hi in zip(edges, edges[1:], strict=False)):
+            raise ValueError("edges must be strictly increasing")
+        return edges
+
+
+class HistoryWindowParams(BaseModel):
+
+    days: int = Field(30, ge=1, le=3650)
+    category: Optional[str] = None
+    limit: int = Field(10, ge=1, le=100)
@@ -1,14 +1,20 @@
-from typing import Optional
+from typing import Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter
+
+# Upper bound on the ids a single batch lookup may ask for in the query string
+MAX_BATCH_IDS = 100
+# The POST body is not bound by URL length, and the ids travel as one array parameter
+MAX_POST_BATCH_IDS = 1000
 
 
 class BookListOut(BaseModel):
 
     id: int
     name: str
-    price: float
-    rating: int
+    # Required, but NULL for books crawled without a price or rating
+    price: Optional[float]
+    rating: Optional[int]
     category: Optional[str] = None
     upc: Optional[str] = None
     availability: Optional[str] = None
@@ -18,12 +24,17 @@ class BookListOut(BaseModel):
         from_attributes = True
 
 
+class SimilarBookOut(BookListOut):
+    # Cosine similarity to the requested book, from -1 to 1
+    score: float
+
+
 class BookDetailOut(BaseModel):
 
     id: int
     name: str
-    price: float
-    rating: int
+    price: Optional[float]
+    rating: Optional[int]
     description: Optional[str] = None
     category: Optional[str] = None
     upc: Optional[str] = None
@@ -33,3 +44,51 @@ class BookDetailOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BookListPage(BaseModel):
+
+    books: list[BookListOut]
+    total: int
+    total_mode: str
+    next_cursor: Optional[str] = None
+
+
+# Validates a whole page of rows in one call instead of one model_validate per book
+BOOK_LIST_ADAPTER = TypeAdapter(list[BookListOut])
+
+
+class BookBatchIn(BaseModel):
+
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_POST_BATCH_IDS)
+
+
+class BookBatchOut(BaseModel):
+
+    books: list[BookDetailOut]
+    missing: list[int]
+
+
+BOOK_DETAIL_ADAPTER = TypeAdapter(list[BookDetailOut])
+
+
+class FacetCount(BaseModel):
+
+    value: Union[str, int, None]
+    count: int
+
+
+class PriceBucketCount(BaseModel):
+
+    # Inclusive lower and exclusive upper bound; None for the open-ended end buckets
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: int
+
+
+class BookFacets(BaseModel):
+
+    total: int
+    categories: list[FacetCount]
+    ratings: list[FacetCount]
+    price_buckets: list[PriceBucketCount]
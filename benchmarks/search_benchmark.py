@@ -0,0 +1,120 @@
+"""
+Latency benchmark for the `q` filter of the product listing.
+
+Compares the old ``ilike '%q%'`` scan over name and description with the indexed full-text and
+trigram search used by ``get_books``, at several synthetic catalogue sizes.
+
+The target database must be migrated to head (``alembic upgrade head``) and is wiped on every
+size step, so it is never read from ``DATABASE_URL``:
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.search_benchmark
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+from sqlalchemy import or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.crud.product import get_books
+from app.models.product import Book
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ran", "tel", "dor", "su", "ve", "nis", "por", "qua", "zen", "bel", "cor",
+    "dra", "fen", "gil", "hal", "jor", "mar", "ost", "pel", "rho", "sar", "tun", "val", "wyn",
+]
+# Pronounceable synthetic words; a large vocabulary keeps each search term selective, as real
+# title and description words are, instead of matching nearly every book
+VOCABULARY = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+SEED_BOOKS_SQL = """
+INSERT INTO books (name, price, rating, description, category, upc, availability, stock_count)
+SELECT
+    initcap(v.words[1 + floor(random() * v.n)::int] || ' '
+            || v.words[1 + floor(random() * v.n)::int]),
+    round((5 + random() * 55)::numeric, 2),
+    1 + floor(random() * 5)::int,
+    (
+        SELECT string_agg(v.words[1 + floor(random() * v.n)::int], ' ' ORDER BY w.j)
+        FROM generate_series(1, 80) AS w(j)
+        WHERE g.i > 0
+    ),
+    initcap(v.words[1 + floor(random() * v.n)::int]),
+    'bench-' || g.i,
+    'In stock',
+    floor(random() * 50)::int
+FROM generate_series(1, :size) AS g(i),
+     (SELECT CAST(:words AS text[]) AS words, CAST(:n AS int) AS n) AS v
+"""
+
+
+async def seed(session: AsyncSession, size: int) -> None:
+    await session.execute(text("TRUNCATE books RESTART IDENTITY CASCADE"))
+    await session.execute(
+        text(SEED_BOOKS_SQL), {"size": size, "words": VOCABULARY, "n": len(VOCABULARY)}
+    )
+    await session.commit()
+    await session.execute(text("ANALYZE books"))
+    await session.commit()
+
+
+async def ilike_search(session: AsyncSession, q: str) -> Any:
+    """The listing query as it was before the search indexes existed"""
+    query = select(Book).where(
+        or_(Book.name.ilike(f"%{q}%"), Book.description.ilike(f"%{q}%"))
+    ).order_by(Book.id).limit(20)
+    return (await session.execute(query)).scalars().all()
+
+
+async def indexed_search(session: AsyncSession, q: str) -> Any:
+    return await get_books(session, q=q, limit=20)
+
+
+async def measure(
+        session: AsyncSession,
+        search: Callable[[AsyncSession, str], Awaitable[Any]],
+        terms: list[str],
+) -> tuple[float, float]:
+    timings = []
+    for term in terms:
+        start = time.perf_counter()
+        await search(session, term)
+        timings.append((time.perf_counter() - start) * 1000)
+        session.expunge_all()
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+async def run(database_url: str, sizes: list[int], queries: int) -> None:
+    engine = create_async_engine(database_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    rng = random.Random(42)
+
+    print(f"{'books':>10} | {'path':<8} | {'p50 ms':>9} | {'p99 ms':>9}")
+    async with session_maker() as session:
+        for size in sizes:
+            await seed(session, size)
+            terms = [rng.choice(VOCABULARY) for _ in range(queries)]
+            # Warm the buffer cache so both paths are measured on the same footing
+            await measure(session, ilike_search, terms[:5])
+            await measure(session, indexed_search, terms[:5])
+
+            for label, search in (("ilike", ilike_search), ("indexed", indexed_search)):
+                p50, p99 = await measure(session, search, terms)
+                print(f"{size:>10} | {label:<8} | {p50:>9.2f} | {p99:>9.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCHMARK_DATABASE_URL")
+    if not url:
+        parser.error("BENCHMARK_DATABASE_URL must point at a disposable, migrated database")
+    asyncio.run(run(url, args.sizes, args.queries))
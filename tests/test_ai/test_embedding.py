@@ -19,6 +19,7 @@ class TestGenerateAndStoreEmbeddings:
             def __init__(self):
                 self.added = []
                 self.committed = False
+                self.executed = []
 
             async def __aenter__(self):
                 return self
@@ -29,12 +30,27 @@ class TestGenerateAndStoreEmbeddings:
             def add_all(self, values):
                 self.added.extend(values)
 
+            async def execute(self, statement):
+                self.executed.append(statement)
+
+            async def flush(self):
+                pass
+
             async def commit(self):
                 self.committed = True
 
         return DummySession()
 
-    async def test_updates_existing_embedding(self, fake_embedding, dummy_session):
+    @pytest.fixture
+    def neighbors(self):
+        # The dummy session cannot compute neighbour lists
+        with (
+            patch("app.ai.embeddings.has_book_neighbors", new=AsyncMock(return_value=True)),
+            patch("app.ai.embeddings.update_book_neighbors", new=AsyncMock()) as update,
+        ):
+            yield update
+
+    async def test_updates_existing_embedding(self, fake_embedding, dummy_session, neighbors):
         # Use BookFactory to create a Book with existing ai_details
         book = BookFactory.build()
         ai_details = BookAIDetails(book_id=book.id, embedding=None)
@@ -52,7 +68,7 @@ class TestGenerateAndStoreEmbeddings:
             await embeddings.generate_and_store_embeddings()
         assert np.allclose(book.ai_details.embedding, fake_embedding.tolist())
 
-    async def test_creates_new_embedding(self, fake_embedding, dummy_session):
+    async def test_creates_new_embedding(self, fake_embedding, dummy_session, neighbors):
         # Use BookFactory to create a Book without ai_details
         book = BookFactory.build()
         book.ai_details = None
@@ -73,7 +89,7 @@ class TestGenerateAndStoreEmbeddings:
             assert kwargs.get("book_id") == book.id
             assert np.allclose(kwargs.get("embedding"), fake_embedding.tolist())
 
-    async def test_commit_called(self, fake_embedding, dummy_session):
+    async def test_commit_called(self, fake_embedding, dummy_session, neighbors):
         book = BookFactory.build()
         book.ai_details = None
         with (
@@ -87,6 +103,45 @@ class TestGenerateAndStoreEmbeddings:
             await embeddings.generate_and_store_embeddings()
         assert dummy_session.committed is True
 
+    async def test_updates_neighbors_of_embedded_books(
+            self, fake_embedding, dummy_session, neighbors
+    ):
+        books = BookFactory.build_batch(2)
+        for book in books:
+            book.ai_details = None
+        with (
+            patch(
+                "app.ai.embeddings.get_books_with_no_embedding", new=AsyncMock(return_value=books)
+                ),
+            patch("app.ai.embeddings.embed_book", return_value=fake_embedding),
+            patch("app.ai.embeddings.BookAIDetails"),
+            patch("app.ai.embeddings.async_session", return_value=dummy_session),
+        ):
+            await embeddings.generate_and_store_embeddings()
+        neighbors.assert_awaited_once_with(dummy_session, [book.id for book in books])
+
+    async def test_fills_the_neighbor_table_with_nothing_to_embed(self, dummy_session):
+        # Every book was embedded before the neighbour table existed
+        with (
+            patch("app.ai.embeddings.get_books_with_no_embedding", new=AsyncMock(return_value=[])),
+            patch(
+                "app.ai.embeddings.has_book_neighbors",
+                new=AsyncMock(side_effect=[False, True, True]),
+            ),
+            patch("app.ai.embeddings.rebuild_book_neighbors", new=AsyncMock()) as rebuild,
+            patch("app.ai.embeddings.bump_catalog_version", new=AsyncMock()) as bump,
+            patch("app.ai.embeddings.async_session", return_value=dummy_session),
+        ):
+            await embeddings.generate_and_store_embeddings()
+            rebuild.assert_awaited_once_with(dummy_session)
+            bump.assert_awaited_once_with(dummy_session)
+
+            # Filled already: nothing to do
+            await embeddings.generate_and_store_embeddings()
+            rebuild.assert_awaited_once()
+            bump.assert_awaited_once()
+        assert dummy_session.committed is True
+
     async def test_existing_embedding_is_unchanged(self, async_session):
         # The book already has an embedding
         original_embedding = [42.0] * 384
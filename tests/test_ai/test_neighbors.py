@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai import neighbors, recommender
+from app.ai.neighbors import nearest_neighbors, normalize
+from app.ai.recommender import get_similar_books_to_given_book
+from app.models.product import BookAIDetails, BookNeighbor
+from tests.factories import BookFactory
+
+
+def brute_force(matrix, k):
+    scores = matrix @ matrix.T
+    np.fill_diagonal(scores, -np.inf)
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(scores, order, axis=1)
+
+
+class TestNearestNeighbors:
+
+    def test_matches_a_full_sort(self):
+        matrix = normalize(np.random.default_rng(5).normal(size=(50, 16)).astype(np.float32))
+        positions, scores = nearest_neighbors(matrix, np.arange(50), 7)
+        expected_positions, expected_scores = brute_force(matrix, 7)
+        assert np.allclose(scores, expected_scores)
+        assert (positions == expected_positions).all()
+        assert not (positions == np.arange(50)[:, None]).any()
+
+    def test_fewer_rows_than_k(self):
+        matrix = normalize(np.eye(3, dtype=np.float32) + 0.1)
+        positions, scores = nearest_neighbors(matrix, np.array([0]), 10)
+        assert positions.shape == (1, 2)
+        assert set(positions[0]) == {1, 2}
+        assert nearest_neighbors(matrix[:1], np.array([0]), 10)[0].shape == (1, 0)
+
+
+@pytest.mark.asyncio
+class TestBookNeighbors:
+
+    @pytest.fixture(autouse=True)
+    def small_lists(self, monkeypatch):
+        # Short lists and tiny blocks, so updates have lists to displace and blocks to span
+        monkeypatch.setattr(neighbors, "BOOK_NEIGHBOR_COUNT", 3)
+        monkeypatch.setattr(neighbors, "NEIGHBOR_BLOCK_SIZE", 4)
+        monkeypatch.setattr(recommender, "BOOK_NEIGHBOR_COUNT", 3)
+
+    async def add_books(self, session: AsyncSession, embeddings) -> list[int]:
+        books = BookFactory.build_batch(len(embeddings))
+        session.add_all(books)
+        await session.flush()
+        session.add_all([
+            BookAIDetails(book_id=book.id, embedding=list(embedding))
+            for book, embedding in zip(books, embeddings)
+        ])
+        await session.flush()
+        return [book.id for book in books]
+
+    async def stored(self, session: AsyncSession) -> dict[int, list[int]]:
+        rows = (await session.execute(
+            select(BookNeighbor.book_id, BookNeighbor.neighbor_id)
+            .order_by(BookNeighbor.book_id, BookNeighbor.rank)
+        )).all()
+        lists: dict[int, list[int]] = {}
+        for row in rows:
+            lists.setdefault(row.book_id, []).append(row.neighbor_id)
+        return lists
+
+    async def test_rebuild_stores_the_exact_neighbors(self, async_session: AsyncSession):
+        embeddings = np.random.default_rng(1).normal(size=(10, 384))
+        ids = await self.add_books(async_session, embeddings)
+        await neighbors.rebuild_book_neighbors(async_session)
+
+        expected, _ = brute_force(normalize(embeddings), 3)
+        assert await self.stored(async_session) == {
+            book_id: [ids[position] for position in row] for book_id, row in zip(ids, expected)
+        }
+        assert await neighbors.has_book_neighbors(async_session)
+
+    async def test_update_matches_a_rebuild(self, async_session: AsyncSession):
+        rng = np.random.default_rng(2)
+        await self.add_books(async_session, rng.normal(size=(12, 384)))
+        await neighbors.rebuild_book_neighbors(async_session)
+        new_ids = await self.add_books(async_session, rng.normal(size=(5, 384)))
+
+        await neighbors.update_book_neighbors(async_session, new_ids)
+        updated = await self.stored(async_session)
+        await neighbors.rebuild_book_neighbors(async_session)
+        assert updated == await self.stored(async_session)
+
+    async def test_update_only_rewrites_affected_lists(self, async_session: AsyncSession):
+        # Two far apart clusters: a book added to one leaves the other's lists alone
+        rng = np.random.default_rng(4)
+        cluster = np.zeros(384)
+        cluster[0] = 10
+        far = await self.add_books(async_session, cluster + rng.normal(size=(5, 384)) * 0.1)
+        await self.add_books(async_session, -cluster + rng.normal(size=(5, 384)) * 0.1)
+        await neighbors.rebuild_book_neighbors(async_session)
+        new_ids = await self.add_books(async_session, -cluster + rng.normal(size=(1, 384)) * 0.1)
+
+        ids, matrix = await neighbors.load_embeddings(async_session)
+        positions = await neighbors.affected_positions(async_session, ids, matrix, new_ids)
+        assert new_ids[0] in ids[positions]
+        assert not set(ids[positions].tolist()) & set(far)
+
+    async def test_recommender_reads_the_stored_lists(self, async_session: AsyncSession, monkeypatch):
+        ids = await self.add_books(async_session, np.random.default_rng(3).normal(size=(6, 384)))
+        await neighbors.rebuild_book_neighbors(async_session)
+        await async_session.commit()
+        expected = (await self.stored(async_session))[ids[0]]
+
+        async def no_live_search(*args, **kwargs):
+            raise AssertionError("searched live")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(recommender, "apply_search_quality", no_live_search)
+            books = await get_similar_books_to_given_book(async_session, ids[0], k=2)
+            page = await get_similar_books_to_given_book(async_session, ids[0], k=2, offset=1)
+        assert [book.id for book in books] == expected[:2]
+        assert [book.id for book in page] == expected[1:3]
+        assert books[0].score >= books[1].score
+
+        # More than the stored lists hold: searched live
+        books = await get_similar_books_to_given_book(async_session, ids[0], k=5, quality="exact")
+        assert len(books) == 5
@@ -1,9 +1,11 @@
 import pytest
-from sqlalchemy import delete
+import pytest_asyncio
+from sqlalchemy import delete, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.product import Book, BookAIDetails
-from app.ai.recommender import get_similar_books_to_given_book
+from app.ai import recommender
+from app.ai.recommender import apply_search_quality, get_similar_books_to_given_book
 
 from tests.factories import BookFactory
 
@@ -28,7 +30,8 @@ class TestGetSimilarBooksToGivenBook:
 
         # Give each book an embedding:
         for idx, book in enumerate(books):
-            embedding = [float(idx)] * 384
+            # Non-zero, since cosine distance to a zero vector is undefined and the index skips it
+            embedding = [float(idx + 1)] * 384
             det = BookAIDetails(book_id=book.id, embedding=embedding)
             async_session.add(det)
             details.append(det)
@@ -62,7 +65,7 @@ class TestGetSimilarBooksToGivenBook:
         book1 = BookFactory.build()
         async_session.add(book1)
         await async_session.flush()
-        det1 = BookAIDetails(book_id=book1.id, embedding=[0.0]*384)
+        det1 = BookAIDetails(book_id=book1.id, embedding=[0.5]*384)
         async_session.add(det1)
 
         book2 = BookFactory.build()
@@ -77,3 +80,197 @@ class TestGetSimilarBooksToGivenBook:
         results = await get_similar_books_to_given_book(async_session, book_id=book1.id, k=5)
         assert len(results) == 1
         assert results[0].id == book2.id
+
+    @pytest.mark.parametrize("quality", ["balanced", "exact"])
+    async def test_skips_books_with_only_a_summary(self, async_session: AsyncSession, quality):
+        books = BookFactory.build_batch(3)
+        async_session.add_all(books)
+        await async_session.flush()
+        async_session.add_all([
+            BookAIDetails(book_id=books[0].id, embedding=[0.5] * 384),
+            BookAIDetails(book_id=books[1].id, embedding=[1.0] * 384),
+            # Written by the summariser before the book is embedded
+            BookAIDetails(book_id=books[2].id, summary="Summary only"),
+        ])
+        await async_session.commit()
+
+        results = await get_similar_books_to_given_book(
+            async_session, book_id=books[0].id, k=5, quality=quality
+        )
+        assert [row.id for row in results] == [books[1].id]
+        assert all(row.score is not None for row in results)
+
+
+@pytest.mark.asyncio
+class TestSearchQuality:
+    async def explain_similar_books(self, async_session: AsyncSession, quality: str) -> str:
+        book = BookFactory.build()
+        async_session.add(book)
+        await async_session.flush()
+        async_session.add(BookAIDetails(book_id=book.id, embedding=random_embedding()))
+        await async_session.flush()
+
+        # The test table is tiny, so make a sequential scan look expensive
+        await async_session.execute(text("SET LOCAL seq_page_cost = 100"))
+        await apply_search_quality(async_session, quality, 5)
+        embedding = "[" + ",".join(["0.5"] * 384) + "]"
+        result = await async_session.execute(text(
+            "EXPLAIN SELECT book_id FROM book_ai_details "
+            f"ORDER BY embedding <=> '{embedding}' LIMIT 5"
+        ))
+        return "\n".join(result.scalars().all())
+
+    async def test_sets_index_parameters_for_the_transaction(self, async_session: AsyncSession):
+        await apply_search_quality(async_session, "high", 5)
+        ef_search = await async_session.scalar(select(func.current_setting("hnsw.ef_search")))
+        probes = await async_session.scalar(select(func.current_setting("ivfflat.probes")))
+        assert (ef_search, probes) == ("200", "40")
+
+        # ef_search bounds how many rows an HNSW scan returns, so it is raised to k
+        await apply_search_quality(async_session, "fast", 100)
+        ef_search = await async_session.scalar(select(func.current_setting("hnsw.ef_search")))
+        assert ef_search == "100"
+
+        await async_session.rollback()
+        ef_search = await async_session.scalar(
+            select(func.current_setting("hnsw.ef_search", True))
+        )
+        assert ef_search != "100"
+
+    async def test_approximate_search_uses_the_embedding_index(self, async_session: AsyncSession):
+        plan = await self.explain_similar_books(async_session, "balanced")
+        assert "ix_book_ai_details_embedding" in plan
+
+    async def test_exact_search_does_not_use_the_index(self, async_session: AsyncSession):
+        plan = await self.explain_similar_books(async_session, "exact")
+        assert "ix_book_ai_details_embedding" not in plan
+
+    async def test_similar_books_with_each_quality(self, async_session: AsyncSession):
+        books = [BookFactory.build() for _ in range(3)]
+        async_session.add_all(books)
+        await async_session.flush()
+        for idx, book in enumerate(books):
+            embedding = [1.0] * 384
+            embedding[0] += idx
+            async_session.add(BookAIDetails(book_id=book.id, embedding=embedding))
+        await async_session.commit()
+
+        for quality in ("fast", "balanced", "high", "exact"):
+            results = await get_similar_books_to_given_book(
+                async_session, book_id=books[0].id, k=2, quality=quality
+            )
+            assert [b.id for b in results] == [books[1].id, books[2].id]
+
+
+@pytest.mark.asyncio
+class TestFilteredSimilarBooks:
+    @pytest_asyncio.fixture
+    async def catalog(self, async_session: AsyncSession):
+        rng = np.random.default_rng(21)
+        embeddings = rng.normal(size=(12, 384))
+        books = [
+            BookFactory.build(
+                category="Fiction" if i % 2 else "Science",
+                rating=i % 5 + 1,
+                price=5.0 + i,
+                stock_count=i % 3,
+            )
+            for i in range(12)
+        ]
+        async_session.add_all(books)
+        await async_session.flush()
+        async_session.add_all([
+            BookAIDetails(book_id=book.id, embedding=list(embedding))
+            for book, embedding in zip(books, embeddings)
+        ])
+        await async_session.commit()
+
+        unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = unit[1:] @ unit[0]
+        # Every other book, most similar to the first one first
+        ranked = [(books[i + 1], float(scores[i])) for i in np.argsort(-scores)]
+        return books, ranked
+
+    async def test_returns_scores_in_order(self, async_session: AsyncSession, catalog):
+        books, ranked = catalog
+        results = await get_similar_books_to_given_book(async_session, books[0].id, k=4)
+        assert [row.id for row in results] == [book.id for book, _ in ranked[:4]]
+        assert np.allclose([row.score for row in results], [score for _, score in ranked[:4]])
+
+    async def test_offset_and_min_score(self, async_session: AsyncSession, catalog):
+        books, ranked = catalog
+        page = await get_similar_books_to_given_book(async_session, books[0].id, k=3, offset=2)
+        assert [row.id for row in page] == [book.id for book, _ in ranked[2:5]]
+
+        threshold = ranked[3][1]
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=10, min_score=threshold
+        )
+        assert [row.id for row in results] == [book.id for book, _ in ranked[:4]]
+
+    @pytest.mark.parametrize("quality", ["balanced", "exact"])
+    async def test_filters(self, async_session: AsyncSession, catalog, quality):
+        books, ranked = catalog
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=3, quality=quality,
+            category="fiction", min_rating=2, max_price=15.0, in_stock=True,
+        )
+        expected = [
+            book.id for book, _ in ranked
+            if book.category == "Fiction" and book.rating >= 2 and book.price <= 15.0
+            and book.stock_count > 0
+        ][:3]
+        assert [row.id for row in results] == expected
+
+    async def test_too_few_candidates_fall_back_to_an_exact_search(
+            self, async_session: AsyncSession, catalog, monkeypatch
+    ):
+        books, ranked = catalog
+        monkeypatch.setattr(recommender, "FILTERED_OVERFETCH", 1)
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=4, in_stock=True
+        )
+        expected = [book.id for book, _ in ranked if book.stock_count > 0][:4]
+        assert [row.id for row in results] == expected
+
+    @pytest.fixture
+    def searches(self, monkeypatch):
+        qualities = []
+        apply = recommender.apply_search_quality
+
+        async def recording(session, quality, k):
+            qualities.append(quality)
+            await apply(session, quality, k)
+
+        monkeypatch.setattr(recommender, "apply_search_quality", recording)
+        return qualities
+
+    async def test_short_results_inside_the_window_are_not_searched_again(
+            self, async_session: AsyncSession, catalog, monkeypatch, searches
+    ):
+        books, ranked = catalog
+        # Fewer books in the category than wanted: the candidates cover the whole catalog
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=4, category="Poetry"
+        )
+        assert results == []
+
+        # The candidates run out of books above min_score before the window ends
+        monkeypatch.setattr(recommender, "FILTERED_OVERFETCH", 2)
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=4, in_stock=True,
+            min_score=(ranked[1][1] + ranked[2][1]) / 2,
+        )
+        expected = [book.id for book, _ in ranked[:2] if book.stock_count > 0]
+        assert [row.id for row in results] == expected
+        assert "exact" not in searches
+
+    async def test_pages_beyond_the_hnsw_limit_are_searched_exactly(
+            self, async_session: AsyncSession, catalog, searches
+    ):
+        books, _ = catalog
+        results = await get_similar_books_to_given_book(
+            async_session, books[0].id, k=5, offset=recommender.HNSW_MAX_EF_SEARCH
+        )
+        assert results == []
+        assert searches == ["exact"]
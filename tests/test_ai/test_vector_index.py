@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai import vector_index
+from app.ai.neighbors import normalize
+from app.ai.vector_index import VectorIndex, VectorSnapshot, build_graph
+from app.crud.catalog import bump_catalog_version
+from app.models.product import BookAIDetails
+from tests.factories import BookFactory
+
+
+def exact_neighbors(matrix, position, k):
+    scores = matrix @ matrix[position]
+    scores[position] = -np.inf
+    return np.argsort(-scores, kind="stable")[:k].tolist()
+
+
+class TestVectorSnapshot:
+
+    @pytest.fixture
+    def snapshot(self):
+        matrix = normalize(np.random.default_rng(8).normal(size=(40, 32)).astype(np.float32))
+        return VectorSnapshot(1, np.arange(100, 140), matrix)
+
+    def test_brute_force_search_is_exact(self, snapshot):
+        results = snapshot.search(105, 6, "balanced")
+        assert [book_id for book_id, _ in results] == [
+            100 + position for position in exact_neighbors(snapshot.matrix, 5, 6)
+        ]
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        assert 105 not in [book_id for book_id, _ in results]
+
+    def test_unknown_books_and_small_catalogs(self, snapshot):
+        assert snapshot.search(1, 5, "balanced") is None
+        assert len(snapshot.search(100, 100, "balanced")) == 39
+        single = VectorSnapshot(1, np.array([7]), np.ones((1, 32), dtype=np.float32))
+        assert single.search(7, 5, "balanced") == []
+
+    def test_graph_search_matches_brute_force(self, snapshot):
+        pytest.importorskip("hnswlib")
+        graph = VectorSnapshot(1, snapshot.ids, snapshot.matrix, build_graph(snapshot.matrix))
+        # A graph this small is searched exhaustively at high quality
+        approximate = graph.search(110, 5, "high")
+        exact = snapshot.search(110, 5, "high")
+        assert [book_id for book_id, _ in approximate] == [book_id for book_id, _ in exact]
+        assert np.allclose(
+            [score for _, score in approximate], [score for _, score in exact], atol=1e-5
+        )
+
+
+@pytest.mark.asyncio
+class TestVectorIndex:
+
+    @pytest.fixture(autouse=True)
+    def read_session(self, async_session_maker, monkeypatch):
+        monkeypatch.setattr(vector_index, "async_read_session", async_session_maker)
+
+    async def add_books(self, session: AsyncSession, embeddings) -> list[int]:
+        books = BookFactory.build_batch(len(embeddings))
+        session.add_all(books)
+        await session.flush()
+        session.add_all([
+            BookAIDetails(book_id=book.id, embedding=list(embedding))
+            for book, embedding in zip(books, embeddings)
+        ])
+        await bump_catalog_version(session)
+        await session.commit()
+        return [book.id for book in books]
+
+    async def test_answers_only_for_the_loaded_version(self, async_session: AsyncSession):
+        embeddings = np.random.default_rng(9).normal(size=(8, 384))
+        ids = await self.add_books(async_session, embeddings)
+        index = VectorIndex(enabled=True)
+        await index.refresh(1)
+
+        assert index.snapshot.size == 8
+        results = index.search(1, ids[0], k=3)
+        assert [book_id for book_id, _ in results] == [
+            ids[position] for position in exact_neighbors(normalize(embeddings), 0, 3)
+        ]
+        assert index.search(2, ids[0]) is None
+        assert index.search(None, ids[0]) is None
+        assert VectorIndex(enabled=False).search(1, ids[0]) is None
+
+    async def test_reload_keeps_the_matrix_when_no_embedding_was_added(
+            self, async_session: AsyncSession
+    ):
+        await self.add_books(async_session, np.random.default_rng(10).normal(size=(5, 384)))
+        index = VectorIndex(enabled=True)
+        await index.refresh(1)
+        first = index.snapshot
+
+        async_session.add(BookFactory.build())
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        await index.refresh(2)
+        assert index.snapshot.version == 2
+        assert index.snapshot.matrix is first.matrix
+
+        new_ids = await self.add_books(async_session, np.random.default_rng(11).normal(size=(1, 384)))
+        await index.refresh(3)
+        assert index.snapshot.size == 6
+        assert index.search(3, new_ids[0]) is not None
+
+    async def test_builds_a_graph_for_large_catalogs(self, async_session: AsyncSession):
+        pytest.importorskip("hnswlib")
+        await self.add_books(async_session, np.random.default_rng(12).normal(size=(6, 384)))
+        index = VectorIndex(enabled=True, hnsw_min_books=5)
+        await index.refresh(1)
+        assert index.snapshot.graph is not None
@@ -0,0 +1,153 @@
+import pytest
+
+from app.api.cache import CatalogVersionWatcher, ResponseCache, ResponseCacheMiddleware
+
+
+def make_app(calls):
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        status = 404 if scope["path"].endswith("missing") else 200
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b"page-", "more_body": True})
+        await send({"type": "http.response.body", "body": str(len(calls)).encode()})
+    return app
+
+
+async def call(app, path, query=b"", method="GET", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query, "headers": list(headers)
+    }
+    await app(scope, receive, send)
+    headers = dict(messages[0]["headers"])
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return messages[0]["status"], headers, body
+
+
+class TestResponseCache:
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 200, [], b"a")
+        cache.set("b", 200, [], b"b")
+        assert cache.get("a").body == b"a"
+        cache.set("c", 200, [], b"c")
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 2 and stats["misses"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("app.api.cache.time.monotonic", lambda: now[0])
+        cache = ResponseCache(max_entries=10, ttl_seconds=5)
+        cache.set("a", 200, [], b"a")
+        now[0] += 6
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+
+@pytest.mark.asyncio
+class TestResponseCacheMiddleware:
+
+    @pytest.fixture
+    def setup(self):
+        calls = []
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        watcher = CatalogVersionWatcher(poll_seconds=1)
+        watcher.subscribe(lambda version: cache.clear())
+        app = ResponseCacheMiddleware(make_app(calls), cache, watcher, ("/api",), ("/api/export",))
+        return app, watcher, calls
+
+    async def test_hit_skips_the_app(self, setup):
+        app, watcher, calls = setup
+        await watcher.set_version(1)
+        first = await call(app, "/api/books", b"b=2&a=1")
+        second = await call(app, "/api/books", b"a=1&b=2")
+        assert first[1][b"x-cache"] == b"MISS"
+        assert second[1][b"x-cache"] == b"HIT"
+        assert second[2] == first[2] == b"page-1"
+        assert calls == ["/api/books"]
+
+    async def test_version_change_invalidates(self, setup):
+        app, watcher, calls = setup
+        await watcher.set_version(1)
+        await call(app, "/api/books")
+        await watcher.set_version(2)
+        _, headers, body = await call(app, "/api/books")
+        assert headers[b"x-cache"] == b"MISS"
+        assert body == b"page-2"
+
+    async def test_bypassed_requests(self, setup):
+        app, watcher, calls = setup
+        await call(app, "/api/books")  # no version read yet
+        await watcher.set_version(1)
+        await call(app, "/api/export")
+        await call(app, "/other")
+        await call(app, "/api/books", method="POST")
+        await call(app, "/api/missing")
+        await call(app, "/api/missing")
+        assert len(calls) == 6
+
+    async def test_etag_answers_conditional_requests(self, setup):
+        app, watcher, calls = setup
+        await watcher.set_version(1)
+        status, headers, _ = await call(app, "/api/books", b"a=1")
+        etag = headers[b"etag"]
+
+        status, headers, body = await call(
+            app, "/api/books", b"a=1", headers=[(b"if-none-match", b'"other", W/' + etag)]
+        )
+        assert status == 304
+        assert headers[b"etag"] == etag
+        assert body == b""
+        assert calls == ["/api/books"]
+
+    async def test_etag_changes_with_version_and_params(self, setup):
+        app, watcher, calls = setup
+        await watcher.set_version(1)
+        first = (await call(app, "/api/books", b"a=1"))[1][b"etag"]
+        other_params = (await call(app, "/api/books", b"a=2"))[1][b"etag"]
+        await watcher.set_version(2)
+        status, headers, _ = await call(
+            app, "/api/books", b"a=1", headers=[(b"if-none-match", first)]
+        )
+        assert status == 200
+        assert len({first, other_params, headers[b"etag"]}) == 3
+
+    async def test_wildcard_only_matches_cached_responses(self, setup):
+        app, watcher, calls = setup
+        await watcher.set_version(1)
+        wildcard = [(b"if-none-match", b"*")]
+        status, _, _ = await call(app, "/api/missing", headers=wildcard)
+        assert status == 404
+        status, _, _ = await call(app, "/api/books", headers=wildcard)
+        assert status == 200
+        status, _, _ = await call(app, "/api/books", headers=wildcard)
+        assert status == 304
+        assert calls == ["/api/missing", "/api/books"]
+
+    async def test_etag_excluded_paths_are_cached_without_an_etag(self):
+        calls = []
+        watcher = CatalogVersionWatcher(poll_seconds=1)
+        app = ResponseCacheMiddleware(
+            make_app(calls), ResponseCache(10, 60), watcher, ("/api",),
+            etag_exclude_paths=("/api/trends/windowed",),
+        )
+        await watcher.set_version(1)
+        _, headers, _ = await call(app, "/api/trends/windowed")
+        assert b"etag" not in headers
+        status, headers, _ = await call(
+            app, "/api/trends/windowed", headers=[(b"if-none-match", b"*")]
+        )
+        assert status == 200
+        assert headers[b"x-cache"] == b"HIT"
+        assert calls == ["/api/trends/windowed"]
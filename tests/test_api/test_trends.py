@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from app.api import trends
+from app.api.trends import TREND_REGISTRY, TrendCache
+from app.crud import analytics_engine
+from app.crud.catalog import bump_catalog_version
+from tests.factories import BookFactory
+
+
+def make_compute(calls, delay=0.0, fail=False):
+    async def compute():
+        calls.append(len(calls))
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("database is down")
+        return f"result-{len(calls)}", None
+    return compute
+
+
+@pytest.mark.asyncio
+class TestTrendCache:
+    async def test_concurrent_misses_share_one_computation(self):
+        cache = TrendCache(max_entries=10, stale_seconds=0)
+        calls = []
+        compute = make_compute(calls, delay=0.01)
+
+        results = await asyncio.gather(*(cache.get("k", 60, compute) for _ in range(20)))
+
+        assert calls == [0]
+        assert set(results) == {("result-1", None)}
+        assert cache.stats()["coalesced"] == 19
+        assert await cache.get("k", 60, compute) == ("result-1", None)
+        assert cache.hits == 1
+
+    async def test_keys_are_cached_separately(self):
+        cache = TrendCache(max_entries=1, stale_seconds=0)
+        calls = []
+        compute = make_compute(calls)
+        await cache.get(("top", 3), 60, compute)
+        await cache.get(("top", 5), 60, compute)
+        await cache.get(("top", 3), 60, compute)
+        assert len(calls) == 3  # the one-entry cache evicted ("top", 3)
+
+    async def test_stale_entry_is_served_while_refreshing(self):
+        cache = TrendCache(max_entries=10, stale_seconds=60)
+        calls = []
+        compute = make_compute(calls, delay=0.01)
+        assert await cache.get("k", 0, compute) == ("result-1", None)
+
+        # Past its TTL: served immediately, with exactly one refresh behind it
+        assert await cache.get("k", 0, compute) == ("result-1", None)
+        assert await cache.get("k", 0, compute) == ("result-1", None)
+        await asyncio.sleep(0.05)
+        assert calls == [0, 1]
+        assert cache.stale_hits == 2
+        assert (await cache.get("k", 0, compute))[0] == "result-2"
+
+    async def test_expired_entry_blocks_for_a_recompute(self):
+        cache = TrendCache(max_entries=10, stale_seconds=0)
+        calls = []
+        compute = make_compute(calls)
+        await cache.get("k", 0, compute)
+        assert await cache.get("k", 0, compute) == ("result-2", None)
+
+    async def test_failures_are_raised_and_not_cached(self):
+        cache = TrendCache(max_entries=10, stale_seconds=60)
+        calls = []
+        with pytest.raises(RuntimeError):
+            await asyncio.gather(*(cache.get("k", 60, make_compute(calls, fail=True)) for _ in range(3)))
+        assert len(calls) == 1
+        assert await cache.get("k", 60, make_compute(calls)) == ("result-2", None)
+
+    async def test_failed_background_refresh_keeps_the_stale_entry(self):
+        cache = TrendCache(max_entries=10, stale_seconds=60)
+        calls = []
+        await cache.get("k", 0, make_compute(calls))
+        assert await cache.get("k", 0, make_compute(calls, fail=True)) == ("result-1", None)
+        await asyncio.sleep(0)
+        assert await cache.get("k", 0, make_compute(calls)) == ("result-1", None)
+
+
+@pytest.mark.asyncio
+class TestTrendRegistry:
+    async def test_get_trend_keys_on_version_and_params(self, monkeypatch):
+        seen = []
+
+        async def fake_compute(trend, params):
+            seen.append((trend.key, params.k))
+            return [], None
+
+        monkeypatch.setattr(trends, "compute_trend", fake_compute)
+        monkeypatch.setattr(trends, "trend_cache", TrendCache(max_entries=10, stale_seconds=0))
+        trend = TREND_REGISTRY["top_categories"]
+
+        await trends.get_trend(trend, trend.params(k=2))
+        await trends.get_trend(trend, trend.params.model_validate({"k": "2"}))
+        await trends.get_trend(trend, trend.params())
+        monkeypatch.setattr(trends.catalog_version_watcher, "version", 12345)
+        await trends.get_trend(trend, trend.params(k=2))
+
+        assert seen == [("top_categories", 2), ("top_categories", 3), ("top_categories", 2)]
+
+    async def test_every_trend_has_defaults_for_its_params(self):
+        for trend in TREND_REGISTRY.values():
+            trend.params()
+            assert trend.ttl_seconds > 0
+            assert trend.info()["endpoint"] == f"/trends/{trend.key}"
+
+    async def test_timed_trend_reports_failures_in_place(self, monkeypatch):
+        async def fake_get_trend(trend, params):
+            if trend.key == "top_categories":
+                raise RuntimeError("database is down")
+            return ["row"], None
+
+        monkeypatch.setattr(trends, "get_trend", fake_get_trend)
+        failed = await trends.timed_trend(TREND_REGISTRY["top_categories"], TREND_REGISTRY["top_categories"].params(), True)
+        assert failed["error"] == trends.TREND_FAILED
+        assert "database is down" not in str(failed)
+        assert "data" not in failed and failed["elapsed_ms"] >= 0
+
+        trend = TREND_REGISTRY["average_price_by_category"]
+        assert (await trends.timed_trend(trend, trend.params(), True))["data"] == ["row"]
+        assert "data" not in await trends.timed_trend(trend, trend.params(), False)
+
+    async def test_decile_uses_sql_until_the_snapshot_is_loaded(
+            self, async_session, async_session_maker, monkeypatch
+    ):
+        async_session.add_all([BookFactory.build(price=5 + i, rating=i % 5 + 1) for i in range(12)])
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        monkeypatch.setattr(trends, "async_read_session", async_session_maker)
+        monkeypatch.setattr(analytics_engine, "async_read_session", async_session_maker)
+        monkeypatch.setattr(trends.catalog_version_watcher, "version", 1)
+        monkeypatch.setattr(trends.analytics_engine, "snapshot", None)
+        trend = TREND_REGISTRY["price_by_rating_decile"]
+
+        from_sql, computed_at = await trend.compute(trend.params(buckets=4))
+        assert trends.analytics_engine.snapshot is None
+        assert computed_at is not None
+
+        snapshot = await trends.analytics_engine.update(1)
+        in_memory, computed_at = await trend.compute(trend.params(buckets=4))
+        assert computed_at == snapshot.loaded_at
+        assert len(in_memory) == len(from_sql) == 4
+        for got, want in zip(in_memory, from_sql, strict=True):
+            assert got.keys() == want.keys()
+            for key in got:
+                assert got[key] == pytest.approx(want[key])
@@ -1,5 +1,7 @@
+import numpy as np
 import pytest
 import pytest_asyncio
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud import analytics
@@ -54,6 +56,37 @@ class TestAnalytics:
             assert len(item["price_range"]) == 2
             assert "average_rating" in item
 
+    async def test_average_price_by_rating_decile_matches_numpy(self, async_session: AsyncSession, books_in_db):
+        prices = np.array([b.price for b in books_in_db], dtype=float)
+        ratings = np.array([b.rating for b in books_in_db], dtype=float)
+        edges = np.percentile(prices, [10 * i for i in range(11)])
+
+        result = await analytics.average_price_by_rating_decile(async_session)
+        for i, item in enumerate(result):
+            upper = prices <= edges[i + 1] if i == 9 else prices < edges[i + 1]
+            mask = (prices >= edges[i]) & upper
+            assert item["price_range"] == pytest.approx([edges[i], edges[i + 1]])
+            if mask.any():
+                assert item["average_rating"] == pytest.approx(ratings[mask].mean())
+            else:
+                assert item["average_rating"] is None
+
+    async def test_average_price_by_rating_buckets_by_rating(self, async_session: AsyncSession, books_in_db):
+        result = await analytics.average_price_by_rating_decile(async_session, buckets=4, by="rating")
+        assert len(result) == 4
+        assert result[0]["rating_range"][0] == 1
+        assert result[-1]["rating_range"][1] == 5
+        top = [b.price for b in books_in_db if b.rating >= result[-1]["rating_range"][0]]
+        assert result[-1]["average_price"] == pytest.approx(np.mean(top))
+
+    async def test_average_price_by_rating_decile_skips_missing_prices(self, async_session: AsyncSession):
+        async_session.add_all(
+            [BookFactory.build(price=10 + i, rating=3) for i in range(9)] + [BookFactory.build(price=None, rating=3)]
+        )
+        await async_session.commit()
+        assert await analytics.average_price_by_rating_decile(async_session) == []
+        assert len(await analytics.average_price_by_rating_decile(async_session, buckets=9)) == 9
+
     async def test_most_common_categories(self, async_session: AsyncSession, books_in_db):
         result = await analytics.most_common_categories(async_session, k=3)
         cats = [r["category"] for r in result]
@@ -83,3 +116,50 @@ class TestAnalytics:
         assert cat_names == res_cats
         for entry in result:
             assert "name" in entry and entry["rating"] is not None
+
+    async def test_top_n_books_per_category(self, async_session: AsyncSession, books_in_db):
+        result = await analytics.get_highest_rated_books_per_category(async_session, top_n=2, metric="price")
+        expected = []
+        for category in sorted({b.category for b in books_in_db}):
+            books = sorted((b for b in books_in_db if b.category == category), key=lambda b: (-b.price, b.id))
+            expected += [{"id": b.id, "name": b.name, "category": category, "price": b.price} for b in books[:2]]
+        assert result == expected
+
+    async def test_top_books_ties_and_uncategorized(self, async_session: AsyncSession):
+        books = [
+            BookFactory.build(rating=5, category="Poetry"),
+            BookFactory.build(rating=5, category="Poetry"),
+            BookFactory.build(rating=None, category="Poetry"),
+            BookFactory.build(rating=3, category=None),
+            BookFactory.build(rating=None, category="Empty"),
+        ]
+        async_session.add_all(books)
+        await async_session.commit()
+        result = await analytics.get_highest_rated_books_per_category(async_session, top_n=5)
+        assert [(r["category"], r["id"]) for r in result] == [
+            ("Poetry", books[0].id), ("Poetry", books[1].id), (None, books[3].id)
+        ]
+
+    async def test_top_books_read_the_category_index(self, async_session: AsyncSession, books_in_db):
+        captured = []
+
+        async def explain(statement):
+            plan = await original_execute(text("EXPLAIN " + str(statement.compile(
+                dialect=async_session.bind.dialect, compile_kwargs={"literal_binds": True}
+            ))))
+            captured.append("\n".join(plan.scalars()))
+            return await original_execute(statement)
+
+        original_execute = async_session.execute
+        # The test table is tiny; without these the planner rightly prefers scanning and sorting it
+        await async_session.execute(text("SET enable_seqscan = off"))
+        await async_session.execute(text("SET enable_sort = off"))
+        async_session.execute = explain
+        try:
+            await analytics.get_highest_rated_books_per_category(async_session, top_n=3, metric="stock_count")
+        finally:
+            async_session.execute = original_execute
+            await async_session.execute(text("RESET enable_seqscan"))
+            await async_session.execute(text("RESET enable_sort"))
+        assert "ix_books_category_stock_count_id" in captured[0]
+        assert "Limit" in captured[0]
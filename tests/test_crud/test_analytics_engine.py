@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import analytics, analytics_engine
+from app.crud.analytics_engine import AnalyticsEngine, load_catalog
+from app.crud.catalog import bump_catalog_version
+from tests.factories import BookFactory
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def books_in_db(async_session: AsyncSession):
+    objs = [
+        BookFactory.build(
+            price=10 + (i * 7) % 45,
+            rating=(i % 5) + 1,
+            stock_count=(i * 3) % 20,
+            category=["Fiction", "Science", "History"][i % 3],
+        )
+        for i in range(24)
+    ]
+    objs.append(BookFactory.build(price=None, rating=2, stock_count=None, category=None))
+    async_session.add_all(objs)
+    await bump_catalog_version(async_session)
+    await async_session.commit()
+    yield objs
+
+
+class TestAnalyticsEngine:
+
+    async def test_load_catalog_columns(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        assert catalog.version == 1
+        assert catalog.size == len(books_in_db)
+        assert np.isnan(catalog.price).sum() == 1
+        assert sorted(catalog.categories) == ["Fiction", "History", "Science"]
+        assert (catalog.category_codes == -1).sum() == 1
+
+    async def test_incremental_refresh_appends_new_books(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        async_session.add(BookFactory.build(price=99, rating=5, category="Poetry"))
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        await async_session.rollback()
+
+        updated = await load_catalog(async_session, catalog)
+        assert updated.version == 2
+        assert updated.size == catalog.size + 1
+        assert updated.categories[:3] == catalog.categories
+        assert updated.categories[-1] == "Poetry"
+        assert np.array_equal(updated.ids[:catalog.size], catalog.ids)
+
+    async def test_deleted_books_force_a_full_reload(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        await async_session.delete(books_in_db[0])
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        await async_session.rollback()
+
+        updated = await load_catalog(async_session, catalog)
+        assert updated.size == catalog.size - 1
+        assert books_in_db[0].id not in updated.ids
+
+    @pytest.mark.parametrize("buckets,by", [(10, "price"), (4, "rating"), (30, "price")])
+    async def test_decile_matches_sql(self, async_session: AsyncSession, books_in_db, buckets, by):
+        catalog = await load_catalog(async_session)
+        expected = await analytics.average_price_by_rating_decile(async_session, buckets=buckets, by=by)
+        result = analytics_engine.price_by_rating_decile(catalog, buckets=buckets, by=by)
+        assert len(result) == len(expected)
+        for got, want in zip(result, expected):
+            assert got.keys() == want.keys()
+            for key in got:
+                assert got[key] == pytest.approx(want[key])
+
+    async def test_histogram(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        result = analytics_engine.histogram(catalog, metric="stock_count", bins=4, category="Science")
+        stocks = [b.stock_count for b in books_in_db if b.category == "Science"]
+        counts, edges = np.histogram(stocks, bins=4)
+        assert [r["count"] for r in result] == counts.tolist()
+        assert result[-1]["range"][1] == edges[-1]
+        assert analytics_engine.histogram(catalog, category="Unknown") == []
+
+    async def test_group_by_matches_sql(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        means = analytics_engine.group_by(catalog, metric="price", by="category", aggregate="mean")
+        expected = await analytics.average_price_by_category(async_session)
+        assert {r["category"]: r["mean"] for r in means} == pytest.approx(
+            {r["category"]: r["average_price"] for r in expected}
+        )
+
+        maxima = analytics_engine.group_by(catalog, metric="stock_count", by="rating", aggregate="max")
+        for row in maxima:
+            stocks = [b.stock_count for b in books_in_db if b.rating == row["rating"] and b.stock_count is not None]
+            assert row["max"] == max(stocks) and row["books"] == len(stocks)
+
+        counts = analytics_engine.group_by(catalog, metric="rating", by="rating", aggregate="count")
+        assert sum(r["count"] for r in counts) == len(books_in_db)
+
+    async def test_correlation(self, async_session: AsyncSession, books_in_db):
+        catalog = await load_catalog(async_session)
+        result = analytics_engine.correlation(catalog)
+        complete = [b for b in books_in_db if b.price is not None and b.stock_count is not None]
+        expected = np.corrcoef([[b.price for b in complete], [b.rating for b in complete]])
+        assert result["books"] == len(complete)
+        assert result["matrix"]["price"]["rating"] == pytest.approx(expected[0, 1])
+        assert result["matrix"]["rating"]["rating"] == pytest.approx(1.0)
+        assert analytics_engine.correlation(catalog, category="Unknown") == {"books": 0, "matrix": None}
+
+    async def test_engine_follows_the_catalog_version(self, async_session: AsyncSession, async_session_maker, books_in_db, monkeypatch):
+        monkeypatch.setattr(analytics_engine, "async_read_session", async_session_maker)
+        engine = AnalyticsEngine()
+        first = await engine.current(None)
+        assert first.version == 1
+        assert await engine.current(1) is first
+
+        async_session.add(BookFactory.build(price=1, rating=1, category="Fiction"))
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        await engine.refresh(2)
+        assert engine.snapshot.version == 2
+        assert engine.snapshot.size == first.size + 1
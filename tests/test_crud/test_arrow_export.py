@@ -0,0 +1,84 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import arrow_export
+from app.crud.arrow_export import EMBEDDING_DIMENSIONS
+from app.crud.catalog import bump_catalog_version
+from app.models.product import BookAIDetails
+from tests.factories import BookFactory
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def books_in_db(async_session: AsyncSession):
+    rng = np.random.default_rng(5)
+    books = [BookFactory.build(category="Fiction" if i % 2 else "Science") for i in range(7)]
+    async_session.add_all(books)
+    await async_session.flush()
+    embeddings = {}
+    for book in books[:5]:
+        embeddings[book.id] = rng.random(EMBEDDING_DIMENSIONS, dtype=np.float32)
+        async_session.add(BookAIDetails(
+            book_id=book.id, summary=f"Summary {book.id}", embedding=embeddings[book.id].tolist()
+        ))
+    await bump_catalog_version(async_session)
+    await async_session.commit()
+    yield books, embeddings
+
+
+async def export(async_session: AsyncSession, path, monkeypatch, batch_size=3):
+    monkeypatch.setattr(arrow_export, "EXPORT_BATCH_SIZE", batch_size)
+    return await arrow_export.write_catalog_file(async_session, path)
+
+
+class TestArrowExport:
+
+    @pytest.mark.parametrize("name", ["catalog.parquet", "catalog.arrow"])
+    async def test_round_trip(self, async_session: AsyncSession, books_in_db, tmp_path, monkeypatch, name):
+        books, embeddings = books_in_db
+        path = tmp_path / name
+        assert await export(async_session, path, monkeypatch) == len(books)
+        assert [p.name for p in tmp_path.iterdir()] == [name]
+
+        table = arrow_export.load_catalog_file(path)
+        assert table.schema.metadata[b"catalog_version"] == b"1"
+        assert table["id"].to_pylist() == sorted(book.id for book in books)
+        by_id = {book.id: book for book in books}
+        for row in table.to_pylist():
+            book = by_id[row["id"]]
+            assert (row["name"], row["price"], row["category"], row["upc"]) == (book.name, book.price, book.category, book.upc)
+            assert row["summary"] == (f"Summary {book.id}" if book.id in embeddings else None)
+
+        ids, matrix = arrow_export.load_embeddings(path)
+        assert ids.tolist() == sorted(embeddings)
+        assert matrix.dtype == np.float32 and matrix.shape == (5, EMBEDDING_DIMENSIONS)
+        np.testing.assert_array_equal(matrix, np.stack([embeddings[book_id] for book_id in ids]))
+
+    async def test_parquet_row_group_per_batch(self, async_session: AsyncSession, books_in_db, tmp_path, monkeypatch):
+        path = tmp_path / "catalog.parquet"
+        await export(async_session, path, monkeypatch, batch_size=3)
+        metadata = pq.ParquetFile(path).metadata
+        assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [3, 3, 1]
+        assert pq.read_schema(path).field("embedding").type == pa.list_(pa.float32(), EMBEDDING_DIMENSIONS)
+
+    async def test_arrow_ipc_stream(self, async_session: AsyncSession, books_in_db, monkeypatch):
+        books, _ = books_in_db
+        monkeypatch.setattr(arrow_export, "EXPORT_BATCH_SIZE", 4)
+        schema = await arrow_export.catalog_arrow_schema(async_session)
+        batches = arrow_export.stream_catalog_batches(async_session, schema, category="Science")
+        payload = b"".join([chunk async for chunk in arrow_export.arrow_stream_chunks(schema, batches)])
+
+        table = pa.ipc.open_stream(payload).read_all()
+        assert table.schema.equals(schema)
+        assert table["id"].to_pylist() == [book.id for book in books if book.category == "Science"]
+
+    async def test_empty_catalog(self, async_session: AsyncSession, tmp_path):
+        path = tmp_path / "catalog.arrow"
+        assert await arrow_export.write_catalog_file(async_session, path) == 0
+        ids, matrix = arrow_export.load_embeddings(path)
+        assert len(ids) == 0 and matrix.shape == (0, EMBEDDING_DIMENSIONS)
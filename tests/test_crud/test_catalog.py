@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import bump_catalog_version, get_catalog_version
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestCatalogVersion:
+
+    async def test_version_starts_at_zero(self, async_session: AsyncSession):
+        assert await get_catalog_version(async_session) == 0
+
+    async def test_bump_increments_version(self, async_session: AsyncSession):
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        assert await get_catalog_version(async_session) == 1
+
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+        assert await get_catalog_version(async_session) == 2
+
+    async def test_bump_is_rolled_back_with_the_writer(self, async_session: AsyncSession):
+        await bump_catalog_version(async_session)
+        await async_session.rollback()
+        assert await get_catalog_version(async_session) == 0
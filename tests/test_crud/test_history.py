@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import history
+from app.models.product import BookSnapshot
+from tests.factories import BookFactory
+
+pytestmark = pytest.mark.asyncio
+
+NOW = datetime.now(timezone.utc)
+
+
+def snapshot(book, price=None, stock_count=None):
+    return {"book_id": book.id, "upc": book.upc, "price": price, "stock_count": stock_count,
+            "availability": "In stock"}
+
+
+@pytest_asyncio.fixture
+async def crawled_books(async_session: AsyncSession):
+    """Four crawls of three books: 90, 20, 10 and 0 days ago"""
+    stable, falling, rising = books = [
+        BookFactory.build(category="Fiction"),
+        BookFactory.build(category="Fiction"),
+        BookFactory.build(category="Science"),
+    ]
+    async_session.add_all(books)
+    await async_session.flush()
+    crawls = [
+        (90, [snapshot(stable, 10, 5), snapshot(falling, 100, 50), snapshot(rising, 1, 1)]),
+        (20, [snapshot(stable, 10, 5), snapshot(falling, 40, 30), snapshot(rising, 20, 9)]),
+        (10, [snapshot(stable, 10, 5), snapshot(falling, None, None), snapshot(rising, 22, 9)]),
+        (0, [snapshot(stable, 10, 5), snapshot(falling, 30, 10), snapshot(rising, 30, 8)]),
+    ]
+    for days_ago, snapshots in crawls:
+        await history.record_snapshots(async_session, NOW - timedelta(days=days_ago), snapshots)
+    await async_session.commit()
+    yield books
+
+
+class TestBookSnapshots:
+
+    async def test_partition_bounds(self):
+        name, start, end = history.snapshot_partition_bounds(datetime(2025, 12, 31, 23, tzinfo=timezone.utc))
+        assert name == "book_snapshots_2025_12"
+        assert (start, end) == (datetime(2025, 12, 1, tzinfo=timezone.utc), datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+    async def test_snapshots_land_in_monthly_partitions(self, async_session: AsyncSession, crawled_books):
+        rows = (await async_session.execute(
+            select(text("tableoid::regclass::text"), BookSnapshot.crawled_at).select_from(BookSnapshot)
+        )).all()
+        assert len(rows) == 12
+        for partition, crawled_at in rows:
+            assert partition == history.snapshot_partition_bounds(crawled_at)[0]
+
+    async def test_recording_a_crawl_twice_is_a_no_op(self, async_session: AsyncSession, crawled_books):
+        await history.record_snapshots(async_session, NOW, [snapshot(crawled_books[0], 99, 99)])
+        await async_session.commit()
+        prices = (await async_session.scalars(
+            select(BookSnapshot.price).where(BookSnapshot.book_id == crawled_books[0].id)
+        )).all()
+        assert prices == [10, 10, 10, 10]
+
+    async def test_large_crawls_are_inserted_in_batches(self, async_session: AsyncSession, monkeypatch):
+        monkeypatch.setattr(history, "SNAPSHOT_INSERT_BATCH", 2)
+        books = BookFactory.build_batch(5)
+        async_session.add_all(books)
+        await async_session.flush()
+        await history.record_snapshots(async_session, NOW, [snapshot(book, 5, 1) for book in books])
+        await async_session.commit()
+        stored = (await async_session.scalars(select(BookSnapshot.book_id))).all()
+        assert sorted(stored) == sorted(book.id for book in books)
+
+    async def test_price_movement(self, async_session: AsyncSession, crawled_books):
+        stable, falling, rising = crawled_books
+        data, computed_at = await history.price_movement(async_session, days=30)
+        assert [row["id"] for row in data] == [rising.id, falling.id]
+        assert data[0]["first_price"] == 20 and data[0]["last_price"] == 30
+        assert data[0]["percent_change"] == pytest.approx(50)
+        assert data[1]["change"] == -10
+        assert computed_at is not None
+
+        # The 90 day window reaches the first crawl
+        data, _ = await history.price_movement(async_session, days=100, limit=1)
+        assert [(row["id"], row["first_price"]) for row in data] == [(rising.id, 1)]
+        data, _ = await history.price_movement(async_session, days=30, category="Fiction")
+        assert [row["id"] for row in data] == [falling.id]
+        assert (await history.price_movement(async_session, days=5))[0] == []
+
+    async def test_stock_depletion(self, async_session: AsyncSession, crawled_books):
+        stable, falling, rising = crawled_books
+        data, _ = await history.stock_depletion(async_session, days=30)
+        assert [(row["id"], row["depleted"]) for row in data] == [(falling.id, 20), (rising.id, 1)]
+        assert data[0]["per_day"] == pytest.approx(1, rel=1e-3)
+        assert data[0]["days_until_out"] == pytest.approx(10, rel=1e-3)
+
+    async def test_window_skips_older_partitions(self, async_session: AsyncSession, crawled_books):
+        since = NOW - timedelta(days=20)
+        stmt = history.window_select(BookSnapshot.price, since)
+        plan = "\n".join((await async_session.execute(
+            text("EXPLAIN " + str(stmt.compile(compile_kwargs={"literal_binds": True})))
+        )).scalars())
+        old_partition = history.snapshot_partition_bounds(NOW - timedelta(days=90))[0]
+        assert history.snapshot_partition_bounds(NOW)[0] in plan
+        assert old_partition not in plan
@@ -1,11 +1,16 @@
+from types import SimpleNamespace
+
 import pytest
 import pytest_asyncio
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.orm import selectinload
 
-from app.crud.product import get_books, get_book_by_id, book_to_dict
+from app.crud.product import (
+    get_books, get_book_by_id, get_book_list_rows, get_books_by_ids, get_book_list_by_ids, book_to_dict, count_books,
+    encode_cursor, export_columns, get_book_facets, stream_books, PRICE_FACET_EDGES,
+)
 from app.models.product import Book, BookAIDetails
-from app.schemas.product import BookDetailOut
+from app.schemas.product import BOOK_LIST_ADAPTER, BookDetailOut, BookListOut
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from tests.factories import BookFactory, BookAIDetailsFactory
@@ -80,6 +85,117 @@ class TestProductCrud:
         part2 = await get_books(async_session, skip=1, limit=1)
         assert part1 != part2 or total < 2
 
+    async def test_get_books_cursor_walks_all_books(self, async_session: AsyncSession, books_in_db):
+        seen = []
+        cursor = None
+        while True:
+            page = await get_books(async_session, limit=7, sort="-price", cursor=cursor)
+            seen.extend(page)
+            if len(page) < 7:
+                break
+            cursor = encode_cursor("-price", page[-1])
+        assert len(seen) == len(books_in_db)
+        assert len({b.id for b in seen}) == len(books_in_db)
+        keys = [(b.price, b.id) for b in seen]
+        assert keys == sorted(keys, key=lambda k: (-k[0], -k[1]))
+
+    async def test_get_books_cursor_matches_offset(self, async_session: AsyncSession, books_in_db):
+        first = await get_books(async_session, limit=5, sort="rating")
+        by_cursor = await get_books(
+            async_session, limit=5, sort="rating", cursor=encode_cursor("rating", first[-1])
+        )
+        by_offset = await get_books(async_session, skip=5, limit=5, sort="rating")
+        assert [b.id for b in by_cursor] == [b.id for b in by_offset]
+
+    async def test_get_books_rejects_invalid_cursor(self, async_session: AsyncSession, books_in_db):
+        with pytest.raises(ValueError):
+            await get_books(async_session, cursor="not-a-cursor")
+        with pytest.raises(ValueError):
+            await get_books(async_session, sort="price", cursor=encode_cursor("id", books_in_db[0]))
+
+    @pytest.mark.parametrize("sort, key", [
+        ("price", "cheap"), ("-rating", 4.5), ("rating", True), ("name", None), ("name", 3),
+        ("relevance", "high"),
+    ])
+    async def test_get_books_rejects_cursor_keys_of_the_wrong_type(
+            self, async_session: AsyncSession, books_in_db, sort, key
+    ):
+        cursor = encode_cursor(sort, SimpleNamespace(id=1, search_rank=key, **{sort.lstrip("-"): key}))
+        with pytest.raises(ValueError):
+            await get_books(async_session, sort=sort, q="dragon", cursor=cursor)
+
+    async def test_get_books_accepts_null_cursor_keys_of_nullable_columns(
+            self, async_session: AsyncSession, books_in_db
+    ):
+        cursor = encode_cursor("price", SimpleNamespace(id=1, price=None))
+        assert await get_books(async_session, sort="price", cursor=cursor) == []
+
+    async def test_get_books_full_text_search_ranked(self, async_session: AsyncSession):
+        weak = BookFactory.build(name="Plain title", description="A tale with one dragon.")
+        strong = BookFactory.build(name="Dragons", description="Dragons and more dragons.")
+        other = BookFactory.build(name="Gardening", description="Roses and tulips.")
+        async_session.add_all([weak, strong, other])
+        await async_session.commit()
+
+        books = await get_books(async_session, q="dragon")
+        assert [b.id for b in books] == [strong.id, weak.id]
+        assert books[0].search_rank > books[1].search_rank
+
+        second = await get_books(
+            async_session, q="dragon", limit=1, cursor=encode_cursor("relevance", books[0])
+        )
+        assert [b.id for b in second] == [weak.id]
+
+    async def test_get_books_relevance_requires_query(self, async_session: AsyncSession):
+        with pytest.raises(ValueError):
+            await get_books(async_session, sort="relevance")
+
+    async def test_get_book_list_rows_matches_get_books(self, async_session: AsyncSession, books_in_db):
+        books = await get_books(async_session, sort="-price", min_rating=2, limit=8)
+        rows = await get_book_list_rows(async_session, sort="-price", min_rating=2, limit=8)
+        assert [r.id for r in rows] == [b.id for b in books]
+        assert "description" not in rows[0]._fields
+
+        out = BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+        assert out[0].name == books[0].name
+        assert out[0].price == books[0].price
+
+    async def test_count_books_exact_uses_listing_filters(self, async_session: AsyncSession, books_in_db):
+        assert await count_books(async_session) == len(books_in_db)
+        expected = sum(1 for b in books_in_db if b.rating >= 4 and b.category == "Fiction")
+        assert await count_books(async_session, min_rating=4, category="fict") == expected
+
+    async def test_count_books_leaves_out_null_sort_keys(self, async_session: AsyncSession, books_in_db):
+        async_session.add(BookFactory.build(price=None))
+        await async_session.flush()
+        assert await count_books(async_session) == len(books_in_db) + 1
+        assert await count_books(async_session, sort="-price") == len(books_in_db)
+        rows = await get_book_list_rows(async_session, sort="-price", limit=100)
+        assert len(rows) == len(books_in_db)
+
+    async def test_count_books_estimate(self, async_session: AsyncSession, books_in_db):
+        estimate = await count_books(async_session, mode="estimate", q="it's 100% ok: yes")
+        assert isinstance(estimate, int)
+        assert estimate >= 0
+
+    async def test_get_book_facets_counts_every_facet(self, async_session: AsyncSession, books_in_db):
+        facets = await get_book_facets(async_session)
+        assert facets.total == len(books_in_db)
+        assert {f.value: f.count for f in facets.categories} == {"Fiction": 10, "Science": 5, "History": 5}
+        assert sum(f.count for f in facets.ratings) == len(books_in_db)
+        assert {f.value: f.count for f in facets.ratings}[5] == sum(1 for b in books_in_db if b.rating == 5)
+        assert len(facets.price_buckets) == len(PRICE_FACET_EDGES) + 1
+        assert sum(b.count for b in facets.price_buckets) == len(books_in_db)
+        top = facets.price_buckets[-1]
+        assert top.min == PRICE_FACET_EDGES[-1] and top.max is None
+        assert top.count == sum(1 for b in books_in_db if b.price >= PRICE_FACET_EDGES[-1])
+
+    async def test_get_book_facets_applies_listing_filters(self, async_session: AsyncSession, books_in_db):
+        facets = await get_book_facets(async_session, min_rating=4, category="fict")
+        assert facets.total == await count_books(async_session, min_rating=4, category="fict")
+        assert [(f.value, f.count) for f in facets.categories] == [("Fiction", facets.total)]
+        assert {f.value for f in facets.ratings} == {4, 5}
+
     async def test_book_to_dict_returns_correct_keys(self, async_session: AsyncSession):
         book = BookFactory.build(
             name="Test Book",
@@ -116,6 +232,67 @@ class TestProductCrud:
         assert isinstance(detail, BookDetailOut)
         assert detail.id == book.id
 
+    async def test_get_book_by_id_single_query_with_summary(self, async_session: AsyncSession):
+        book = BookFactory.build()
+        ai_details = BookAIDetailsFactory.build(book=book, embedding=[0.5] * 384)
+        async_session.add_all([book, ai_details])
+        await async_session.commit()
+
+        statements = []
+        engine = async_session.bind.sync_engine
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            detail = await get_book_by_id(async_session, book.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+        assert "embedding" not in statements[0]
+        assert detail.summary == ai_details.summary
+        assert detail.description == book.description
+
+    async def test_get_books_by_ids(self, async_session: AsyncSession, books_in_db):
+        wanted = [books_in_db[3].id, books_in_db[0].id, -1]
+        found = await get_books_by_ids(async_session, wanted)
+        assert set(found) == {books_in_db[3].id, books_in_db[0].id}
+        assert isinstance(found[books_in_db[0].id], BookDetailOut)
+        assert found[books_in_db[3].id].name == books_in_db[3].name
+        assert await get_books_by_ids(async_session, []) == {}
+
+    async def test_get_book_list_by_ids_keeps_the_order(self, async_session: AsyncSession, books_in_db):
+        wanted = [books_in_db[3].id, -1, books_in_db[0].id]
+        found = await get_book_list_by_ids(async_session, wanted)
+        assert [book.id for book in found] == [books_in_db[3].id, books_in_db[0].id]
+        assert isinstance(found[0], BookListOut)
+        assert await get_book_list_by_ids(async_session, []) == []
+
+    async def test_stream_books_yields_all_in_batches(self, async_session: AsyncSession, books_in_db, monkeypatch):
+        monkeypatch.setattr("app.crud.product.EXPORT_BATCH_SIZE", 6)
+        batches = [batch async for batch in stream_books(async_session, min_price=10)]
+        ids = [row.id for batch in batches for row in batch]
+        assert ids == sorted(b.id for b in books_in_db if b.price >= 10)
+        assert max(len(batch) for batch in batches) <= 6
+        assert "summary" not in batches[0][0]._fields
+
+    async def test_stream_books_with_summary(self, async_session: AsyncSession):
+        book = BookFactory.build()
+        ai_details = BookAIDetailsFactory.build(book=book)
+        async_session.add_all([book, ai_details])
+        await async_session.commit()
+        rows = [row async for batch in stream_books(async_session, include_summary=True) for row in batch]
+        assert [(r.id, r.summary) for r in rows] == [(book.id, ai_details.summary)]
+
+    @pytest.mark.parametrize("include_summary", [False, True])
+    async def test_export_columns_match_the_streamed_rows(
+            self, async_session: AsyncSession, books_in_db, include_summary
+    ):
+        batches = [batch async for batch in stream_books(async_session, include_summary=include_summary)]
+        assert export_columns(include_summary) == list(batches[0][0]._fields)
+
     async def test_get_book_by_id_not_found(self, async_session: AsyncSession):
         detail = await get_book_by_id(async_session, -99999)
         assert detail is None
\ No newline at end of file
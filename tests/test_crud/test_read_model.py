@@ -0,0 +1,107 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import bump_catalog_version
+from app.crud.product import count_books, get_book_list_rows
+from app.crud.read_model import CatalogReadModel, load_snapshot
+from app.schemas.product import BOOK_LIST_ADAPTER
+from tests.factories import BookFactory
+
+LISTINGS = [
+    {},
+    {"sort": "-price", "limit": 5},
+    {"sort": "name", "min_rating": 3},
+    {"sort": "-rating", "category": "sci", "max_price": 60},
+    {"sort": "price", "category": "nothing"},
+    {"sort": "-name", "skip": 3, "limit": 4},
+    {"sort": "rating", "min_price": 30, "limit": 3},
+]
+
+
+@pytest_asyncio.fixture
+async def catalog(async_session: AsyncSession):
+    categories = ["Fiction", "Science", "History", "Popular Science"]
+    books = [
+        BookFactory.build(
+            name=f"{'Zeta' if i % 2 else 'alpha'} {i % 7}",
+            price=10 + (i * 7) % 50,
+            rating=(i % 5) + 1,
+            category=categories[i % 4],
+        )
+        for i in range(30)
+    ]
+    async_session.add_all(books)
+    await bump_catalog_version(async_session)
+    await async_session.commit()
+    yield books
+
+
+@pytest.mark.asyncio
+class TestCatalogReadModel:
+    @pytest.mark.parametrize("listing", LISTINGS)
+    async def test_pages_match_sql(self, async_session: AsyncSession, catalog, listing):
+        snapshot = await load_snapshot(async_session)
+        page = snapshot.list_books(**listing)
+        rows = await get_book_list_rows(async_session, **listing)
+        filters = {k: v for k, v in listing.items() if k not in ("skip", "limit")}
+
+        assert page.books == BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+        assert page.total == await count_books(async_session, **filters)
+
+    @pytest.mark.parametrize("sort", ["id", "-price", "rating", "-name"])
+    async def test_cursor_walk_matches_sql(self, async_session: AsyncSession, catalog, sort):
+        snapshot = await load_snapshot(async_session)
+        cursor = None
+        seen = []
+        while True:
+            page = snapshot.list_books(limit=7, sort=sort, cursor=cursor, min_rating=2)
+            rows = await get_book_list_rows(
+                async_session, limit=7, sort=sort, cursor=cursor, min_rating=2
+            )
+            assert [b.id for b in page.books] == [r.id for r in rows]
+            seen += [b.id for b in page.books]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert len(seen) == len(set(seen)) == sum(1 for b in catalog if b.rating >= 2)
+
+    async def test_falls_back_to_sql(self, async_session: AsyncSession, catalog):
+        snapshot = await load_snapshot(async_session)
+        assert snapshot.list_books(category="sci_nce") is None
+        assert snapshot.list_books(sort="relevance") is None
+
+        async_session.expunge_all()
+        first = snapshot.list_books(limit=2, sort="price")
+        await async_session.delete(await async_session.get(type(catalog[0]), first.books[1].id))
+        await async_session.commit()
+        stale = await load_snapshot(async_session)
+        assert stale.list_books(limit=2, sort="price", cursor=first.next_cursor) is None
+
+        with pytest.raises(ValueError):
+            snapshot.list_books(sort="price", cursor="not-a-cursor")
+
+    @pytest.mark.parametrize("listing", [
+        {}, {"sort": "-price"}, {"sort": "rating", "min_rating": 2}, {"sort": "name", "max_price": 40},
+    ])
+    async def test_serves_books_with_missing_values(self, async_session: AsyncSession, catalog, listing):
+        async_session.add_all([
+            BookFactory.build(price=None, rating=3),
+            BookFactory.build(price=25, rating=None),
+        ])
+        await bump_catalog_version(async_session)
+        await async_session.commit()
+
+        snapshot = await load_snapshot(async_session)
+        page = snapshot.list_books(limit=100, **listing)
+        rows = await get_book_list_rows(async_session, limit=100, **listing)
+        assert page.books == BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+        assert page.total == await count_books(async_session, **listing)
+
+    async def test_only_serves_its_own_version(self, async_session: AsyncSession, catalog):
+        model = CatalogReadModel(enabled=True)
+        model.snapshot = await load_snapshot(async_session)
+        assert model.snapshot.version == 1
+        assert model.list_books(1, limit=3) is not None
+        assert model.list_books(2, limit=3) is None
+        assert model.list_books(None, limit=3) is None
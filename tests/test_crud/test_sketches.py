@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import sketches
+from app.crud.sketches import KLLSketch, merge_sketches
+from app.models.analytics import CategorySketch
+from tests.factories import BookFactory
+
+
+def rank_error(values, estimate, fraction):
+    return abs(np.searchsorted(np.sort(values), estimate, side="right") / len(values) - fraction)
+
+
+class TestKLLSketch:
+
+    def test_small_inputs_are_exact(self):
+        values = [5.0, 1.0, 3.0, 2.0, 4.0, 8.5]
+        sketch = KLLSketch().extend(values)
+        fractions = [0, 0.1, 0.25, 0.5, 0.9, 1]
+        assert sketch.quantiles(fractions) == np.quantile(values, fractions, method="inverted_cdf").tolist()
+        assert (sketch.count, sketch.min, sketch.max) == (6, 1.0, 8.5)
+        assert sketch.histogram([1, 3, 5, 8.5]) == np.histogram(values, [1, 3, 5, 8.5])[0].tolist()
+
+    def test_large_inputs_stay_small_and_accurate(self):
+        values = np.random.default_rng(7).lognormal(3, 0.5, 50_000)
+        sketch = KLLSketch(k=200).extend(values)
+        assert sketch.count == 50_000
+        assert sketch.size < sketch.budget <= 3 * 200
+        assert sum(len(level) * 2 ** h for h, level in enumerate(sketch.levels)) == 50_000
+        for fraction, estimate in zip([0.01, 0.25, 0.5, 0.9, 0.99], sketch.quantiles([0.01, 0.25, 0.5, 0.9, 0.99])):
+            assert rank_error(values, estimate, fraction) < 0.02
+
+    def test_merged_sketches_answer_for_the_union(self):
+        rng = np.random.default_rng(3)
+        parts = [rng.normal(loc, 5, 4_000) for loc in (10, 30, 50)]
+        merged = merge_sketches(KLLSketch().extend(part) for part in parts)
+        union = np.concatenate(parts)
+        assert merged.count == len(union)
+        assert (merged.min, merged.max) == (union.min(), union.max())
+        for fraction, estimate in zip([0.1, 0.5, 0.9], merged.quantiles([0.1, 0.5, 0.9])):
+            assert rank_error(union, estimate, fraction) < 0.02
+        counts = merged.histogram(np.linspace(union.min(), union.max(), 5))
+        assert sum(counts) == len(union)
+
+    def test_round_trips_through_json(self):
+        sketch = KLLSketch().extend(range(5_000))
+        restored = KLLSketch.from_dict(sketch.to_dict())
+        assert restored.quantiles([0.3, 0.7]) == sketch.quantiles([0.3, 0.7])
+        assert restored.count == sketch.count
+
+    def test_empty_sketch(self):
+        sketch = KLLSketch()
+        assert sketch.quantiles([0.5]) == [None]
+        assert sketch.histogram([0, 1, 2]) == [0, 0]
+
+
+@pytest_asyncio.fixture
+async def books_in_db(async_session: AsyncSession):
+    objs = [
+        BookFactory.build(price=float(10 + i), rating=(i % 5) + 1, stock_count=i, category=category)
+        for i, category in enumerate(["Fiction"] * 10 + ["Science"] * 6)
+    ]
+    objs.append(BookFactory.build(price=99.0, rating=None, stock_count=None, category=None))
+    async_session.add_all(objs)
+    await sketches.rebuild_category_sketches(async_session)
+    await async_session.commit()
+    yield objs
+
+
+@pytest.mark.asyncio
+class TestCategorySketches:
+
+    async def test_rebuild_sketches_every_category(self, async_session: AsyncSession, books_in_db):
+        rows = (await async_session.execute(
+            select(CategorySketch.metric, CategorySketch.category, CategorySketch.item_count)
+        )).all()
+        counts = {(row.metric, row.category): row.item_count for row in rows}
+        assert counts[("price", "Fiction")] == 10
+        assert counts[("price", sketches.UNCATEGORIZED)] == 1
+        assert ("rating", sketches.UNCATEGORIZED) not in counts
+        assert await sketches.has_category_sketches(async_session)
+
+    async def test_quantiles_overall_and_per_category(self, async_session: AsyncSession, books_in_db):
+        prices = [book.price for book in books_in_db]
+        data, updated_at = await sketches.quantiles(async_session, "price", [0.25, 0.5, 0.9])
+        assert data == [{
+            "count": len(prices),
+            "quantiles": dict(zip(["0.25", "0.5", "0.9"], np.quantile(prices, [0.25, 0.5, 0.9], method="inverted_cdf"))),
+        }]
+        assert updated_at is not None
+
+        per_category, _ = await sketches.quantiles(async_session, "price", [0.5], group="category")
+        assert [(row["category"], row["count"]) for row in per_category] == [("Fiction", 10), ("Science", 6), (None, 1)]
+        assert per_category[0]["quantiles"] == {"0.5": 14.0}
+
+        science, _ = await sketches.quantiles(async_session, "stock_count", [1], category="Science")
+        assert science == [{"count": 6, "quantiles": {"1": 15.0}}]
+        assert await sketches.quantiles(async_session, "price", category="Unknown") == ([], None)
+
+    async def test_inserts_merge_into_stored_sketches(self, async_session: AsyncSession, books_in_db):
+        new_books = [BookFactory.build(price=100.0 + i, rating=5, category="Science") for i in range(4)]
+        new_books.append(BookFactory.build(price=1.0, rating=1, category="Poetry"))
+        async_session.add_all(new_books)
+        await sketches.update_category_sketches(async_session, new_books)
+        await async_session.commit()
+
+        prices = [book.price for book in books_in_db + new_books if book.category == "Science"]
+        data, _ = await sketches.quantiles(async_session, "price", [0, 0.5, 1], category="Science")
+        assert data[0]["count"] == 10
+        assert list(data[0]["quantiles"].values()) == np.quantile(prices, [0, 0.5, 1], method="inverted_cdf").tolist()
+
+        ratings, _ = await sketches.quantiles(async_session, "rating", [0], group="category")
+        assert {row["category"]: row["count"] for row in ratings} == {"Fiction": 10, "Science": 10, "Poetry": 1}
+
+    async def test_histogram(self, async_session: AsyncSession, books_in_db):
+        data, _ = await sketches.sketch_histogram(async_session, "price", edges=[0, 15, 30, 100])
+        assert [row["count"] for row in data] == [5, 11, 1]
+        assert data[0]["range"] == [0, 15]
+
+        equal_width, _ = await sketches.sketch_histogram(async_session, "rating", bins=4, category="Fiction")
+        assert equal_width[0]["range"] == [1, 2]
+        assert sum(row["count"] for row in equal_width) == 10
+
+    async def test_no_sketches(self, async_session: AsyncSession):
+        assert not await sketches.has_category_sketches(async_session)
+        assert await sketches.sketch_histogram(async_session) == ([], None)
@@ -0,0 +1,60 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import analytics, trend_views
+from tests.factories import BookFactory
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def books_in_db(async_session: AsyncSession):
+    objs = [
+        BookFactory.build(price=10 + i * 3, rating=(i % 5) + 1, category=category)
+        for i, category in enumerate(["Fiction"] * 6 + ["Science"] * 4 + ["History"] * 2)
+    ]
+    objs.append(BookFactory.build(price=None, rating=4, category=None))
+    async_session.add_all(objs)
+    await async_session.commit()
+    await trend_views.refresh_trend_views(async_session, concurrently=False)
+    await async_session.commit()
+    yield objs
+
+
+def by_category(rows):
+    return sorted(rows, key=lambda row: str(row["category"]))
+
+
+class TestTrendViews:
+
+    async def test_views_match_live_queries(self, async_session: AsyncSession, books_in_db):
+        top, computed_at = await trend_views.most_common_categories(async_session, k=3)
+        assert top == await analytics.most_common_categories(async_session, k=3)
+        assert computed_at is not None
+
+        popular, _ = await trend_views.avg_rating_for_popular_categories(async_session, min_count=3)
+        assert popular == await analytics.avg_rating_for_popular_categories(async_session, min_count=3)
+
+        prices, _ = await trend_views.average_price_by_category(async_session)
+        live_prices = await analytics.average_price_by_category(async_session)
+        assert by_category(prices) == pytest.approx(by_category(live_prices))
+
+    async def test_concurrent_refresh_picks_up_writes(self, async_session: AsyncSession, books_in_db):
+        _, before = await trend_views.most_common_categories(async_session)
+        async_session.add_all([BookFactory.build(rating=5, category="Poetry") for _ in range(7)])
+        await async_session.commit()
+
+        stale, _ = await trend_views.most_common_categories(async_session, k=1)
+        assert stale[0]["category"] == "Fiction"
+
+        await trend_views.refresh_trend_views(async_session)
+        await async_session.commit()
+        fresh, after = await trend_views.most_common_categories(async_session, k=1)
+        assert fresh == [{"category": "Poetry", "count": 7}]
+        assert after > before
+
+    async def test_empty_catalog(self, async_session: AsyncSession):
+        await trend_views.refresh_trend_views(async_session)
+        await async_session.commit()
+        assert await trend_views.most_common_categories(async_session) == ([], None)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.catalog import get_catalog_version
+from app.ingestion import seed
+from app.models.analytics import CategorySketch
+from app.models.product import Book, BookSnapshot
+
+
+def crawled_book(upc, price, stock_count, category="Fiction"):
+    return {
+        "name": f"Book {upc}",
+        "price": price,
+        "rating": 4,
+        "description": "A book",
+        "category": category,
+        "upc": upc,
+        "availability": f"In stock ({stock_count} available)",
+        "stock_count": stock_count,
+    }
+
+
+@pytest.mark.asyncio
+class TestInsertBooks:
+    """Test suite for seeding books and their price and stock history"""
+
+    async def test_recrawls_are_recorded_as_snapshots(
+            self, async_session: AsyncSession, async_session_maker, monkeypatch
+    ):
+        """Existing books are not inserted again, but every crawl adds a snapshot"""
+        monkeypatch.setattr(seed, "async_session", async_session_maker)
+        first_crawl = datetime.now(timezone.utc) - timedelta(days=7)
+
+        await seed.insert_books(
+            [crawled_book("a", 10.0, 5), crawled_book("b", 20.0, 3), crawled_book("a", 10.0, 5)],
+            crawled_at=first_crawl,
+        )
+        await seed.insert_books(
+            [crawled_book("a", 12.5, 2), crawled_book("c", 5.0, 1, category=None)],
+        )
+
+        books = (await async_session.execute(select(Book.upc, Book.price).order_by(Book.upc))).all()
+        assert books == [("a", 10.0), ("b", 20.0), ("c", 5.0)]
+        history = (await async_session.execute(
+            select(BookSnapshot.upc, BookSnapshot.price, BookSnapshot.stock_count)
+            .order_by(BookSnapshot.crawled_at, BookSnapshot.upc)
+        )).all()
+        assert history == [("a", 10.0, 5), ("b", 20.0, 3), ("a", 12.5, 2), ("c", 5.0, 1)]
+        assert await get_catalog_version(async_session) == 2
+
+    async def test_sketches_are_built_and_then_merged(
+            self, async_session: AsyncSession, async_session_maker, monkeypatch
+    ):
+        """The first seed builds the sketches from every book, later ones merge new books"""
+        monkeypatch.setattr(seed, "async_session", async_session_maker)
+        await seed.insert_books([crawled_book("a", 10.0, 5), crawled_book("b", 20.0, 3)])
+        await seed.insert_books([crawled_book("b", 21.0, 2), crawled_book("c", 30.0, 1)])
+
+        count = await async_session.scalar(
+            select(CategorySketch.item_count)
+            .where(CategorySketch.metric == "price", CategorySketch.category == "Fiction")
+        )
+        assert count == 3
+        assert await async_session.scalar(select(func.count()).select_from(BookSnapshot)) == 4
+
+    async def test_sketches_are_built_by_a_recrawl_that_inserts_nothing(
+            self, async_session: AsyncSession, async_session_maker, monkeypatch
+    ):
+        """Books seeded before the sketches existed get them on the next crawl"""
+        monkeypatch.setattr(seed, "async_session", async_session_maker)
+        await seed.insert_books([crawled_book("a", 10.0, 5), crawled_book("b", 20.0, 3)])
+        await async_session.execute(delete(CategorySketch))
+        await async_session.commit()
+
+        await seed.insert_books([crawled_book("a", 11.0, 4)])
+        count = await async_session.scalar(
+            select(CategorySketch.item_count)
+            .where(CategorySketch.metric == "price", CategorySketch.category == "Fiction")
+        )
+        assert count == 2
@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from schemas.product import BookDetailOut
+from schemas.product import MAX_BATCH_IDS, MAX_POST_BATCH_IDS, BookBatchIn, BookDetailOut
 
 
 class TestProductOut:
@@ -36,6 +36,12 @@ class TestProductOut:
             rating=5
         )
 
+    def test_missing_price_and_rating_are_null(self):
+        product = BookDetailOut(id=5, name="Unpriced", price=None, rating=None)
+        assert product.price is None and product.rating is None
+        with pytest.raises(ValidationError):
+            BookDetailOut(id=6, name="Incomplete")
+
     def test_invalid_price_type(self):
         with pytest.raises(ValidationError):
             BookDetailOut(
@@ -54,3 +60,14 @@ class TestProductOut:
                 rating=4,
                 stock_count="wrong"
             )
+
+
+class TestBookBatchIn:
+
+    def test_post_body_allows_more_ids_than_the_query_string(self):
+        assert MAX_POST_BATCH_IDS > MAX_BATCH_IDS
+        assert len(BookBatchIn(ids=list(range(MAX_POST_BATCH_IDS))).ids) == MAX_POST_BATCH_IDS
+        with pytest.raises(ValidationError):
+            BookBatchIn(ids=list(range(MAX_POST_BATCH_IDS + 1)))
+        with pytest.raises(ValidationError):
+            BookBatchIn(ids=[])